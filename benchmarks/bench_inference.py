@@ -0,0 +1,109 @@
+# SPDX-License-Identifier: Apache-2.0
+# benchmarks/bench_inference.py
+#
+# Actor inference: the torch acting path vs fast_inference.FastActor.
+# – torch     autocast(bf16) + Categorical, as PPOAgent acts with PPO_FAST_SELECT=0
+# – torch32   plain float32 actor call + multinomial (no autocast)
+# – numpy     FastActor, float32
+# – int8      FastActor, int8 weights / activations
+# for batch 1 (one decision per cycle) and a larger batch (select_batch).
+# Parity checks against the float32 torch actor, exit status 1 if one fails:
+# – max |Δp| and mean KL of the action distributions on random states
+# – total variation between FastActor's empirical sampling frequencies and
+#   the torch probabilities for one fixed state
+#
+#     python -m benchmarks.bench_inference [--batch 64] [--budget 1.0]
+
+import argparse, sys, time
+from typing import Callable, Dict
+
+import numpy as np
+import torch
+from torch.distributions import Categorical
+
+from optimiser.advanced_optimization import ActorCritic, DTYPE_AMP
+from optimiser.fast_inference import FastActor
+
+TOL_P     = {"numpy": 1e-5, "int8": 5e-2}          # max |Δp|
+TOL_TV    = 0.01                                   # sampling total variation
+N_SAMPLES = 200_000
+
+
+def _measure(fn: Callable[[], object], budget: float) -> float:
+    fn()
+    n, t0 = 0, time.perf_counter()
+    while time.perf_counter() - t0 < budget:
+        fn(); n += 1
+    return (time.perf_counter() - t0) / n
+
+
+def _parity(actor, fast: Dict[str, FastActor], dim: int, rng) -> bool:
+    x = rng.standard_normal((4096, dim)).astype(np.float32) * 3
+    with torch.no_grad():
+        ref = actor(torch.from_numpy(x)).numpy().astype(np.float64)
+    ok = True
+    for name, f in fast.items():
+        p  = f.probs(x).astype(np.float64)
+        dp = np.abs(p - ref).max()
+        kl = float((ref * (np.log(ref + 1e-12) - np.log(p + 1e-12))).sum(1).mean())
+        good = dp <= TOL_P[name]
+        ok &= good
+        print(f"parity {name:>6}: max|Δp| {dp:.2e}  mean KL {kl:.2e}  {'ok' if good else 'FAIL'}")
+
+    x1 = x[:1]
+    counts = np.zeros(ref.shape[1])
+    for _ in range(N_SAMPLES // 1000):
+        a, _ = fast["numpy"].sample(np.repeat(x1, 1000, axis=0))
+        counts += np.bincount(a, minlength=ref.shape[1])
+    tv = 0.5 * np.abs(counts / counts.sum() - ref[0]).sum()
+    ok &= tv <= TOL_TV
+    print(f"sampling numpy: total variation {tv:.4f} over {N_SAMPLES} draws  "
+          f"{'ok' if tv <= TOL_TV else 'FAIL'}")
+    return bool(ok)
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--state-dim", type=int, default=12)
+    ap.add_argument("--actions", type=int, default=4)
+    ap.add_argument("--batch", type=int, default=64)
+    ap.add_argument("--budget", type=float, default=1.0, help="seconds per case")
+    args = ap.parse_args()
+
+    torch.manual_seed(0)
+    rng   = np.random.default_rng(0)
+    actor = ActorCritic(args.state_dim, args.actions).actor.eval()
+    fast  = {"numpy": FastActor.from_actor(actor, seed=0),
+             "int8":  FastActor.from_actor(actor, quantize=True, seed=0)}
+    ok = _parity(actor, fast, args.state_dim, rng)
+
+    gen = torch.Generator().manual_seed(0)
+
+    @torch.no_grad()
+    def torch_amp(x):
+        with torch.autocast("cpu", dtype=DTYPE_AMP):
+            d = Categorical(actor(x))
+            a = d.sample()
+            return a, d.log_prob(a)
+
+    @torch.no_grad()
+    def torch32(x):
+        p = actor(x)
+        a = torch.multinomial(p, 1, generator=gen)
+        return a, p.gather(-1, a).log()
+
+    print(f"\n{'case':>8} {'batch':>6} {'µs/call':>9} {'µs/row':>8} {'speed-up':>9}")
+    for b in (1, args.batch):
+        x_np = rng.standard_normal((b, args.state_dim)).astype(np.float32)
+        x_t  = torch.from_numpy(x_np)
+        res = {"torch":   _measure(lambda: torch_amp(x_t), args.budget),
+               "torch32": _measure(lambda: torch32(x_t), args.budget),
+               "numpy":   _measure(lambda: fast["numpy"].sample(x_np), args.budget),
+               "int8":    _measure(lambda: fast["int8"].sample(x_np), args.budget)}
+        for name, t in res.items():
+            print(f"{name:>8} {b:6d} {t * 1e6:9.1f} {t * 1e6 / b:8.2f} {res['torch'] / t:8.1f}x")
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,42 @@
+# SPDX-License-Identifier: Apache-2.0
+# benchmarks/bench_parallel_rollout.py
+#
+# Rollout-collection throughput of ParallelRollout vs worker count
+# (collection only; the learner update is reported separately).
+#
+#     python -m benchmarks.bench_parallel_rollout [--workers 1 2 4 8]
+
+import argparse, os
+
+from optimiser.decision_engine  import HierarchicalAgent
+from optimiser.parallel_rollout import ParallelRollout, SimFactory
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--workers", type=int, nargs="+",
+                    default=sorted({1, 2, 4, os.cpu_count() or 1}))
+    ap.add_argument("--steps", type=int, default=256)
+    ap.add_argument("--iterations", type=int, default=3)
+    ap.add_argument("--nodes", type=int, default=50)
+    ap.add_argument("--pods", type=int, default=800)
+    args = ap.parse_args()
+
+    agent = HierarchicalAgent(12, args.nodes, args.pods)
+    base  = None
+    print(f"cpus={os.cpu_count()}")
+    print(f"{'workers':>7} {'steps/s':>10} {'speed-up':>9} {'update s':>9}")
+    for n in args.workers:
+        pool = ParallelRollout(agent, SimFactory(n_nodes=args.nodes, n_pods=args.pods),
+                               n_workers=n, steps_per_worker=args.steps)
+        try:
+            res = pool.train(args.iterations)
+        finally:
+            pool.close()
+        base = base or res["collect_steps_per_s"]
+        print(f"{n:7d} {res['collect_steps_per_s']:10.0f} "
+              f"{res['collect_steps_per_s'] / base:9.2f} {res['update_s']:9.2f}")
+
+
+if __name__ == "__main__":
+    main()
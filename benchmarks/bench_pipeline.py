@@ -0,0 +1,228 @@
+# SPDX-License-Identifier: Apache-2.0
+# benchmarks/bench_pipeline.py
+#
+# State → decision → actuation pipeline at cluster scale, against the
+# fake Kubernetes / Prometheus stand-ins in benchmarks/fakes.py.
+# – state        StateBuilder.get_cluster_state (LIST path)
+# – state_inf    … with informer caches (LIST once, then reads)
+# – state_delta  … plus 10 pod reschedules per cycle through the watch path
+# – vector       state_vector / StateBuilder.to_vector
+# – select       HierarchicalAgent.select
+# – select_node  … with the per-node target head (TARGET_HEAD=node)
+# – cycle        one run_loop_async cycle, zero sleeps, fake actuation
+# – update_high / update_low   PPOAgent.update per rollout size
+# Every (case, size) runs in a fresh process; results are written as JSON
+# and can be compared against an earlier run:
+#
+#     python -m benchmarks.bench_pipeline [--sizes 10 1000 10000 100000]
+#         [--rollouts 256 1024 4096] [--out bench.json] [--compare old.json]
+
+import argparse, asyncio, json, multiprocessing as mp, os, platform, \
+       resource, subprocess, sys, time
+from typing import Any, Callable, Dict, List
+
+import numpy as np
+from types import SimpleNamespace as NS
+
+CLUSTER_CASES = ("state", "state_inf", "state_delta", "vector", "select", "select_node", "cycle")
+UPDATE_CASES  = ("update_high", "update_low")
+UPDATE_NODES  = 1000                # cluster size behind the update benchmarks
+
+
+# ───────────── measurement ─────────────────────────────────
+def _measure(fn: Callable[[], Any], budget: float, min_reps: int = 3,
+             max_reps: int = 10_000) -> List[float]:
+    times, t_end = [], time.perf_counter() + budget
+    while len(times) < max_reps and (len(times) < min_reps or time.perf_counter() < t_end):
+        t0 = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - t0)
+    return times
+
+
+class _Recorder:
+    """Duck-typed Exporter: keeps every histogram observation in memory."""
+    def __init__(self):
+        self.obs: Dict[tuple, List[float]] = {}
+
+    def __getattr__(self, metric):
+        rec = self
+
+        class _Sink:
+            def __init__(self, key=(metric,)):
+                self.key = key
+            def labels(self, *a, **kw):
+                return _Sink(self.key + a + tuple(kw.values()))
+            def observe(self, v):
+                rec.obs.setdefault(self.key, []).append(v)
+            def inc(self, v=1):
+                pass
+            def set(self, v):
+                pass
+        return _Sink()
+
+    def record(self, *a, **kw):
+        pass
+
+    def api_error(self, *a, **kw):
+        pass
+
+
+def _cluster_case(case: str, n_nodes: int, n_pods: int, budget: float) -> List[float]:
+    from benchmarks.fakes import FakeCoreV1, FakeProm, FakeWatch
+    from optimiser.informer import Informer, name_key
+    from optimiser.k8s_io import K8sExecutor
+    from optimiser.state_builder import StateBuilder, node_row, pod_row
+
+    k8s  = FakeCoreV1(n_nodes, n_pods)
+    prom = FakeProm(k8s)
+    sb   = StateBuilder(use_informers=False, io=K8sExecutor(), prom=prom, core_v1=k8s)
+    loop = asyncio.new_event_loop()
+
+    if case == "state":
+        return _measure(lambda: loop.run_until_complete(sb.get_cluster_state()), budget)
+
+    if case in ("state_inf", "state_delta"):
+        sb.node_informer = Informer(k8s.list_node, key_fn=name_key, transform=node_row,
+                                    watch_factory=FakeWatch, name="nodes", journal=True).start()
+        sb.pod_informer  = Informer(k8s.list_pod_for_all_namespaces, transform=pod_row,
+                                    watch_factory=FakeWatch, name="pods", journal=True).start()
+        rng, pods = np.random.default_rng(1), k8s._pods.items
+
+        def cycle():
+            if case == "state_delta" and n_pods:
+                for j in rng.integers(0, n_pods, 10):
+                    o = pods[j]
+                    sb.pod_informer.apply({"type": "MODIFIED", "object": NS(
+                        metadata=o.metadata, spec=NS(node_name=k8s.node_names[rng.integers(n_nodes)],
+                                                     containers=o.spec.containers))})
+            loop.run_until_complete(sb.get_cluster_state())
+        try:
+            return _measure(cycle, budget)
+        finally:
+            sb.node_informer.stop(); sb.pod_informer.stop()
+
+    st = loop.run_until_complete(sb.get_cluster_state())
+    if case == "vector":
+        return _measure(lambda: sb.to_vector(st), budget)
+
+    from optimiser.decision_engine import HierarchicalAgent, HierMem
+    agent = HierarchicalAgent(12, n_nodes, n_pods)
+    if case == "select":
+        vec, mem = sb.to_vector(st), HierMem()
+        return _measure(lambda: agent.select(vec, mem), budget)
+
+    if case == "select_node":
+        from optimiser.cluster_snapshot import snapshot_of
+        agent = HierarchicalAgent(12, n_nodes, n_pods, target_head="node")
+        vec, mem, snap = sb.to_vector(st), HierMem(), snapshot_of(st)
+        return _measure(lambda: agent.select(vec, mem, snap=snap), budget)
+
+    if case == "cycle":
+        from optimiser.energy_optimization_controller import OptimizationController
+        rec  = _Recorder()
+        ctrl = OptimizationController(agent, sb, HierMem(), rec, update_timestep=10**9,
+                                      core_v1=k8s, verbose=False, checkpoint_dir=None,
+                                      background_learning=False)
+        loop.run_until_complete(ctrl.step(0))                               # warm-up
+        t0 = time.perf_counter()
+        loop.run_until_complete(ctrl.step(0))
+        cycles = int(min(10_000, max(3, budget / (time.perf_counter() - t0))))
+        rec.obs.clear()
+        loop.run_until_complete(ctrl.run_loop_async(0, 0, cycles=cycles))
+        return rec.obs[("cycle_phase_seconds", "cycle")]
+    raise ValueError(case)
+
+
+def _update_case(case: str, rollout: int, budget: float) -> List[float]:
+    import torch
+    from optimiser.decision_engine import HierarchicalAgent
+    from optimiser.advanced_optimization import RolloutBuffer, unwrap
+
+    agent = HierarchicalAgent(12, UPDATE_NODES, UPDATE_NODES)
+    ppo   = agent.high if case == "update_high" else agent.low
+    dim   = unwrap(ppo.policy_old).actor[0].in_features
+    rng   = np.random.default_rng(0)
+    states = torch.as_tensor(rng.standard_normal((rollout, dim)), dtype=torch.float32)
+    rewards = rng.standard_normal(rollout)
+    dones   = np.zeros(rollout, dtype=bool); dones[-1] = True
+
+    def one():
+        buf = RolloutBuffer(rollout)
+        ppo.select_actions(states, buf)
+        buf.add_rewards(rewards, dones)
+        ppo.update(buf)
+    one()                                                           # compile / warm-up
+    return _measure(one, budget)
+
+
+def _run(kind: str, case: str, size: int, budget: float, pods_per_node: float):
+    t0 = time.perf_counter()
+    if kind == "cluster":
+        times = _cluster_case(case, size, max(1, int(size * pods_per_node)), budget)
+    else:
+        times = _update_case(case, size, budget)
+    wall = time.perf_counter() - t0
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024         # KiB → MiB
+    t = np.asarray(times)
+    return {"case": case, "size": size, "reps": len(t),
+            "ops_per_s": len(t) / t.sum(), "mean_ms": 1e3 * t.mean(),
+            "p50_ms": 1e3 * np.percentile(t, 50), "p99_ms": 1e3 * np.percentile(t, 99),
+            "peak_rss_mib": peak, "wall_s": wall}
+
+
+# ───────────── driver ──────────────────────────────────────
+def _meta() -> Dict[str, Any]:
+    try:
+        sha = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True,
+                             text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        sha = None
+    import torch
+    return {"commit": sha, "time": time.time(), "python": platform.python_version(),
+            "torch": torch.__version__, "numpy": np.__version__,
+            "cpus": os.cpu_count(), "machine": platform.machine()}
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--sizes", type=int, nargs="+", default=[10, 1_000, 10_000, 100_000],
+                    help="node counts (pods = nodes × --pods-per-node)")
+    ap.add_argument("--pods-per-node", type=float, default=1.0)
+    ap.add_argument("--rollouts", type=int, nargs="+", default=[256, 1024, 4096])
+    ap.add_argument("--cases", nargs="+", default=list(CLUSTER_CASES + UPDATE_CASES))
+    ap.add_argument("--budget", type=float, default=2.0, help="seconds per (case, size)")
+    ap.add_argument("--out", default="bench_pipeline.json")
+    ap.add_argument("--compare", help="earlier --out file; prints p50 ratios")
+    args = ap.parse_args()
+
+    jobs = [("cluster", c, s) for c in args.cases if c in CLUSTER_CASES for s in args.sizes] + \
+           [("update", c, r) for c in args.cases if c in UPDATE_CASES for r in args.rollouts]
+    ctx  = mp.get_context("spawn")
+    results = []
+    print(f"{'case':>11} {'size':>7} {'reps':>6} {'ops/s':>10} {'p50 ms':>9} "
+          f"{'p99 ms':>9} {'peak MiB':>9}")
+    for kind, case, size in jobs:
+        with ctx.Pool(1) as pool:
+            r = pool.apply(_run, (kind, case, size, args.budget, args.pods_per_node))
+        results.append(r)
+        print(f"{case:>11} {size:7d} {r['reps']:6d} {r['ops_per_s']:10.1f} "
+              f"{r['p50_ms']:9.3f} {r['p99_ms']:9.3f} {r['peak_rss_mib']:9.1f}", flush=True)
+
+    with open(args.out, "w") as f:
+        json.dump({"meta": _meta(), "args": vars(args), "results": results}, f, indent=1)
+    print(f"wrote {args.out}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            old = {(r["case"], r["size"]): r for r in json.load(f)["results"]}
+        print(f"\n{'case':>11} {'size':>7} {'p50 new/old':>12} {'p99 new/old':>12}")
+        for r in results:
+            o = old.get((r["case"], r["size"]))
+            if o:
+                print(f"{r['case']:>11} {r['size']:7d} {r['p50_ms'] / o['p50_ms']:12.2f} "
+                      f"{r['p99_ms'] / o['p99_ms']:12.2f}")
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,59 @@
+# SPDX-License-Identifier: Apache-2.0
+# benchmarks/bench_returns.py
+#
+# Discounted returns: list-insert loop (old PPOAgent.update) vs the chunked
+# tensor scan.  Run from the repo root:
+#
+#     python -m benchmarks.bench_returns [--max 1000000]
+
+import argparse, time
+
+import torch
+
+from optimiser.advanced_optimization import GAMMA, discounted_cumsum, gae
+
+LEGACY_MAX = 100_000          # quadratic – beyond this it only measures memmove
+
+
+def legacy_returns(rewards, terminals, gamma=GAMMA):
+    R, buf = 0.0, []
+    for r, done in zip(reversed(rewards), reversed(terminals)):
+        R = r + gamma * R * (1.0 - done)
+        buf.insert(0, R)
+    return buf
+
+
+def _time(fn, repeat=3):
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter(); fn(); best = min(best, time.perf_counter() - t0)
+    return best
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--max", type=int, default=1_000_000)
+    args = ap.parse_args()
+
+    print(f"{'steps':>9} {'legacy s':>10} {'scan s':>10} {'gae s':>10} {'scan ns/step':>13} {'max |err|':>10}")
+    n = 1_000
+    while n <= args.max:
+        r = torch.randn(n)
+        d = (torch.rand(n) < 0.001).float()
+        v = torch.randn(n)
+        t_scan = _time(lambda: discounted_cumsum(r, d, GAMMA))
+        t_gae  = _time(lambda: gae(r, v, d, GAMMA, 0.95))
+        if n <= LEGACY_MAX:
+            rl, dl = r.tolist(), d.tolist()
+            t_leg = _time(lambda: legacy_returns(rl, dl), repeat=1)
+            err   = (discounted_cumsum(r, d, GAMMA)
+                     - torch.tensor(legacy_returns(rl, dl))).abs().max().item()
+            leg, err = f"{t_leg:10.4f}", f"{err:10.2e}"
+        else:
+            leg, err = f"{'–':>10}", f"{'–':>10}"
+        print(f"{n:9d} {leg} {t_scan:10.4f} {t_gae:10.4f} {1e9 * t_scan / n:13.1f} {err}")
+        n *= 10
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,57 @@
+# SPDX-License-Identifier: Apache-2.0
+# benchmarks/bench_rollout.py
+#
+# List-backed Memory vs preallocated RolloutBuffer: time to record a rollout
+# and hand it to the trainer, plus the memory it occupies.  Each case runs
+# in a fresh process so RSS deltas are not polluted by the other one.
+#
+#     python -m benchmarks.bench_rollout [--steps 400 4000 40000]
+
+import argparse, multiprocessing as mp, time
+
+
+def _case(kind: str, steps: int, dim: int):
+    import psutil, torch
+    from optimiser.advanced_optimization import Memory, RolloutBuffer
+
+    proc = psutil.Process()
+    src  = torch.randn(dim)
+    acts = [torch.tensor(i % 4) for i in range(4)]
+    lp   = torch.tensor(-1.3)
+    mem  = Memory() if kind == "list" else RolloutBuffer(capacity=steps)
+    rss0 = proc.memory_info().rss
+
+    # per step, select_action hands over a fresh state / action / log-prob tensor
+    t0 = time.perf_counter()
+    for i in range(steps):
+        mem.add(src.clone(), acts[i % 4].clone(), lp.clone())
+        mem.add_reward(1.0, False)
+    t_add = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    batch = mem.batch()
+    t_batch = time.perf_counter() - t0
+    rss = proc.memory_info().rss - rss0
+    del batch
+    return t_add, t_batch, rss
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--steps", type=int, nargs="+", default=[400, 4_000, 40_000])
+    ap.add_argument("--dim", type=int, default=13)
+    args = ap.parse_args()
+
+    ctx = mp.get_context("spawn")
+    print(f"{'steps':>7} {'kind':>6} {'add µs/step':>12} {'batch ms':>9} "
+          f"{'total ms':>9} {'ΔRSS MiB':>9}")
+    for steps in args.steps:
+        for kind in ("list", "buffer"):
+            with ctx.Pool(1) as pool:
+                t_add, t_batch, rss = pool.apply(_case, (kind, steps, args.dim))
+            print(f"{steps:7d} {kind:>6} {1e6 * t_add / steps:12.2f} "
+                  f"{1e3 * t_batch:9.3f} {1e3 * (t_add + t_batch):9.2f} {rss / 2**20:9.2f}")
+
+
+if __name__ == "__main__":
+    main()
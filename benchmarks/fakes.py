@@ -0,0 +1,173 @@
+# SPDX-License-Identifier: Apache-2.0
+# benchmarks/fakes.py
+#
+# In-process stand-ins for the Kubernetes API and Prometheus, sized by
+# node / pod count, for benchmarking the optimiser without a cluster.
+# – FakeCoreV1: list_node / list_pod_for_all_namespaces return lightweight
+#   objects with exactly the attributes the row transforms read (requests
+#   included, so the drain planner has something to pack); patch and
+#   eviction calls are recorded, each taking ``latency`` s, with the peak
+#   number in flight; ``pdbs`` are listed and enforced like the API server
+#   does (429 once a budget is spent), ``pdb_forbidden`` answers the list
+#   with 403 as a missing RBAC rule would
+# – FakeWatch: a watch stream that idles until stopped (no events)
+# – FakeProm: query_many() decodes pre-rendered JSON payloads (with
+#   PromQueryEngine's decode), so the cost of parsing a Prometheus response at
+#   that size is part of the measurement; node-exporter series carry
+#   instance="<InternalIP>:9100", Kepler series node=, pods namespace= + pod=;
+#   set_node_watts() re-renders the node power series
+
+import asyncio, json, threading, time
+from types import SimpleNamespace as NS
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+from kubernetes import client
+
+from optimiser.prom_client import decode
+from optimiser.software_actuator import selector_matches
+from optimiser.state_builder import PROM_QUERIES
+
+
+def fake_pdb(namespace: str, match_labels: Dict[str, str], allowed: int, name: str = "pdb"):
+    """policy/v1 PodDisruptionBudget look-alike."""
+    return NS(metadata=NS(name=name, namespace=namespace),
+              spec=NS(selector=NS(match_labels=match_labels, match_expressions=None)),
+              status=NS(disruptions_allowed=allowed))
+
+
+class FakeCoreV1:
+    def __init__(self, n_nodes: int, n_pods: int, seed: int = 0, latency: float = 0.0,
+                 pdbs: Sequence = (), pdb_forbidden: bool = False):
+        rng = np.random.default_rng(seed)
+        self.node_names = [f"node-{i}" for i in range(n_nodes)]
+        self.node_ips   = [f"10.0.{i >> 8}.{i & 255}" for i in range(n_nodes)]
+        self.pod_names  = [f"pod-{j}" for j in range(n_pods)]
+        self.pod_ns     = [f"ns-{j % 50}" for j in range(n_pods)]
+        placement = rng.integers(0, max(n_nodes, 1), n_pods)
+        self._nodes = NS(metadata=NS(resource_version="1"), items=[
+            NS(metadata=NS(name=n, uid=f"uid-{n}", resource_version="1"),
+               status=NS(allocatable={"cpu": "16", "memory": "65843896Ki"},
+                         addresses=[NS(type="InternalIP", address=self.node_ips[i])]))
+            for i, n in enumerate(self.node_names)])
+        self._pods = NS(metadata=NS(resource_version="1"), items=[
+            NS(metadata=NS(name=p, uid=f"uid-{p}", namespace=self.pod_ns[j],
+                           labels={"app": f"app-{j % 500}"}, resource_version="1",
+                           owner_references=None),
+               spec=NS(node_name=self.node_names[placement[j]] if n_nodes else None,
+                       containers=[NS(resources=NS(requests={
+                           "cpu": f"{50 * (1 + j % 8)}m", "memory": f"{64 * (1 + j % 16)}Mi"}))]))
+            for j, p in enumerate(self.pod_names)])
+        self.calls: Dict[str, int] = {}
+        self.latency       = latency
+        self.pdbs          = list(pdbs)
+        self.pdb_forbidden = pdb_forbidden
+        self.evicted: List[Tuple[str, str]] = []            # (namespace, name)
+        self.patched: List[Tuple[str, dict]] = []           # (node, body)
+        self.in_flight = self.max_in_flight = 0
+        self._lock = threading.Lock()
+        self._pod  = {(o.metadata.namespace, o.metadata.name): o for o in self._pods.items}
+
+    def _count(self, name: str):
+        self.calls[name] = self.calls.get(name, 0) + 1
+
+    def _write(self, name: str, apply):
+        """A mutating call: counted, ``latency`` s long, peak concurrency tracked."""
+        with self._lock:
+            self._count(name)
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            if self.latency:
+                time.sleep(self.latency)
+            with self._lock:
+                apply()
+        finally:
+            with self._lock:
+                self.in_flight -= 1
+
+    def list_node(self, **kw):
+        self._count("list_node")
+        return self._nodes
+
+    def list_pod_for_all_namespaces(self, **kw):
+        self._count("list_pod_for_all_namespaces")
+        return self._pods
+
+    def patch_node(self, name, body):
+        self._write("patch_node", lambda: self.patched.append((name, body)))
+
+    def create_namespaced_pod_eviction(self, name, namespace, body=None):
+        def apply():
+            labels = self._pod[(namespace, name)].metadata.labels
+            cover  = [p for p in self.pdbs if p.metadata.namespace == namespace
+                      and selector_matches(p.spec.selector, labels)]
+            if any(p.status.disruptions_allowed <= 0 for p in cover):
+                raise client.ApiException(status=429, reason="Too Many Requests")
+            for p in cover:
+                p.status.disruptions_allowed -= 1
+            self.evicted.append((namespace, name))
+        self._write("create_namespaced_pod_eviction", apply)
+
+    def list_pod_disruption_budget_for_all_namespaces(self, **kw):
+        self._count("list_pod_disruption_budget_for_all_namespaces")
+        if self.pdb_forbidden:
+            raise client.ApiException(status=403, reason="Forbidden")
+        return NS(items=list(self.pdbs))
+
+
+class FakeWatch:
+    """``kubernetes.watch.Watch`` look-alike that yields nothing until stopped."""
+    def __init__(self):
+        self._stop = threading.Event()
+
+    def stream(self, func, **kw):
+        self._stop.wait(kw.get("timeout_seconds") or None)
+        return iter(())
+
+    def stop(self):
+        self._stop.set()
+
+
+def _vector(metrics, values) -> bytes:
+    return json.dumps({"status": "success", "data": {"resultType": "vector", "result": [
+        {"metric": m, "value": [0, repr(float(v))]} for m, v in zip(metrics, values)]}
+    }).encode()
+
+
+class FakeProm:
+    """PromQueryEngine stand-in answering StateBuilder's PROM_QUERIES."""
+    def __init__(self, k8s: FakeCoreV1, seed: int = 0, latency: float = 0.0):
+        rng, n = np.random.default_rng(seed), len(k8s.node_names)
+        kepler   = [{"node": nm, "instance": f"{ip}:9102"} for nm, ip in zip(k8s.node_names, k8s.node_ips)]
+        self._kepler = kepler
+        exporter = [{"instance": f"{ip}:9100"} for ip in k8s.node_ips]
+        pods     = [{"namespace": ns, "pod": p} for ns, p in zip(k8s.pod_ns, k8s.pod_names)]
+        self.latency  = latency
+        self.payloads = {
+            "node_cpu_watts": _vector(kepler, rng.uniform(60, 250, n)),
+            "node_idle_watts": _vector(kepler, rng.uniform(40, 60, n)),
+            "node_cpu_util":  _vector(exporter, rng.uniform(0, 1, n)),
+            "node_mem_util":  _vector(exporter, rng.uniform(0, 1, n)),
+            "pod_cpu_usage":  _vector(pods, rng.lognormal(-1, 0.8, len(pods))),
+            "kube_sys_cpu":   json.dumps({"status": "success", "data": {"result": [
+                {"metric": {}, "value": [0, "1.5"]}]}}).encode(),
+        }
+        self.by_query = {PROM_QUERIES[k]: v for k, v in self.payloads.items() if k in PROM_QUERIES}
+
+    def set_node_watts(self, watts):
+        """Replaces the per-node CPU power (one value per node, in node order)."""
+        self.payloads["node_cpu_watts"] = _vector(self._kepler, watts)
+        self.by_query[PROM_QUERIES["node_cpu_watts"]] = self.payloads["node_cpu_watts"]
+
+    async def query(self, q: str, ts: Optional[float] = None) -> list:
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        return decode(self.by_query[q])["data"]["result"]
+
+    async def query_many(self, queries: Dict[str, str], ts: Optional[float] = None):
+        res = await asyncio.gather(*[self.query(q, ts) for q in queries.values()])
+        return dict(zip(queries, res))
+
+    async def close(self):
+        pass
@@ -3,28 +3,160 @@
 #
 # Energy-aware PPO implementation
 # – AMP, smaller nets, torch.compile().
+# – chunked, vectorised discounted returns / GAE(λ).
+# – shuffled minibatch epochs, KL early stop, grad-norm clipping.
+# – preallocated tensor rollout buffer (RolloutBuffer).
+# – acting on CPU goes through a NumPy copy of the rollout actor
+#   (fast_inference.FastActor), refreshed after every update.
+# – replay(): importance-weighted PPO pass over stored transitions
+#   (experience_store), for reuse across updates and offline pretraining.
 
 import os
-from typing import List
+from typing import List, Optional, Tuple
 
+import numpy as np
 import torch
 import torch.nn as nn
+import torch.nn.functional as F
 from torch.distributions import Categorical
 
+from optimiser.fast_inference import FastActor
+
 # ───────── Tunables (env-overridable) ─────────
 H1 = int(os.getenv("PPO_HIDDEN_1", 32))
 H2 = int(os.getenv("PPO_HIDDEN_2", 32))
 LR_ACTOR   = float(os.getenv("PPO_LR_ACTOR", 3e-4))
 LR_CRITIC  = float(os.getenv("PPO_LR_CRITIC", 1e-3))
-K_EPOCHS   = int(os.getenv("PPO_K_EPOCHS", 40))
+K_EPOCHS   = int(os.getenv("PPO_K_EPOCHS", 10))
+MINIBATCH  = int(os.getenv("PPO_MINIBATCH", 64))          # 0 → full batch
+TARGET_KL  = float(os.getenv("PPO_TARGET_KL", 0.015))     # 0 → never stop early
+MAX_GRAD_NORM = float(os.getenv("PPO_MAX_GRAD_NORM", 0.5))  # 0 → no clipping
+ROLLOUT_CAPACITY = int(os.getenv("PPO_ROLLOUT_CAPACITY", 512))
 EPS_CLIP   = float(os.getenv("PPO_EPS_CLIP", 0.20))
 GAMMA      = float(os.getenv("PPO_GAMMA", 0.99))
+ADVANTAGE  = os.getenv("PPO_ADVANTAGE", "mc")         # "mc" | "gae"
+GAE_LAMBDA = float(os.getenv("PPO_GAE_LAMBDA", 0.95))
 N_THREADS  = int(os.getenv("PPO_NUM_THREADS", 2))
 USE_AMP    = os.getenv("PPO_MIXED_PRECISION", "1") == "1"
 DTYPE_AMP  = torch.bfloat16 if torch.cuda.is_available() else torch.bfloat16
+IS_CLIP    = float(os.getenv("PPO_IS_CLIP", 2.0))         # replay: truncation of π/μ
+FAST_SELECT = os.getenv("PPO_FAST_SELECT", "1") == "1"   # NumPy actor for acting (CPU, MC)
 
 torch.set_num_threads(N_THREADS)
 
+RETURN_CHUNK = 256          # scan block length of discounted_cumsum
+
+
+def unwrap(m: nn.Module) -> nn.Module:
+    """The plain module behind a torch.compile() wrapper."""
+    return getattr(m, "_orig_mod", m)
+
+# ───────────────────────────────────────────────
+def discounted_cumsum(x: torch.Tensor, dones: torch.Tensor, discount: float,
+                      bootstrap: float = 0.0, chunk: int = RETURN_CHUNK) -> torch.Tensor:
+    """
+    y_t = x_t + discount · (1 − done_t) · y_{t+1},  y_T = bootstrap.
+
+    The sequence is cut into blocks of ``chunk`` steps.  Within a block the
+    sum is one matmul against a Toeplitz matrix of discount powers (masked
+    where a terminal cuts the sum); only the block heads are chained in
+    Python.  Work is O(n · chunk), i.e. linear in rollout length.
+    """
+    n = x.numel()
+    if n == 0:
+        return x.clone()
+    out_dtype = x.dtype
+    x = x.reshape(-1).to(torch.float64).clone()
+    d = dones.reshape(-1).to(torch.float64)
+    x[-1] += discount * (1.0 - d[-1]) * bootstrap
+
+    L   = min(chunk, n)
+    pad = (-n) % L                          # zero-padding leaves y unchanged
+    if pad:
+        x, d = F.pad(x, (0, pad)), F.pad(d, (0, pad))
+    C    = x.numel() // L
+    X, D = x.view(C, L), d.view(C, L)
+
+    idx  = torch.arange(L, dtype=torch.float64, device=x.device)
+    expo = idx[None, :] - idx[:, None]                       # k − t
+    P    = torch.where(expo >= 0, discount ** expo.clamp(min=0), torch.zeros_like(expo))
+
+    # cnt[c, i] = terminals in block c strictly before i → alive(t,k) ⇔ cnt[t] == cnt[k]
+    cnt = torch.zeros(C, L + 1, dtype=torch.float64, device=x.device)
+    cnt[:, 1:] = D.cumsum(1)
+
+    local = X @ P.T                                          # no terminals: plain Toeplitz
+    cut   = torch.nonzero(cnt[:, L] > 0).flatten()
+    for i in range(0, cut.numel(), 64):                      # blocks with terminals
+        c    = cut[i:i + 64]
+        mask = cnt[c, :L, None] == cnt[c, None, :L]
+        local[c] = torch.einsum("ctk,ck->ct", P * mask, X[c])
+
+    carry = discount ** (L - idx)[None, :] * (cnt[:, L:] == cnt[:, :L])
+    heads, y = [0.0] * (C + 1), 0.0
+    for c, (l0, c0) in enumerate(zip(reversed(local[:, 0].tolist()),
+                                     reversed(carry[:, 0].tolist()))):
+        y = l0 + c0 * y
+        heads[C - 1 - c] = y
+    nxt = torch.tensor(heads[1:], dtype=torch.float64, device=x.device)
+    return (local + carry * nxt[:, None]).reshape(-1)[:n].to(out_dtype)
+
+
+def gae(rewards: torch.Tensor, values: torch.Tensor, dones: torch.Tensor,
+        gamma: float, lam: float, last_value: float = 0.0) -> Tuple[torch.Tensor, torch.Tensor]:
+    """GAE(λ) advantages and the matching value targets (advantage + V)."""
+    next_v = torch.cat([values[1:], values.new_tensor([last_value])])
+    delta  = rewards + gamma * (1.0 - dones) * next_v - values
+    adv    = discounted_cumsum(delta, dones, gamma * lam)
+    return adv, adv + values
+
+
+def ppo_epochs(ppo, evaluate, n: int, lp, returns, fixed_adv, K_epochs: int,
+               is_clip: float = 0.0, ref_lp=None, device=None,
+               amp: bool = False) -> Tuple[int, float, torch.Tensor]:
+    """
+    Clipped-surrogate minibatch epochs shared by PPOAgent and the node head.
+    ``ppo`` supplies policy / opt / minibatch / eps_clip / target_kl /
+    max_grad_norm; ``evaluate(idx)`` returns (log-prob, value, entropy) of
+    steps ``idx`` under the current policy.  ``lp`` is the behaviour
+    policy's log-prob.  ``is_clip`` > 0 weights the value loss by the
+    truncated ratio min(π/μ, is_clip); KL for the early stop is taken
+    against ``ref_lp`` (defaults to ``lp``).  Returns (epochs, KL, loss).
+    """
+    dev = torch.device("cpu") if device is None else device
+    mb  = ppo.minibatch if 0 < ppo.minibatch < n else n
+    epochs, kl, loss = 0, 0.0, torch.zeros(())
+    for epochs in range(1, K_epochs + 1):
+        for idx in torch.randperm(n, device=dev).split(mb):
+            with torch.autocast(dev.type, dtype=DTYPE_AMP, enabled=amp):
+                new_lp, vals, ent = evaluate(idx)
+                log_r  = new_lp - lp[idx]
+                ratios = torch.exp(log_r)
+                adv = fixed_adv[idx] if fixed_adv is not None else returns[idx] - vals.detach()
+                surr1 = ratios * adv
+                surr2 = torch.clamp(ratios, 1 - ppo.eps_clip, 1 + ppo.eps_clip) * adv
+                v_err = (vals - returns[idx]) ** 2
+                if is_clip > 0:
+                    v_err = ratios.detach().clamp(max=is_clip) * v_err
+                loss  = (-torch.min(surr1, surr2) + 0.5 * v_err - 0.01 * ent).mean()
+
+            ppo.opt.zero_grad(set_to_none=True)
+            loss.backward()
+            if ppo.max_grad_norm > 0:
+                nn.utils.clip_grad_norm_(ppo.policy.parameters(), ppo.max_grad_norm)
+            ppo.opt.step()
+
+            with torch.no_grad():               # k3 estimator of KL(ref ‖ new)
+                if ref_lp is not None:
+                    log_r = new_lp - ref_lp[idx]
+                kl = float((torch.exp(log_r) - 1 - log_r).mean())
+            if ppo.target_kl > 0 and kl > 1.5 * ppo.target_kl:
+                break
+        else:
+            continue
+        break
+    return epochs, kl, loss
+
 # ───────────────────────────────────────────────
 class PPOAgent:
     def __init__(self,
@@ -34,9 +166,21 @@ class PPOAgent:
                  lr_critic: float = LR_CRITIC,
                  gamma: float = GAMMA,
                  K_epochs: int = K_EPOCHS,
-                 eps_clip: float = EPS_CLIP):
+                 eps_clip: float = EPS_CLIP,
+                 advantage: str = ADVANTAGE,
+                 gae_lambda: float = GAE_LAMBDA,
+                 minibatch: int = MINIBATCH,
+                 target_kl: float = TARGET_KL,
+                 max_grad_norm: float = MAX_GRAD_NORM):
 
+        self.state_dim, self.action_dim = state_dim, action_dim
         self.gamma, self.K_epochs, self.eps_clip = gamma, K_epochs, eps_clip
+        if advantage not in ("mc", "gae"):
+            raise ValueError(f"unknown advantage estimator {advantage!r}")
+        self.advantage, self.gae_lambda = advantage, gae_lambda
+        self.minibatch, self.target_kl  = minibatch, target_kl
+        self.max_grad_norm = max_grad_norm
+        self.last_update: dict = {}
         self.dev = torch.device("cuda" if torch.cuda.is_available() else "cpu")
 
         self.policy     = ActorCritic(state_dim, action_dim).to(self.dev)
@@ -47,56 +191,136 @@ class PPOAgent:
             [{"params": self.policy.actor.parameters(),  "lr": lr_actor},
              {"params": self.policy.critic.parameters(), "lr": lr_critic}]
         )
-        self.mse = nn.MSELoss()
+
+        # the critic is only needed at act time for GAE → torch path then
+        self.fast = (FastActor.from_actor(self.policy_old.actor)
+                     if FAST_SELECT and advantage == "mc" and self.dev.type == "cpu" else None)
 
         if hasattr(torch, "compile"):
             self.policy = torch.compile(self.policy)
             self.policy_old = torch.compile(self.policy_old)
 
+    # ───────────────────────────────────────────
+    def state_dict(self) -> dict:
+        return {"policy": unwrap(self.policy).state_dict(), "opt": self.opt.state_dict()}
+
+    def load_state_dict(self, sd: dict):
+        unwrap(self.policy).load_state_dict(sd["policy"])
+        unwrap(self.policy_old).load_state_dict(sd["policy"])
+        if sd.get("opt"):
+            self.opt.load_state_dict(sd["opt"])
+        self._refresh_fast()
+
+    def _refresh_fast(self):
+        if self.fast is not None:
+            self.fast.load_actor(unwrap(self.policy_old).actor)
+
     # ───────────────────────────────────────────
     @torch.no_grad()
     def select_action(self, state, memory):
+        if self.fast is not None:
+            st = torch.as_tensor(state, dtype=torch.float32)
+            act, logp = self.fast.sample(st.numpy())
+            act, logp = torch.from_numpy(act)[0], torch.from_numpy(logp)[0]
+            memory.add(st, act, logp)
+            return int(act)
         st = torch.as_tensor(state, dtype=torch.float32, device=self.dev)
         with torch.autocast(self.dev.type, dtype=DTYPE_AMP, enabled=USE_AMP):
             probs = self.policy_old.actor(st)
             dist  = Categorical(probs)
             act   = dist.sample()
-        memory.states.append(st)
-        memory.actions.append(act)
-        memory.logprobs.append(dist.log_prob(act))
+            val   = self.policy_old.critic(st) if self.advantage == "gae" else None
+        memory.add(st, act, dist.log_prob(act), val)
         return int(act.item())
 
+    @torch.no_grad()
+    def select_actions(self, states, memory=None) -> np.ndarray:
+        """One forward pass for a (B, state_dim) batch; rows recorded in bulk."""
+        st = torch.as_tensor(np.asarray(states), dtype=torch.float32, device=self.dev)
+        if st.dim() == 1:
+            st = st.unsqueeze(0)
+        if self.fast is not None:
+            act, logp = self.fast.sample(st.numpy())
+            if memory is not None:
+                memory.add_batch(st, torch.from_numpy(act),
+                                 torch.from_numpy(logp.astype(np.float32)))
+            return act
+        with torch.autocast(self.dev.type, dtype=DTYPE_AMP, enabled=USE_AMP):
+            dist = Categorical(self.policy_old.actor(st))
+            act  = dist.sample()
+            val  = self.policy_old.critic(st).squeeze(-1) if self.advantage == "gae" else None
+        if memory is not None:
+            memory.add_batch(st, act, dist.log_prob(act), val)
+        return act.cpu().numpy()
+
     # ───────────────────────────────────────────
-    def update(self, memory):
-        # discounted rewards
-        R, buf = 0.0, []
-        for r, done in zip(reversed(memory.rewards), reversed(memory.is_terminals)):
-            R = r + self.gamma * R * (1.0 - done)
-            buf.insert(0, R)
-        rewards = torch.tensor(buf, dtype=torch.float32, device=self.dev)
-        rewards = (rewards - rewards.mean()) / (rewards.std(unbiased=False) + 1e-7)
-
-        s  = torch.stack(memory.states).to(self.dev)
-        a  = torch.stack(memory.actions).to(self.dev)
-        lp = torch.stack(memory.logprobs).to(self.dev)
-
-        for _ in range(self.K_epochs):
-            with torch.autocast(self.dev.type, dtype=DTYPE_AMP, enabled=USE_AMP):
-                new_lp, vals, ent = self.policy.evaluate(s, a)
-                ratios = torch.exp(new_lp - lp.detach())
-                adv = rewards - vals.detach().squeeze(-1)
-                surr1 = ratios * adv
-                surr2 = torch.clamp(ratios, 1 - self.eps_clip, 1 + self.eps_clip) * adv
-                loss  = (-torch.min(surr1, surr2)
-                         + 0.5 * self.mse(vals.squeeze(-1), rewards)
-                         - 0.01 * ent).mean()
+    def _targets(self, s, rewards, dones, vals=None) -> Tuple[torch.Tensor, Optional[torch.Tensor]]:
+        """Value targets and, for GAE, fixed advantages (MC: recomputed per epoch)."""
+        if self.advantage == "gae":
+            if vals is None:
+                with torch.no_grad():
+                    vals = self.policy.critic(s).squeeze(-1).float()
+            last = 0.0 if dones[-1] else float(vals[-1])     # truncated rollout: bootstrap
+            adv, returns = gae(rewards, vals, dones, self.gamma, self.gae_lambda, last)
+            adv = (adv - adv.mean()) / (adv.std(unbiased=False) + 1e-7)
+            return returns, adv
 
-            self.opt.zero_grad(set_to_none=True)
-            loss.backward()
-            self.opt.step()
+        returns = discounted_cumsum(rewards, dones, self.gamma)
+        returns = (returns - returns.mean()) / (returns.std(unbiased=False) + 1e-7)
+        return returns, None
+
+    def _optimise(self, s, a, lp, returns, fixed_adv, K_epochs: int,
+                  is_clip: float = 0.0, ref_lp=None) -> Tuple[int, float, torch.Tensor]:
+        """``ppo_epochs`` over the state / action rows ``s``, ``a``."""
+        def evaluate(idx):
+            new_lp, vals, ent = self.policy.evaluate(s[idx], a[idx])
+            return new_lp, vals.squeeze(-1), ent
+        return ppo_epochs(self, evaluate, s.shape[0], lp, returns, fixed_adv, K_epochs,
+                          is_clip, ref_lp, self.dev, USE_AMP)
+
+    def update(self, memory) -> dict:
+        """
+        PPO over shuffled minibatches for up to ``K_epochs`` epochs; stops as
+        soon as the approximate KL to the rollout policy exceeds
+        1.5 × ``target_kl``.  Returns (and keeps in ``last_update``) the
+        number of epochs actually run, the final approximate KL and loss.
+        """
+        s, a, lp, r, d, v = (None if x is None else x.to(self.dev)
+                             for x in memory.batch())
+        returns, fixed_adv = self._targets(s, r, d, v)
+
+        epochs, kl, loss = self._optimise(s, a, lp, returns, fixed_adv, self.K_epochs)
 
         self.policy_old.load_state_dict(self.policy.state_dict())
+        self._refresh_fast()
         memory.clear()
+        self.last_update = {"epochs": epochs, "approx_kl": kl, "loss": float(loss.detach())}
+        return self.last_update
+
+    def replay(self, rows, epochs: int = 1, is_clip: float = IS_CLIP) -> dict:
+        """
+        Off-policy PPO pass over stored transitions (an experience_store
+        record array): surrogate ratios against the stored behaviour
+        log-prob, advantages from the stored return, value loss weighted by
+        the truncated importance ratio.  The KL stop is measured against the
+        policy at the start of the pass.  Does not touch the rollout memory.
+        """
+        rows = rows[rows["action"] < self.action_dim]  # from a wider action space
+        if len(rows) == 0:
+            return {}
+        s   = torch.from_numpy(np.ascontiguousarray(rows["state"])).to(self.dev)
+        a   = torch.from_numpy(np.ascontiguousarray(rows["action"])).to(self.dev)
+        lp  = torch.from_numpy(np.ascontiguousarray(rows["logprob"])).to(self.dev)
+        ret = torch.from_numpy(np.ascontiguousarray(rows["ret"])).to(self.dev)
+        if self.advantage == "mc":              # critic is fit to normalised returns
+            ret = (ret - ret.mean()) / (ret.std(unbiased=False) + 1e-7)
+        with torch.no_grad():
+            ref_lp = self.policy.evaluate(s, a)[0].float()
+        n, kl, loss = self._optimise(s, a, lp, ret, None, epochs, is_clip, ref_lp)
+
+        self.policy_old.load_state_dict(self.policy.state_dict())
+        self._refresh_fast()
+        return {"epochs": n, "approx_kl": kl, "loss": float(loss.detach()), "rows": len(rows)}
 
 # ───────────────────────────────────────────────
 class ActorCritic(nn.Module):
@@ -121,10 +345,225 @@ class ActorCritic(nn.Module):
 
 # ───────────────────────────────────────────────
 class Memory:
+    """List-backed rollout storage (one tensor per step)."""
     def __init__(self):
         self.actions, self.states, self.logprobs = [], [], []
         self.rewards, self.is_terminals          = [], []
+        self.values = []
+
+    def add(self, state, action, logprob, value=None):
+        self.states.append(state); self.actions.append(action)
+        self.logprobs.append(logprob)
+        if value is not None:
+            self.values.append(value.reshape(()))
+
+    def add_batch(self, states, actions, logprobs, values=None):
+        self.states.extend(states.unbind(0)); self.actions.extend(actions.unbind(0))
+        self.logprobs.extend(logprobs.unbind(0))
+        if values is not None:
+            self.values.extend(values.reshape(-1).unbind(0))
+
+    def add_reward(self, reward: float, done: bool):
+        self.rewards.append(reward); self.is_terminals.append(done)
+
+    def add_rewards(self, rewards, dones):
+        self.rewards.extend(float(r) for r in rewards)
+        self.is_terminals.extend(bool(d) for d in dones)
+
+    def batch(self):
+        """(states, actions, logprobs, rewards, terminals, values | None) tensors."""
+        vals = torch.stack(self.values).float() \
+               if self.values and len(self.values) == len(self.states) else None
+        return (torch.stack(self.states), torch.stack(self.actions),
+                torch.stack(self.logprobs).detach(),
+                torch.tensor(self.rewards, dtype=torch.float32),
+                torch.tensor(self.is_terminals, dtype=torch.float32), vals)
+
+    def __len__(self):
+        return len(self.states)
+
+    def drop_pending(self):
+        n = len(self.rewards)
+        for col in (self.states, self.actions, self.logprobs, self.values):
+            del col[n:]
+
+    def keep_pending(self, keep):
+        """Keep only the rows awaiting a reward whose ``keep`` flag is set."""
+        n = len(self.rewards)
+        for col in (self.states, self.actions, self.logprobs, self.values):
+            if len(col) > n:
+                col[n:] = [x for x, k in zip(col[n:], keep) if k]
 
     def clear(self):
         self.actions.clear(); self.states.clear(); self.logprobs.clear()
-        self.rewards.clear(); self.is_terminals.clear()
+        self.rewards.clear(); self.is_terminals.clear(); self.values.clear()
+
+# ───────────────────────────────────────────────
+class RolloutBuffer:
+    """
+    Drop-in for ``Memory`` backed by preallocated contiguous tensors.
+    ``add``/``add_reward`` write one row in place (O(1)); the attributes
+    ``states``, ``actions``, … are zero-copy views of the filled prefix and
+    ``batch()`` hands those views straight to ``PPOAgent.update``.  The
+    state width is taken from the first ``add``; capacity doubles if a
+    rollout outgrows it.
+    """
+    def __init__(self, capacity: int = ROLLOUT_CAPACITY):
+        self.capacity = capacity
+        self.n = self.n_r = 0
+        self._s: Optional[torch.Tensor] = None
+        self._a  = torch.empty(capacity, dtype=torch.long)
+        self._lp = torch.empty(capacity)
+        self._v  = torch.empty(capacity)
+        self._r  = torch.empty(capacity)
+        self._d  = torch.empty(capacity)
+        self._has_v = True
+        self._bind()
+
+    def _grow(self, need: int):
+        cap = self.capacity
+        while cap < need:
+            cap *= 2
+        for name in ("_s", "_a", "_lp", "_v", "_r", "_d"):
+            old = getattr(self, name)
+            if old is None:
+                continue
+            new = old.new_empty((cap,) + tuple(old.shape[1:]))
+            new[:old.shape[0]].copy_(old)
+            setattr(self, name, new)
+        self.capacity = cap
+        self._bind()
+
+    def _bind(self):
+        # NumPy aliases of the same storage: scalar writes without torch dispatch
+        self._np = {name: getattr(self, name).numpy()
+                    for name in ("_s", "_a", "_lp", "_v", "_r", "_d")
+                    if getattr(self, name) is not None}
+
+    def add(self, state, action, logprob, value=None):
+        if self._s is None:
+            self._s = torch.empty((self.capacity,) + tuple(np.shape(state)))
+            self._bind()
+        if self.n == self.capacity:
+            self._grow(self.n + 1)
+        i, npv = self.n, self._np
+        if torch.is_tensor(state):
+            state = state.numpy() if state.dtype == torch.float32 and not state.is_cuda \
+                    else state.float().cpu().numpy()
+        npv["_s"][i]  = state
+        npv["_a"][i]  = int(action)
+        npv["_lp"][i] = float(logprob)
+        if value is None:
+            self._has_v = False
+        else:
+            npv["_v"][i] = float(value)
+        self.n += 1
+
+    def add_batch(self, states, actions, logprobs, values=None):
+        """Bulk ``add`` of B rows (tensors with a leading batch dim)."""
+        b = states.shape[0]
+        if self._s is None:
+            self._s = torch.empty((self.capacity,) + tuple(states.shape[1:]))
+            self._bind()
+        if self.n + b > self.capacity:
+            self._grow(self.n + b)
+        i, j = self.n, self.n + b
+        self._s[i:j].copy_(states)
+        self._a[i:j].copy_(actions)
+        self._lp[i:j].copy_(logprobs)
+        if values is None:
+            self._has_v = False
+        else:
+            self._v[i:j].copy_(values.reshape(-1))
+        self.n = j
+
+    def add_reward(self, reward: float, done: bool):
+        if self.n_r == self.capacity:
+            self._grow(self.n_r + 1)
+        self._np["_r"][self.n_r] = reward
+        self._np["_d"][self.n_r] = done
+        self.n_r += 1
+
+    def add_rewards(self, rewards, dones):
+        b = len(rewards)
+        if self.n_r + b > self.capacity:
+            self._grow(self.n_r + b)
+        self._np["_r"][self.n_r:self.n_r + b] = rewards
+        self._np["_d"][self.n_r:self.n_r + b] = dones
+        self.n_r += b
+
+    # zero-copy views of the filled prefix
+    @property
+    def states(self):       return self._s[:self.n] if self._s is not None else torch.empty(0)
+    @property
+    def actions(self):      return self._a[:self.n]
+    @property
+    def logprobs(self):     return self._lp[:self.n]
+    @property
+    def values(self):       return self._v[:self.n] if self._has_v else None
+    @property
+    def rewards(self):      return self._r[:self.n_r]
+    @property
+    def is_terminals(self): return self._d[:self.n_r]
+
+    def batch(self):
+        return (self.states, self.actions, self.logprobs,
+                self.rewards, self.is_terminals, self.values)
+
+    def regroup(self, n_streams: int):
+        """
+        Rows were appended round-robin from ``n_streams`` independent
+        trajectories (vectorised envs).  Reorder them stream-major so the
+        return scan sees each trajectory contiguously, and cut each one at
+        its last step.
+        """
+        if n_streams <= 1 or self.n == 0:
+            return
+        if self.n != self.n_r or self.n % n_streams:
+            raise ValueError("regroup needs whole ticks with one reward per row")
+        T   = self.n // n_streams
+        idx = torch.arange(self.n).view(T, n_streams).T.reshape(-1)
+        for name in ("_s", "_a", "_lp", "_v", "_r", "_d"):
+            col = getattr(self, name)
+            col[:self.n] = col[:self.n][idx]
+        self._d[T - 1:self.n:T] = 1.0
+
+    def state_dict(self) -> dict:
+        return {"states": self.states.clone(), "actions": self.actions.clone(),
+                "logprobs": self.logprobs.clone(),
+                "values": None if self.values is None else self.values.clone(),
+                "rewards": self.rewards.clone(), "is_terminals": self.is_terminals.clone()}
+
+    def load_state_dict(self, sd: dict):
+        self.clear()
+        if len(sd["states"]):
+            self.add_batch(sd["states"], sd["actions"], sd["logprobs"], sd["values"])
+        if len(sd["rewards"]):
+            self.add_rewards(sd["rewards"].numpy(), sd["is_terminals"].numpy())
+
+    def nbytes(self) -> int:
+        return sum(t.numel() * t.element_size()
+                   for t in (self._s, self._a, self._lp, self._v, self._r, self._d)
+                   if t is not None)
+
+    def __len__(self):
+        return self.n
+
+    def drop_pending(self):
+        """Forget the rows still waiting for their reward."""
+        self.n = min(self.n, self.n_r)
+
+    def keep_pending(self, keep):
+        """Keep only the rows awaiting a reward whose ``keep`` flag is set."""
+        if self.n <= self.n_r:
+            return
+        idx = self.n_r + torch.from_numpy(np.flatnonzero(np.asarray(keep, dtype=bool)))
+        j   = self.n_r + len(idx)
+        for name in ("_s", "_a", "_lp", "_v"):
+            col = getattr(self, name)
+            col[self.n_r:j] = col[idx]
+        self.n = j
+
+    def clear(self):
+        self.n = self.n_r = 0
+        self._has_v = True
@@ -0,0 +1,127 @@
+# SPDX-License-Identifier: Apache-2.0
+# optimiser/background_learner.py
+#
+# PPO updates off the event loop.
+# – the learner thread owns a private copy of the agent (policies + optimisers)
+# – submit() hands it a snapshot of the rollout; the live memory is cleared
+#   and keeps filling while the K-epoch update runs
+# – finished weights are published as (version, state_dict); the control
+#   loop swaps them in between two decisions via poll(), so a decision
+#   never sees half-loaded parameters
+#
+# – with an experience store and replay_rows > 0, each update is followed
+#   by an importance-weighted replay pass over stored transitions
+#
+#     learner = BackgroundLearner(agent, exporter)
+#     ...
+#     learner.poll()                        # top of every cycle; raises if an update failed
+#     if due: learner.submit(memory)        # False → still busy, try later
+
+import atexit, copy, time, logging, threading
+from typing import Any, Dict, Optional, Tuple
+
+from optimiser.decision_engine import HierarchicalAgent, HierMem
+
+log = logging.getLogger("learner")
+
+
+class BackgroundLearner:
+    def __init__(self, agent: HierarchicalAgent, exporter=None, name: str = "ppo-learner",
+                 version: int = 0, experience=None, replay_rows: int = 0,
+                 replay_max_age: int = 0):
+        self.agent    = agent                        # live, acting copy
+        self.exp      = exporter
+        self.version  = version                      # version the live agent runs
+        self.experience     = experience             # HierExperience or None
+        self.replay_rows    = replay_rows
+        self.replay_max_age = replay_max_age
+        self.last_stats: Dict[str, Any] = {}
+
+        self._learner = copy.deepcopy(agent)
+        self._batch   = HierMem()
+        self._lock    = threading.Lock()
+        self._wake    = threading.Event()
+        self._idle    = threading.Event(); self._idle.set()
+        self._stop    = False
+        self._published: Optional[Tuple[int, dict, dict]] = None
+        self._error:  Optional[BaseException] = None
+        self._thread  = threading.Thread(target=self._run, name=name, daemon=True)
+        self._thread.start()
+        atexit.register(self.close)              # never kill it mid-update
+        if exporter is not None:
+            exporter.policy_version.set(version)
+
+    # ───────────── learner thread ──────────────────────────
+    def _run(self):
+        version = self.version
+        while True:
+            self._wake.wait()
+            self._wake.clear()
+            if self._stop:
+                return
+            try:
+                t0 = time.perf_counter()
+                stats = self._learner.update(self._batch)
+                if self.experience is not None and self.replay_rows > 0:
+                    floor = version - self.replay_max_age if self.replay_max_age else None
+                    replay = self._learner.replay(self.experience, self.replay_rows,
+                                                  min_version=floor)
+                    stats.update({f"{k}_replay": v for k, v in replay.items() if v})
+                if self.exp is not None:
+                    self.exp.ppo_update_seconds.observe(time.perf_counter() - t0)
+                version += 1
+                sd = copy.deepcopy(self._learner.state_dict())
+                with self._lock:
+                    self._published = (version, sd, stats)
+            except BaseException as e:               # surfaced by poll()
+                log.exception("PPO update failed")
+                self._error = e
+            finally:
+                self._batch.clear()
+                self._idle.set()
+
+    # ───────────── control-loop side ───────────────────────
+    @property
+    def busy(self) -> bool:
+        return not self._idle.is_set()
+
+    def submit(self, memory: HierMem) -> bool:
+        """Start an update on a copy of ``memory`` (then cleared); False if still busy."""
+        if self.busy:
+            return False
+        self._batch.load_state_dict(memory.state_dict())
+        memory.clear()
+        self._idle.clear()
+        self._wake.set()
+        return True
+
+    def poll(self) -> Optional[Dict[str, Any]]:
+        """
+        Adopt the newest published weights, if any; returns that update's
+        stats.  A failed update raises RuntimeError once; the live weights
+        are kept and the learner's copy is reset to them.
+        """
+        if self._error is not None:
+            err, self._error = self._error, None
+            self.wait()                              # learner thread still clearing up
+            self._learner.load_state_dict(self.agent.state_dict())
+            raise RuntimeError("background PPO update failed") from err
+        with self._lock:
+            pub, self._published = self._published, None
+        if pub is None:
+            return None
+        self.version, sd, self.last_stats = pub
+        self.agent.load_state_dict(sd)
+        if self.exp is not None:
+            self.exp.policy_version.set(self.version)
+        return self.last_stats
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        """Block until the running update (if any) has finished."""
+        return self._idle.wait(timeout)
+
+    def close(self):
+        self._stop = True
+        self._wake.set()
+        self._thread.join(timeout=30)
+        atexit.unregister(self.close)
@@ -0,0 +1,129 @@
+# SPDX-License-Identifier: Apache-2.0
+# optimiser/binpack.py
+#
+# Drain planner: which nodes can be emptied, and where would their pods go?
+# – works on ClusterSnapshot columns (pod CPU / memory *requests*, node
+#   allocatable), the same quantities kube-scheduler checks
+# – candidates are tried least-requested first; each one's movable pods
+#   are packed first-fit-decreasing (largest CPU request first) onto the
+#   remaining nodes, best-fit or first-fit, one NumPy pass over all
+#   receivers per pod; a candidate that does not fit entirely is rolled back
+# – a node that receives pods is never drained later in the same plan
+# – DaemonSet pods are ignored (they leave with the node); pods in
+#   PINNED_NAMESPACES are never evicted, so their node is not drainable
+#
+#     plan = plan_drain(snapshot_of(state))
+#     plan.drain                          # node indexes, drain order
+#     pods, dest = plan.moves(plan.drain[0])
+
+import os, time
+from typing import Any, Dict, Tuple
+
+import numpy as np
+
+from optimiser.cluster_snapshot import ClusterSnapshot
+
+BINPACK_HEADROOM  = float(os.getenv("BINPACK_HEADROOM", 0.10))  # share of allocatable kept free
+BINPACK_MAX_DRAIN = int(os.getenv("BINPACK_MAX_DRAIN", 0))      # nodes per plan; 0 → no limit
+BINPACK_FIT       = os.getenv("BINPACK_FIT", "best")            # "best" | "first"
+PINNED_NAMESPACES = ("kube-system",)                # SoftwareActuator refuses these
+
+
+class DrainPlan:
+    """
+    Result of ``plan_drain``.  The moves of ``drain[k]`` are
+    ``pods[ptr[k]:ptr[k+1]]`` → ``dest[ptr[k]:ptr[k+1]]`` (largest first).
+    """
+    __slots__ = ("drain", "ptr", "pods", "dest", "drainable", "seconds")
+
+    def __init__(self, drain, ptr, pods, dest, n_nodes: int, seconds: float):
+        self.drain = np.asarray(drain, dtype=np.int64)
+        self.ptr   = np.asarray(ptr,   dtype=np.int64)
+        self.pods  = np.asarray(pods,  dtype=np.int64)
+        self.dest  = np.asarray(dest,  dtype=np.int64)
+        self.drainable = np.zeros(n_nodes, dtype=bool)
+        self.drainable[self.drain] = True
+        self.seconds = seconds
+
+    def __len__(self):
+        return len(self.drain)
+
+    def moves(self, node: int) -> Tuple[np.ndarray, np.ndarray]:
+        """(pod indexes, destination node indexes) planned for ``node``; empty if not drained."""
+        k = np.flatnonzero(self.drain == node)
+        if not len(k):
+            return self.pods[:0], self.dest[:0]
+        s = slice(self.ptr[k[0]], self.ptr[k[0] + 1])
+        return self.pods[s], self.dest[s]
+
+    def as_dict(self, snap: ClusterSnapshot) -> Dict[str, Any]:
+        return {"drain": [snap.node_names[i] for i in self.drain],
+                "moves": [{"pod": f"{snap.pod_ns[j]}/{snap.pod_names[j]}",
+                           "from": snap.node_names[snap.pod_node[j]],
+                           "to": snap.node_names[k]}
+                          for j, k in zip(self.pods, self.dest)],
+                "seconds": self.seconds}
+
+
+def plan_drain(snap: ClusterSnapshot,
+               headroom: float = BINPACK_HEADROOM,
+               max_drain: int = BINPACK_MAX_DRAIN,
+               fit: str = BINPACK_FIT) -> DrainPlan:
+    if fit not in ("best", "first"):
+        raise ValueError(f"unknown fit strategy {fit!r}")
+    t0 = time.perf_counter()
+    n  = snap.n_nodes
+    placed = snap.pod_node >= 0
+    node   = snap.pod_node[placed]
+    # pods without requests are packed by their observed usage
+    req_cpu = np.where(snap.pod_req_cpu > 0, snap.pod_req_cpu, snap.pod_cpu)
+    req_mem = snap.pod_req_mem
+
+    free_cpu = snap.alloc_cpu * 1000 * (1 - headroom) \
+               - np.bincount(node, weights=req_cpu[placed], minlength=n)
+    free_mem = snap.alloc_mem * (1 - headroom) \
+               - np.bincount(node, weights=req_mem[placed], minlength=n)
+
+    movable = placed & ~snap.pod_daemon
+    pinned  = movable & np.isin(np.asarray(snap.pod_ns, dtype=object), PINNED_NAMESPACES)
+    locked  = np.bincount(snap.pod_node[pinned], minlength=n) > 0    # never drained
+    is_open = np.ones(n, dtype=bool)                                  # may receive pods
+    load    = 1 - free_cpu / np.maximum(snap.alloc_cpu * 1000 * (1 - headroom), 1e-9)
+
+    drain, ptr, moved, dest = [], [0], [], []
+    for i in np.argsort(load, kind="stable"):
+        if locked[i]:
+            continue
+        if max_drain and len(drain) >= max_drain:
+            break
+        pods = snap.pods_on(i)
+        pods = pods[movable[pods]]
+        pods = pods[np.argsort(-req_cpu[pods], kind="stable")]        # decreasing
+        is_open[i] = False
+        recv = is_open & (free_cpu > 0)
+        if req_cpu[pods].sum() > free_cpu[recv].sum() or req_mem[pods].sum() > free_mem[recv].sum():
+            is_open[i] = True
+            continue
+
+        to = np.empty(len(pods), dtype=np.int64)
+        for q, j in enumerate(pods):
+            fits = recv & (free_cpu >= req_cpu[j]) & (free_mem >= req_mem[j])
+            if not fits.any():
+                break
+            k = int(np.argmin(np.where(fits, free_cpu, np.inf))) if fit == "best" \
+                else int(fits.argmax())
+            free_cpu[k] -= req_cpu[j]; free_mem[k] -= req_mem[j]
+            to[q] = k
+        else:
+            drain.append(i); moved.append(pods); dest.append(to)
+            ptr.append(ptr[-1] + len(pods))
+            locked[to] = True
+            continue
+        # roll back the partial placement, keep the node
+        np.add.at(free_cpu, to[:q], req_cpu[pods[:q]])
+        np.add.at(free_mem, to[:q], req_mem[pods[:q]])
+        is_open[i] = True
+
+    empty = np.zeros(0, dtype=np.int64)
+    return DrainPlan(drain, ptr, np.concatenate(moved) if moved else empty,
+                     np.concatenate(dest) if dest else empty, n, time.perf_counter() - t0)
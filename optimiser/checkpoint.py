@@ -0,0 +1,189 @@
+# SPDX-License-Identifier: Apache-2.0
+# optimiser/checkpoint.py
+#
+# Persistence for the hierarchical agent on the models volume (/models).
+# – atomic checkpoints: policies, optimisers, rollout buffers, counters
+# – warm start of a freshly built agent from the latest checkpoint
+# – TorchScript inference artifacts (actor MLPs only) that load in
+#   milliseconds, without torch.compile, for suggest-only mode; the same
+#   weights as .npz for the NumPy / int8 backend (INFERENCE_BACKEND)
+
+import os, logging, tempfile
+from pathlib import Path
+from typing import Any, Dict, Optional, Union
+
+import numpy as np
+import torch
+
+from optimiser.advanced_optimization import unwrap
+from optimiser.decision_engine       import HierarchicalAgent, HierMem
+from optimiser.fast_inference        import FastActor
+
+CHECKPOINT_DIR   = Path(os.getenv("CHECKPOINT_DIR", "/models"))
+CHECKPOINT_EVERY = int(os.getenv("CHECKPOINT_EVERY", 50))        # cycles; 0 → off
+CHECKPOINT_FILE  = "agent.pt"
+INFERENCE_FILES  = {"high": "policy_high.ts", "low": "policy_low.ts"}
+INFERENCE_NPZ    = "policy_actors.npz"
+INFERENCE_BACKEND = os.getenv("INFERENCE_BACKEND", "torchscript")   # | "numpy" | "int8"
+FORMAT_VERSION   = 1
+
+log = logging.getLogger("checkpoint")
+
+
+def _atomic_write(path: Path, write):
+    """``write(tmp_path)`` then fsync + rename, so readers never see a torn file."""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=path.parent, prefix=f".{path.name}.", suffix=".tmp")
+    os.close(fd)                                # per-writer name: saves never share a temp file
+    try:
+        write(Path(tmp))
+        with open(tmp, "rb") as f:
+            os.fsync(f.fileno())
+        os.replace(tmp, path)
+    except BaseException:
+        Path(tmp).unlink(missing_ok=True)
+        raise
+    dfd = os.open(path.parent, os.O_RDONLY)
+    try:
+        os.fsync(dfd)
+    finally:
+        os.close(dfd)
+
+
+# ───────────── training checkpoints ────────────────────────
+def save_checkpoint(agent: HierarchicalAgent, memory: Optional[HierMem] = None,
+                    directory: Union[str, Path] = CHECKPOINT_DIR,
+                    extra: Optional[Dict[str, Any]] = None) -> Path:
+    payload = {
+        "format":  FORMAT_VERSION,
+        "agent":   agent.state_dict(),
+        "memory":  memory.state_dict() if memory is not None else None,
+        "extra":   extra or {},
+    }
+    path = Path(directory) / CHECKPOINT_FILE
+    _atomic_write(path, lambda tmp: torch.save(payload, tmp))
+    return path
+
+
+def load_checkpoint(agent: HierarchicalAgent, memory: Optional[HierMem] = None,
+                    directory: Union[str, Path] = CHECKPOINT_DIR) -> Optional[Dict[str, Any]]:
+    """Warm-start ``agent`` (and ``memory``) in place; returns ``extra`` or None if absent."""
+    path = Path(directory) / CHECKPOINT_FILE
+    if not path.exists():
+        return None
+    payload = torch.load(path, map_location="cpu", weights_only=False)
+    if payload.get("format") != FORMAT_VERSION:
+        log.warning("ignoring %s: format %s", path, payload.get("format"))
+        return None
+    agent.load_state_dict(payload["agent"])
+    if memory is not None and payload.get("memory") is not None:
+        memory.load_state_dict(payload["memory"])
+    log.info("resumed from %s", path)
+    return payload["extra"]
+
+
+# ───────────── inference artifacts ─────────────────────────
+def export_inference(agent: HierarchicalAgent,
+                     directory: Union[str, Path] = CHECKPOINT_DIR) -> Dict[str, Path]:
+    """
+    Trace + freeze both actor MLPs (rollout policy) to TorchScript files,
+    and save their raw weights to one .npz for the NumPy backend.
+    Agents with the per-node target head export nothing (its input is a
+    ragged node matrix, not a state vector) and stale artifacts are removed.
+    """
+    out = {}
+    if getattr(agent, "node_targets", False):
+        for fname in (*INFERENCE_FILES.values(), INFERENCE_NPZ):
+            (Path(directory) / fname).unlink(missing_ok=True)
+        return out
+    arrays = {}
+    for level, fname in INFERENCE_FILES.items():
+        actor = unwrap(getattr(agent, level).policy_old).actor
+        actor = (actor.cpu() if next(actor.parameters()).is_cuda else actor)
+        dim   = actor[0].in_features
+        with torch.no_grad():
+            ts = torch.jit.freeze(torch.jit.trace(actor.eval(), torch.zeros(1, dim)).eval())
+        actor.train()
+        out[level] = Path(directory) / fname
+        _atomic_write(out[level], lambda tmp, ts=ts: torch.jit.save(ts, str(tmp)))
+        for k, m in enumerate(m for m in actor if isinstance(m, torch.nn.Linear)):
+            arrays[f"{level}_w{k}"] = m.weight.detach().float().numpy().T
+            arrays[f"{level}_b{k}"] = m.bias.detach().float().numpy()
+    out["npz"] = Path(directory) / INFERENCE_NPZ
+
+    def _savez(tmp):
+        with open(tmp, "wb") as f:
+            np.savez(f, **arrays)
+    _atomic_write(out["npz"], _savez)
+    return out
+
+
+def _load_fast(path: Path, level: str, quantize: bool, seed: Optional[int]) -> FastActor:
+    with np.load(path) as z:
+        n = sum(1 for k in z.files if k.startswith(f"{level}_w"))
+        return FastActor([z[f"{level}_w{k}"] for k in range(n)],
+                         [z[f"{level}_b{k}"] for k in range(n)], quantize, seed)
+
+
+class InferenceAgent:
+    """
+    HierarchicalAgent look-alike backed by the exported actors: TorchScript,
+    or FastActor for the "numpy" / "int8" backends.
+    Only ``select`` / ``select_batch`` are supported – no memory, no learning.
+    """
+    def __init__(self, directory: Union[str, Path] = CHECKPOINT_DIR, seed: Optional[int] = None,
+                 backend: str = INFERENCE_BACKEND):
+        d = Path(directory)
+        self.backend = backend
+        if backend in ("numpy", "int8"):
+            self.high = _load_fast(d / INFERENCE_NPZ, "high", backend == "int8", seed)
+            self.low  = _load_fast(d / INFERENCE_NPZ, "low", backend == "int8",
+                                   None if seed is None else seed + 1)
+            return
+        if backend != "torchscript":
+            raise ValueError(f"unknown inference backend {backend!r}")
+        self.high = torch.jit.load(str(d / INFERENCE_FILES["high"]), map_location="cpu")
+        self.low  = torch.jit.load(str(d / INFERENCE_FILES["low"]),  map_location="cpu")
+        self.gen  = torch.Generator()
+        if seed is not None:
+            self.gen.manual_seed(seed)
+
+    @torch.no_grad()
+    def select_batch(self, states, memory=None, snaps=None):
+        if self.backend != "torchscript":
+            st   = np.atleast_2d(np.asarray(states, dtype=np.float32))
+            fams = self.high.sample(st)[0]
+            tgts = self.low.sample(np.concatenate([st, fams[:, None].astype(np.float32)], 1))[0]
+            return fams, tgts
+        st   = torch.as_tensor(np.atleast_2d(np.asarray(states, dtype=np.float32)))
+        fams = torch.multinomial(self.high(st), 1, generator=self.gen)
+        tgts = torch.multinomial(self.low(torch.cat([st, fams.float()], 1)), 1,
+                                 generator=self.gen)
+        return fams.squeeze(1).numpy(), tgts.squeeze(1).numpy()
+
+    def select(self, state_vec, memory=None, snap=None):
+        fams, tgts = self.select_batch(np.asarray(state_vec, dtype=np.float32)[None])
+        return int(fams[0]), int(tgts[0])
+
+    def update(self, memory=None) -> dict:
+        return {}
+
+
+def inference_available(directory: Union[str, Path] = CHECKPOINT_DIR,
+                        backend: str = INFERENCE_BACKEND) -> bool:
+    files = INFERENCE_FILES.values() if backend == "torchscript" else (INFERENCE_NPZ,)
+    return all((Path(directory) / f).exists() for f in files)
+
+
+def build_agent(state_dim: int, max_nodes: int, max_pods: int, suggest_only: bool = False,
+                directory: Union[str, Path] = CHECKPOINT_DIR):
+    """
+    Suggest-only with an exported artifact → InferenceAgent (no compile,
+    loads in ms).  Otherwise a HierarchicalAgent, warm-started from the
+    checkpoint when one exists.
+    """
+    if suggest_only and inference_available(directory):
+        return InferenceAgent(directory)
+    agent = HierarchicalAgent(state_dim, max_nodes, max_pods)
+    load_checkpoint(agent, None, directory)
+    return agent
@@ -0,0 +1,258 @@
+# SPDX-License-Identifier: Apache-2.0
+# optimiser/cluster_snapshot.py
+#
+# Columnar (NumPy) view of one cluster-state observation.
+# – dense per-node / per-pod arrays, name → index map
+# – CSR node → pods index, so "pods on node i" is a slice
+# – state-vector features and total power computed vectorised
+#
+# The dict schema of StateBuilder ("nodes", "pods") is kept as read-only
+# Mapping views over the arrays; rows are only materialised on access.
+
+from collections.abc import Mapping
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+N_FEATURES    = 12
+NODE_FEATURES = 6           # columns of ClusterSnapshot.node_features()
+# state-vector slots 7.. filled from StateEngine / simulator history
+ROLLING_FEATURES = ("power_trend", "util_variance", "pod_churn_rate", "idle_power_fraction")
+
+
+class ClusterSnapshot:
+    __slots__ = ("ts", "node_names", "node_index", "node_ips", "alloc_cpu", "alloc_mem",
+                 "cpu_util", "mem_util", "power",
+                 "pod_uids", "pod_names", "pod_ns", "pod_node", "pod_cpu",
+                 "pod_labels", "pod_req_cpu", "pod_req_mem", "pod_daemon",
+                 "node_ptr", "node_pods", "kube_sys_cpu", "rolling")
+
+    def __init__(self,
+                 node_names: List[str],
+                 alloc_cpu, alloc_mem, cpu_util, mem_util, power,
+                 pod_uids: List[str], pod_names: List[str], pod_ns: List[str],
+                 pod_node, pod_cpu,
+                 kube_sys_cpu: float = 0.0,
+                 ts: Optional[float] = None,
+                 pod_labels: Optional[List[Dict[str, str]]] = None,
+                 pod_req_cpu=None, pod_req_mem=None, pod_daemon=None,
+                 node_ips: Optional[List[Optional[str]]] = None):
+        self.ts         = ts
+        self.node_names = node_names
+        self.node_index = {n: i for i, n in enumerate(node_names)}
+        self.node_ips   = node_ips                               # InternalIP; may be None
+        self.alloc_cpu  = np.asarray(alloc_cpu, dtype=np.float64)
+        self.alloc_mem  = np.asarray(alloc_mem, dtype=np.float64)
+        self.cpu_util   = np.asarray(cpu_util,  dtype=np.float64)
+        self.mem_util   = np.asarray(mem_util,  dtype=np.float64)
+        self.power      = np.asarray(power,     dtype=np.float64)
+
+        self.pod_uids   = pod_uids
+        self.pod_names  = pod_names
+        self.pod_ns     = pod_ns
+        self.pod_node   = np.asarray(pod_node, dtype=np.int32)   # -1 = unscheduled
+        self.pod_cpu    = np.asarray(pod_cpu,  dtype=np.float64) # millicores
+        self.pod_labels = pod_labels                             # PDB matching; may be None
+        n_pods = len(pod_uids)
+        self.pod_req_cpu = _col(pod_req_cpu, n_pods, np.float64)   # millicores, 0 = none
+        self.pod_req_mem = _col(pod_req_mem, n_pods, np.float64)   # bytes
+        self.pod_daemon  = _col(pod_daemon,  n_pods, bool)         # DaemonSet-owned
+        self.kube_sys_cpu = float(kube_sys_cpu)
+        self.rolling    = None                                   # ROLLING_FEATURES values
+
+        # CSR: pods of node i are node_pods[node_ptr[i]:node_ptr[i+1]]
+        placed = self.pod_node >= 0
+        counts = np.bincount(self.pod_node[placed], minlength=len(node_names))
+        self.node_ptr  = np.zeros(len(node_names) + 1, dtype=np.int64)
+        np.cumsum(counts, out=self.node_ptr[1:])
+        order = np.argsort(self.pod_node, kind="stable")
+        self.node_pods = order[len(order) - int(placed.sum()):]
+
+    # ───────────── constructors ─────────────────────────────
+    @classmethod
+    def from_state(cls, state: Dict[str, Any]) -> "ClusterSnapshot":
+        """From a plain dict-of-dicts state (recorded traces, tests, simulators)."""
+        nodes = state["nodes"]
+        names = list(nodes)
+        index = {n: i for i, n in enumerate(names)}
+        rows  = list(nodes.values())
+        pods  = state["pods"]
+        prow  = list(pods.values())
+        cw    = state.get("cluster_wide", {})
+        snap  = cls(
+            names,
+            [n.get("alloc_cpu", 0.0) for n in rows],
+            [n.get("alloc_mem", 0.0) for n in rows],
+            [n.get("cpu_util", 0.0) for n in rows],
+            [n.get("mem_util", 0.0) for n in rows],
+            [n.get("cpu_power_watts", 0.0) for n in rows],
+            list(pods),
+            [p.get("name", "") for p in prow],
+            [p.get("namespace", "") for p in prow],
+            [index.get(p.get("node"), -1) for p in prow],
+            [p.get("cpu_millicores", p.get("cpu_mcores", 0.0)) for p in prow],
+            kube_sys_cpu=_scalar(cw.get("kube_system_cpu_overhead")),
+            ts=state.get("ts"),
+            pod_labels=[p.get("labels") for p in prow],
+            pod_req_cpu=[p.get("req_cpu_millicores", 0.0) for p in prow],
+            pod_req_mem=[p.get("req_mem_bytes", 0.0) for p in prow],
+            pod_daemon=[p.get("daemon", False) for p in prow])
+        if any(k in cw for k in ROLLING_FEATURES):
+            snap.rolling = np.array([_scalar(cw.get(k)) for k in ROLLING_FEATURES], dtype=np.float32)
+        return snap
+
+    def subset(self, keep: np.ndarray) -> "ClusterSnapshot":
+        """
+        Snapshot of the nodes where ``keep`` (bool per node row) and the
+        pods placed on them; cluster-level fields (kube-system CPU, rolling
+        features, ts) are carried over unchanged.
+        """
+        rows  = np.flatnonzero(keep)
+        remap = np.full(self.n_nodes + 1, -1, dtype=np.int32)   # [-1] → -1: unscheduled
+        remap[rows] = np.arange(len(rows), dtype=np.int32)
+        pods  = np.flatnonzero(remap[self.pod_node] >= 0)
+        ri, pj = rows.tolist(), pods.tolist()
+        pick  = lambda xs: None if xs is None else list(map(xs.__getitem__, ri))
+        ppick = lambda xs: None if xs is None else list(map(xs.__getitem__, pj))
+        snap  = ClusterSnapshot(
+            pick(self.node_names), self.alloc_cpu[rows], self.alloc_mem[rows],
+            self.cpu_util[rows], self.mem_util[rows], self.power[rows],
+            ppick(self.pod_uids), ppick(self.pod_names), ppick(self.pod_ns),
+            remap[self.pod_node[pods]], self.pod_cpu[pods],
+            kube_sys_cpu=self.kube_sys_cpu, ts=self.ts,
+            pod_labels=ppick(self.pod_labels),
+            pod_req_cpu=self.pod_req_cpu[pods], pod_req_mem=self.pod_req_mem[pods],
+            pod_daemon=self.pod_daemon[pods], node_ips=pick(self.node_ips))
+        snap.rolling = self.rolling
+        return snap
+
+    # ───────────── queries ──────────────────────────────────
+    @property
+    def n_nodes(self) -> int:
+        return len(self.node_names)
+
+    @property
+    def n_pods(self) -> int:
+        return len(self.pod_uids)
+
+    def pods_on(self, node_idx: int) -> np.ndarray:
+        return self.node_pods[self.node_ptr[node_idx]:self.node_ptr[node_idx + 1]]
+
+    def pods_per_node(self) -> np.ndarray:
+        return np.diff(self.node_ptr)
+
+    def total_power(self) -> float:
+        return float(self.power.sum())
+
+    def features(self) -> np.ndarray:
+        """The 12-slot state vector consumed by the agent."""
+        v = np.zeros(N_FEATURES, dtype=np.float32)
+        if not self.n_nodes:
+            return v
+        v[0] = self.n_nodes
+        v[1] = self.n_pods
+        v[2] = self.power.mean()
+        v[3] = self.power.max()
+        v[4] = self.cpu_util.mean()
+        v[5] = self.cpu_util.max()
+        v[6] = self.kube_sys_cpu
+        if self.rolling is not None:
+            v[7:7 + len(ROLLING_FEATURES)] = self.rolling
+        return v                                  # 11 reserved
+
+    def rolling_dict(self) -> Dict[str, float]:
+        """Rolling features by name ({} without history), for ``cluster_wide``."""
+        if self.rolling is None:
+            return {}
+        return {k: float(v) for k, v in zip(ROLLING_FEATURES, self.rolling)}
+
+    def node_features(self) -> np.ndarray:
+        """
+        (n_nodes, NODE_FEATURES) float32, one row per node, every column
+        scaled to ~[0, 1] so a shared scorer sees the same ranges at any
+        cluster size: cpu util, mem util, power / max power, pods / max
+        pods, allocatable cpu / max, pod cpu requests-in-use / allocatable.
+        """
+        x = np.zeros((self.n_nodes, NODE_FEATURES), dtype=np.float32)
+        if not self.n_nodes:
+            return x
+        pods   = self.pods_per_node()
+        placed = self.pod_node >= 0
+        used   = np.bincount(self.pod_node[placed], weights=self.pod_cpu[placed],
+                             minlength=self.n_nodes)                     # millicores
+        x[:, 0] = self.cpu_util
+        x[:, 1] = self.mem_util
+        x[:, 2] = self.power / max(self.power.max(), 1e-9)
+        x[:, 3] = pods / max(pods.max(), 1)
+        x[:, 4] = self.alloc_cpu / max(self.alloc_cpu.max(), 1e-9)
+        x[:, 5] = used / np.maximum(self.alloc_cpu * 1000, 1e-9)
+        return x
+
+    # ───────────── dict-schema views ────────────────────────
+    def ip_of(self, i: int) -> Optional[str]:
+        return self.node_ips[i] if self.node_ips is not None else None
+
+    def labels_of(self, j: int) -> Dict[str, str]:
+        return (self.pod_labels[j] if self.pod_labels is not None else None) or {}
+
+    def node_row(self, i: int) -> Dict[str, Any]:
+        return {
+            "alloc_cpu": float(self.alloc_cpu[i]),
+            "alloc_mem": float(self.alloc_mem[i]),
+            "cpu_util":  float(self.cpu_util[i]),
+            "mem_util":  float(self.mem_util[i]),
+            "cpu_power_watts": float(self.power[i]),
+        }
+
+    def pod_row(self, j: int) -> Dict[str, Any]:
+        n = self.pod_node[j]
+        return {
+            "name":      self.pod_names[j],
+            "namespace": self.pod_ns[j],
+            "node":      self.node_names[n] if n >= 0 else None,
+            "cpu_millicores": float(self.pod_cpu[j]),
+            "req_cpu_millicores": float(self.pod_req_cpu[j]),
+            "req_mem_bytes": float(self.pod_req_mem[j]),
+            "daemon": bool(self.pod_daemon[j]),
+        }
+
+    def nodes_view(self) -> "_RowView":
+        return _RowView(self.node_names, self.node_index, self.node_row)
+
+    def pods_view(self) -> "_RowView":
+        return _RowView(self.pod_uids, None, self.pod_row)
+
+
+class _RowView(Mapping):
+    """Read-only ``{key: row-dict}`` over snapshot columns."""
+    __slots__ = ("_keys", "_index", "_row")
+
+    def __init__(self, keys: List[str], index: Optional[Dict[str, int]], row):
+        self._keys, self._index, self._row = keys, index, row
+
+    def __getitem__(self, key):
+        if self._index is None:
+            self._index = {k: i for i, k in enumerate(self._keys)}
+        return self._row(self._index[key])
+
+    def __iter__(self):
+        return iter(self._keys)
+
+    def __len__(self):
+        return len(self._keys)
+
+
+# ───────────── helpers ──────────────────────────────────────
+def _col(x, n: int, dtype) -> np.ndarray:
+    return np.zeros(n, dtype=dtype) if x is None else np.asarray(x, dtype=dtype)
+
+
+def _scalar(x) -> float:
+    if isinstance(x, dict):                 # un-flattened single-series result
+        x = next(iter(x.values()), 0.0)
+    return float(x) if isinstance(x, (int, float)) else 0.0
+
+
+def snapshot_of(state: Dict[str, Any]) -> ClusterSnapshot:
+    snap = state.get("snapshot")
+    return snap if snap is not None else ClusterSnapshot.from_state(state)
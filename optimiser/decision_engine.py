@@ -1,10 +1,36 @@
+import os
 import numpy as np
-from .advanced_optimization import PPOAgent, Memory
+from .advanced_optimization import PPOAgent, RolloutBuffer
+from .node_policy import NodeRollout, NodeTargetPolicy
+
+# "gray": one softmax over 2**bits Gray-coded indexes (sized by max_nodes)
+# "node": NodeTargetPolicy scores the snapshot's per-node feature matrix
+TARGET_HEAD = os.getenv("TARGET_HEAD", "gray")
+EVICTING_FAMILIES = (1, 2)          # CONSOLIDATE, DEFRAG: need pods on the target
 
 # MEMORY WRAPPER FOR 2-LEVEL POLICY
 class HierMem:
     def __init__(self):
-        self.high, self.low = Memory(), Memory()
+        self.high, self.low = RolloutBuffer(), RolloutBuffer()
+    def add_reward(self, reward: float, done: bool = False):
+        self.high.add_reward(reward, done); self.low.add_reward(reward, done)
+    def add_rewards(self, rewards, dones=None):
+        dones = np.zeros(len(rewards), dtype=bool) if dones is None else dones
+        self.high.add_rewards(rewards, dones); self.low.add_rewards(rewards, dones)
+    def regroup(self, n_streams: int):
+        self.high.regroup(n_streams); self.low.regroup(n_streams)
+    def state_dict(self) -> dict:
+        return {"high": self.high.state_dict(), "low": self.low.state_dict()}
+    def load_state_dict(self, sd: dict):
+        if sd["low"].get("kind") == "node" and not isinstance(self.low, NodeRollout):
+            self.low = NodeRollout()
+        self.high.load_state_dict(sd["high"]); self.low.load_state_dict(sd["low"])
+    def drop_pending(self):
+        """Undo the rows of a cycle that ended before its reward was added."""
+        self.high.drop_pending(); self.low.drop_pending()
+    def keep_pending(self, keep):
+        """Keep only the pending rows flagged in ``keep`` (one flag per row, both levels)."""
+        self.high.keep_pending(keep); self.low.keep_pending(keep)
     def clear(self):
         self.high.clear(); self.low.clear()
 
@@ -13,22 +39,111 @@ class HierarchicalAgent:
     High-level   – chooses ACTION_FAMILY  (0..3)
     Low-level    – chooses PARAM (target node / pod / knob)
     """
-    def __init__(self, state_dim, max_nodes, max_pods):
+    def __init__(self, state_dim, max_nodes, max_pods, target_head: str = TARGET_HEAD):
         # family: DO_NOTHING, CONSOLIDATE, DEFRAG, HW_TUNE
         self.high = PPOAgent(state_dim, 4)
-        # low: binary split of 'index' (node=0-(max_nodes-1) or
-        #      pod=0-(max_pods-1) encoded as Gray code bits)
-        self.target_bits = int(np.ceil(np.log2(max(max_nodes, max_pods))))
-        self.low  = PPOAgent(state_dim + 1, 2 ** self.target_bits)
+        self.target_head = target_head
+        if target_head == "node":
+            # low: one score per node row of the snapshot; size-independent
+            self.target_bits = 0
+            self.low = NodeTargetPolicy(4)
+        elif target_head == "gray":
+            # low: binary split of 'index' (node=0-(max_nodes-1) or
+            #      pod=0-(max_pods-1) encoded as Gray code bits)
+            self.target_bits = int(np.ceil(np.log2(max(max_nodes, max_pods))))
+            self.low  = PPOAgent(state_dim + 1, 2 ** self.target_bits)
+        else:
+            raise ValueError(f"unknown target head {target_head!r}")
+
+    @property
+    def node_targets(self) -> bool:
+        """Targets are row indexes of ``snap.node_names`` (needs ``snap=``)."""
+        return self.target_head == "node"
+
+    def _node_rollout(self, memory):
+        if memory is None:
+            return None
+        if not isinstance(memory.low, NodeRollout):
+            if len(memory.low):
+                raise ValueError("memory holds Gray-code target rows")
+            memory.low = NodeRollout()
+        return memory.low
+
+    def _select_node(self, fam: int, snap, rollout) -> int:
+        mask = snap.pods_per_node() > 0 if fam in EVICTING_FAMILIES \
+               else np.ones(snap.n_nodes, dtype=bool)
+        return self.low.select_action(snap.node_features(), mask, fam, rollout)
 
     # ----------------------------------------------------
-    def select(self, state_vec: np.ndarray, memory: HierMem):
+    def select(self, state_vec: np.ndarray, memory: HierMem, snap=None):
         fam = self.high.select_action(state_vec, memory.high)
+        if self.node_targets:
+            return fam, self._select_node(fam, snap, self._node_rollout(memory))
         # add family id as extra feature for the lower policy
         low_state = np.append(state_vec, fam)
         tgt = self.low.select_action(low_state, memory.low)
         return fam, tgt
 
-    def update(self, memory: HierMem):
-        self.high.update(memory.high)
-        self.low.update(memory.low)
+    def select_batch(self, states: np.ndarray, memory: HierMem = None, snaps=None):
+        """
+        Score B state vectors (several clusters, what-if states per node, …)
+        with one forward pass per level.  Returns (families, targets) arrays
+        and records every row; the caller adds B rewards via
+        ``HierMem.add_rewards``.  The node head needs ``snaps``: one
+        ClusterSnapshot per row, or a single one shared by all rows.
+        """
+        states = np.asarray(states, dtype=np.float32)
+        fams = self.high.select_actions(states, memory and memory.high)
+        if self.node_targets:
+            rollout = self._node_rollout(memory)
+            snaps = snaps if isinstance(snaps, (list, tuple)) else [snaps] * len(fams)
+            tgts = np.fromiter((self._select_node(int(f), s, rollout)
+                                for f, s in zip(fams, snaps)), dtype=np.int64, count=len(fams))
+            return fams, tgts
+        low_states = np.concatenate([states, fams[:, None].astype(np.float32)], axis=1)
+        tgts = self.low.select_actions(low_states, memory and memory.low)
+        return fams, tgts
+
+    def state_dict(self) -> dict:
+        return {"target_bits": self.target_bits, "target_head": self.target_head,
+                "high": self.high.state_dict(), "low": self.low.state_dict()}
+
+    def load_state_dict(self, sd: dict):
+        head = sd.get("target_head", "gray")
+        if head != self.target_head:
+            raise ValueError(f"checkpoint has a {head!r} target head, "
+                             f"agent has {self.target_head!r}")
+        if sd["target_bits"] != self.target_bits:
+            raise ValueError(f"checkpoint has {sd['target_bits']} target bits, "
+                             f"agent has {self.target_bits}")
+        self.high.load_state_dict(sd["high"]); self.low.load_state_dict(sd["low"])
+
+    def update(self, memory: HierMem) -> dict:
+        """Per-level stats; a level with nothing recorded is left out."""
+        stats = {"high": self.high.update(memory.high), "low": self.low.update(memory.low)}
+        return {k: v for k, v in stats.items() if v}
+
+    def replay(self, experience, rows: int, epochs: int = 1, min_version: int = None,
+               rng: np.random.Generator = None) -> dict:
+        """
+        Importance-weighted PPO pass per level over ``rows`` transitions
+        sampled from a HierExperience.  The node head's level is not stored,
+        so only the family policy replays then.
+        """
+        out = {}
+        for level in ("high",) if self.node_targets else ("high", "low"):
+            store = getattr(experience, level)
+            if store is None:
+                continue
+            sample = store.sample(rows, rng, min_version)
+            out[level] = getattr(self, level).replay(sample, epochs)
+        return out
+
+    def pretrain(self, experience, steps: int, rows: int,
+                 rng: np.random.Generator = None) -> dict:
+        """Offline: ``steps`` replay passes with no environment interaction."""
+        rng = rng or np.random.default_rng()
+        out = {}
+        for _ in range(steps):
+            out = self.replay(experience, rows, rng=rng)
+        return out
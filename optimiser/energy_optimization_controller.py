@@ -3,17 +3,57 @@
 #
 # Async controller that: pulls cluster state, lets the hierarchical RL agent
 # choose an action, executes it, measures Δ power, updates Prometheus gauges.
+# Learned state is checkpointed to CHECKPOINT_DIR and resumed on start-up;
+# in suggest-only mode nothing is executed and nothing is learned.
+# PPO updates run on a BackgroundLearner thread unless BACKGROUND_LEARNER=0.
+# After an action, power is polled until it stops moving (SETTLE_TOL over
+# SETTLE_STABLE polls) or the settle cap is hit; that last reading is reused
+# as the next cycle's observation.  Polls are at least one Prometheus step
+# apart, so each one reads a new (uncached) step-aligned sample.  Only the
+# observation enters the rolling state features (one window slot per
+# cycle); settle polls do not.
+# With ACTION_BATCH > 1 one cycle proposes several actions on distinct nodes;
+# they run concurrently (ACTION_CONCURRENCY), evictions are checked against
+# PodDisruptionBudgets, and the measured Δ power is attributed per action.
+# BINPACK_MODE runs the drain planner (optimiser/binpack.py) every cycle:
+#   mask      CONSOLIDATE / DEFRAGMENT on a node the plan cannot empty → no-op
+#   fallback  … retargeted to the next drainable node instead
+#   only      the planner alone proposes CONSOLIDATE actions; nothing is learned
+# The agent's rows for actions the plan masks or retargets are not learned on.
+# With a plan, evictions follow its order (largest request first).
+# HARDWARE_TUNE labels the node and, with NODE_TUNER_URL set, also asks the
+# node's tuner daemon (optimiser/node_tuner.py) to apply the profile now.
+# Every rollout is also appended to the on-disk experience store
+# (optimiser/experience_store.py, <checkpoint dir>/experience) before it
+# is learned on; with REPLAY_ROWS > 0 each update is followed by a replay
+# pass over stored transitions.
+# With SHARD_LEASES set (optimiser/sharding.py) several replicas split the
+# nodes: each observes, rewards and acts on the nodes of the shards it
+# holds a lease for, and exports the cluster-wide power next to its own.
 
-import os, json, time, asyncio
+import os, time, asyncio, logging
+from contextlib import contextmanager
 from pathlib import Path
-from typing import Dict, Any, Tuple
+from typing import Dict, Any, List, Optional, Tuple
 
 import numpy as np
 from kubernetes import client
 
 from optimiser.exporter         import Exporter
-from optimiser.software_actuator import SoftwareActuator
+from optimiser.k8s_io           import K8sExecutor, monitor_loop_lag
+from optimiser.software_actuator import SoftwareActuator, DisruptionBudgets
 from optimiser.decision_engine   import HierarchicalAgent, HierMem
+from optimiser.cluster_snapshot  import snapshot_of
+from optimiser.background_learner import BackgroundLearner
+from optimiser.suggestion_log    import SuggestionLog
+from optimiser.experience_store  import (EXPERIENCE_STORE, REPLAY_ROWS, REPLAY_MAX_AGE,
+                                         HierExperience)
+from optimiser.binpack           import DrainPlan, plan_drain
+from optimiser.node_tuner        import request_tune
+from optimiser.sharding          import ShardCoordinator, coordinator_from_env
+from optimiser.checkpoint        import (CHECKPOINT_DIR, CHECKPOINT_EVERY,
+                                         save_checkpoint, export_inference,
+                                         load_checkpoint)
 
 # ────────────── constants ─────────────────────────────────────────────
 ACTION_DO_NOTHING    = 0
@@ -24,12 +64,23 @@ ACTION_NAMES = (
     "DO_NOTHING", "CONSOLIDATE", "DEFRAGMENT", "HARDWARE_TUNE"
 )
 
-SUGGESTION_DIR = Path("/tmp/k8s_optimizer_suggestions")
+SUGGESTION_DIR = Path(os.getenv("SUGGESTION_DIR", "/tmp/k8s_optimizer_suggestions"))
 TRIGGER_FILE   = Path("/tmp/k8s_optimizer_trigger.signal")
+BACKGROUND_LEARNER = os.getenv("BACKGROUND_LEARNER", "1") == "1"
+SETTLE_POLL    = float(os.getenv("SETTLE_POLL", 10))      # s between power reads (≥ PROM_STEP)
+SETTLE_TOL     = float(os.getenv("SETTLE_TOL", 0.02))     # relative Δ counted as flat
+SETTLE_STABLE  = int(os.getenv("SETTLE_STABLE", 2))       # flat polls needed
+STATE_MAX_AGE  = float(os.getenv("STATE_MAX_AGE", 30))    # s a settle reading stays usable
+ACTION_BATCH   = int(os.getenv("ACTION_BATCH", 1))        # actions proposed per cycle
+ACTION_CONCURRENCY = int(os.getenv("ACTION_CONCURRENCY", 4))   # API calls in flight
+NODE_TUNER_URL = os.getenv("NODE_TUNER_URL", "")          # e.g. "http://{ip}:9110"; "" → label only
+TUNE_PROFILE   = "cpusave"
+BINPACK_MODE   = os.getenv("BINPACK_MODE", "off")         # off | mask | fallback | only
+SUGGEST_ONLY   = os.getenv("SUGGEST_ONLY", os.getenv("DRY_RUN", "false")).lower() in ("1", "true")
 
 # ────────────── helpers ───────────────────────────────────────────────
 def _power(state: Dict[str, Any]) -> float:
-    return sum(n.get("cpu_power_watts", 0.0) for n in state["nodes"].values())
+    return snapshot_of(state).total_power()
 
 
 # ────────────── controller class ──────────────────────────────────────
@@ -39,9 +90,24 @@ class OptimizationController:
         agent:          HierarchicalAgent,
         data_collector,                     # StateBuilder-like (async)
         memory:         HierMem,
-        exporter:       Exporter,
+        exporter:       Optional[Exporter],
         update_timestep: int = 400,
+        core_v1                 = None,     # CoreV1Api-like; simulators pass themselves
+        verbose:        bool    = True,
+        checkpoint_dir: Optional[Path] = CHECKPOINT_DIR,   # None → no persistence
+        checkpoint_every: int   = CHECKPOINT_EVERY,
+        suggest_only:   bool    = SUGGEST_ONLY,
+        background_learning: bool = BACKGROUND_LEARNER,
+        action_batch:   int     = ACTION_BATCH,
+        policy_v1               = None,     # PolicyV1Api-like, for PDB checks
+        binpack_mode:   str     = BINPACK_MODE,
+        experience_store: bool  = EXPERIENCE_STORE,
+        experience_dir: Optional[Path] = None,   # None → <checkpoint_dir>/experience
+        replay_rows:    int     = REPLAY_ROWS,
+        shards: Optional[ShardCoordinator] = None,  # None → from SHARD_LEASES (off if unset)
     ):
+        if binpack_mode not in ("off", "mask", "fallback", "only"):
+            raise ValueError(f"unknown BINPACK_MODE {binpack_mode!r}")
         self.agent      = agent
         self.sb         = data_collector
         self.memory     = memory
@@ -49,107 +115,472 @@ class OptimizationController:
         self.update_ts  = update_timestep
         self.t          = 0
         self.saved_w    = 0.0
+        self.version    = 0                 # policy updates so far (sync learner)
+        self.replay_rows = replay_rows
+        self.verbose    = verbose
+        self.ckpt_dir   = checkpoint_dir
+        self.ckpt_every = checkpoint_every
+        self.suggest_only = suggest_only
+        self.action_batch = max(1, action_batch)
+        self.binpack_mode = binpack_mode
+        self.learning   = not suggest_only and binpack_mode != "only"
+        self.log        = logging.getLogger("controller")
 
-        self.v1         = client.CoreV1Api()
-        self.sw_act     = SoftwareActuator(self.v1)
+        self.v1         = core_v1 if core_v1 is not None else client.CoreV1Api()
+        self.sw_act     = SoftwareActuator(self.v1, exporter)
+        self.io         = K8sExecutor(exporter=exporter)
+        self.policy_v1  = policy_v1 if policy_v1 is not None else (
+            client.PolicyV1Api() if core_v1 is None else
+            core_v1 if hasattr(core_v1, "list_pod_disruption_budget_for_all_namespaces") else None)
+        self._act_sem   = asyncio.Semaphore(ACTION_CONCURRENCY)
+        # a poll inside the same step would hit PromQueryEngine's cache
+        self._prom_step = getattr(getattr(data_collector, "prom", None), "step", 0) or 0
+        # collectors without ``commit`` advance their rolling features on every read
+        self._commit    = getattr(data_collector, "commit", None)
 
-        SUGGESTION_DIR.mkdir(parents=True, exist_ok=True)
+        self.shards     = shards if shards is not None else coordinator_from_env(exporter)
+        self.sug_log    = SuggestionLog(SUGGESTION_DIR)
         TRIGGER_FILE.unlink(missing_ok=True)
 
+        shared_ckpt = None
+        if self.ckpt_dir is not None and self.shards is not None:
+            # replicas never write the same files: one directory per slot,
+            # the shared checkpoint only seeds a slot that has none yet
+            if self.shards.slot is None:            # not started yet
+                self.shards.sync()
+            shared_ckpt   = Path(self.ckpt_dir)
+            self.ckpt_dir = (shared_ckpt / f"replica-{self.shards.slot}"
+                             if self.shards.slot is not None else None)
+            if self.ckpt_dir is None:
+                self.log.warning("no shard slot free; not persisting this replica")
+
+        if self.ckpt_dir is not None and not suggest_only:
+            extra = load_checkpoint(agent, memory, self.ckpt_dir)
+            if extra is None and shared_ckpt is not None:
+                load_checkpoint(agent, None, shared_ckpt)
+            if extra:
+                self.t       = extra.get("t", 0)
+                self.saved_w = extra.get("saved_w", 0.0)
+                self.version = extra.get("version", 0)
+
+        if experience_dir is None and self.ckpt_dir is not None:
+            experience_dir = Path(self.ckpt_dir) / "experience"   # per slot when sharded
+        self.experience = (HierExperience(experience_dir)
+                           if experience_store and self.ckpt_dir is not None and self.learning
+                           else None)
+        self.learner    = (BackgroundLearner(agent, exporter, version=self.version,
+                                             experience=self.experience,
+                                             replay_rows=replay_rows,
+                                             replay_max_age=REPLAY_MAX_AGE)
+                           if background_learning and self.learning else None)
+        self._update_due = False
+        self._next_state: Optional[Tuple[float, Dict[str, Any]]] = None
+
+    # ──────────────────────────────────────────────────────────────
+    def checkpoint(self):
+        """Blocking; run off-loop.  Training state + inference artifact."""
+        if self.shards is not None and not self.shards.holds_slot:
+            self.log.warning("slot %s not held; skipping checkpoint", self.shards.slot)
+            return
+        save_checkpoint(self.agent, self.memory, self.ckpt_dir,
+                        extra={"t": self.t, "saved_w": self.saved_w,
+                               "version": self.policy_version})
+        export_inference(self.agent, self.ckpt_dir)
+
+    @property
+    def policy_version(self) -> int:
+        return self.learner.version if self.learner is not None else self.version
+
+    def _remember(self):
+        """Rollout → experience store; before the update clears it."""
+        if self.experience is not None:
+            self.experience.append(self.memory, self.policy_version)
+
+    @contextmanager
+    def _phase(self, name: str):
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            if self.exp is not None:
+                self.exp.cycle_phase_seconds.labels(name).observe(time.perf_counter() - t0)
+
+    async def _state(self, commit: bool = False) -> Dict[str, Any]:
+        """
+        Cluster state; sharded, narrowed to the nodes of the held shards.
+        ``commit`` adds the reading to the rolling features.
+        """
+        st = await (self.sb.get_cluster_state(commit=commit) if self._commit is not None
+                    else self.sb.get_cluster_state())
+        if self.shards is None:
+            return st
+        full = snapshot_of(st)
+        snap = full.subset(self.shards.mask(full.node_names))
+        if self.exp is not None:
+            self.exp.cluster_power.set(full.total_power())
+            self.exp.cluster_nodes.set(full.n_nodes)
+            self.exp.shard_nodes.set(snap.n_nodes)
+        return dict(st, snapshot=snap, nodes=snap.nodes_view(), pods=snap.pods_view(),
+                    cluster_wide=dict(st.get("cluster_wide", {}),
+                                      cluster_power_w=full.total_power(),
+                                      cluster_nodes=full.n_nodes))
+
+    async def _observe(self) -> Dict[str, Any]:
+        """Fresh state, or the previous cycle's settle reading if recent enough."""
+        cached, self._next_state = self._next_state, None
+        if cached is not None and time.monotonic() - cached[0] <= STATE_MAX_AGE:
+            return cached[1] if self._commit is None else self._commit(cached[1])
+        return await self._state(commit=True)
+
+    async def _settle(self, cap: float) -> Dict[str, Any]:
+        """Poll until total power is flat for SETTLE_STABLE reads, at most ``cap`` s."""
+        loop     = asyncio.get_running_loop()
+        deadline = loop.time() + cap
+        prev, flat = None, 0
+        while True:
+            poll = max(SETTLE_POLL, self._prom_step)
+            await asyncio.sleep(max(0.0, min(poll, deadline - loop.time())))
+            st = await self._state()
+            p  = _power(st)
+            if prev is not None and abs(p - prev) <= SETTLE_TOL * max(abs(prev), 1e-9):
+                flat += 1
+            else:
+                flat = 0
+            prev = p
+            if flat >= SETTLE_STABLE or loop.time() >= deadline:
+                return st
+
     # ──────────────────────────────────────────────────────────────
     def state_vector(self, state):
-        nodes = list(state["nodes"].values())
-        if not nodes:
-            return [0.0] * 12
-
-        power   = [n["cpu_power_watts"] for n in nodes]
-        cpu_u   = [n["cpu_util"]        for n in nodes]
-
-        def safe_num(x, default=0.0):
-            return x if isinstance(x, (int, float)) else default
-
-        return [
-            len(nodes),                        # 0
-            len(state["pods"]),                # 1
-            float(np.mean(power)),             # 2
-            float(np.max(power)),              # 3
-            float(np.mean(cpu_u)),             # 4
-            float(np.max(cpu_u)),              # 5
-            safe_num(state["cluster_wide"].get("kube_system_cpu_overhead")),
-            0.0, 0.0, 0.0, 0.0, 0.0            # 7-11
-        ]
+        return snapshot_of(state).features()
+
     # ──────────────────────────────────────────────────────────────
     def _suggest(self, fam: int, tgt_idx: int, state) -> Dict[str, Any]:
-        sug = {"action": fam, "target": None}
-        if fam == ACTION_DO_NOTHING or not state["nodes"]:
+        sug  = {"action": fam, "target": None}
+        snap = snapshot_of(state)
+        if fam == ACTION_DO_NOTHING or not snap.n_nodes:
             return sug
 
-        node_names = list(state["nodes"])
-        node       = node_names[tgt_idx % len(node_names)]
-        sug["target"] = node
+        sug["target"] = snap.node_names[tgt_idx % snap.n_nodes]
         return sug
 
+    def _suggest_batch(self, fams, tgts, state) -> List[Dict[str, Any]]:
+        """One suggestion per row; a node already targeted turns later rows into no-ops."""
+        batch, taken = [], set()
+        for fam, tgt in zip(fams, tgts):
+            sug = self._suggest(int(fam), int(tgt), state)
+            if sug["target"] is not None:
+                if sug["target"] in taken:
+                    sug = {"action": ACTION_DO_NOTHING, "target": None,
+                           "conflict": sug["target"]}
+                else:
+                    taken.add(sug["target"])
+            batch.append(sug)
+        return batch
+
+    def _apply_plan(self, batch: Optional[List[Dict[str, Any]]], plan: DrainPlan,
+                    snap) -> List[Dict[str, Any]]:
+        """Filter / retarget evictions through the drain plan (see BINPACK_MODE)."""
+        spare = [snap.node_names[i] for i in plan.drain]
+        if self.binpack_mode == "only":
+            return [{"action": ACTION_CONSOLIDATE, "target": spare[k], "planned": True}
+                    if k < len(spare) else {"action": ACTION_DO_NOTHING, "target": None}
+                    for k in range(self.action_batch)]
+        taken = {s["target"] for s in batch if s["target"] is not None}
+        spare = [n for n in spare if n not in taken]
+        for k, s in enumerate(batch):
+            if s["action"] not in (ACTION_CONSOLIDATE, ACTION_DEFRAGMENT) \
+                    or plan.drainable[snap.node_index[s["target"]]]:
+                continue
+            if self.binpack_mode == "fallback" and spare:
+                batch[k] = dict(s, target=spare.pop(0), replaced=s["target"])
+            else:
+                batch[k] = {"action": ACTION_DO_NOTHING, "target": None, "masked": s["target"]}
+        return batch
+
+    def _drop_overridden(self, batch: List[Dict[str, Any]]) -> Optional[np.ndarray]:
+        """
+        The agent's rows for actions the plan masked or retargeted describe
+        an action that never ran: take them back.  Returns the kept-row
+        flags (None when every row stands).
+        """
+        if not self.learning or self.binpack_mode == "off":
+            return None
+        kept = np.array([not ("masked" in s or "replaced" in s) for s in batch])
+        if kept.all():
+            return None
+        self.memory.keep_pending(kept)
+        return kept
+
     # ──────────────────────────────────────────────────────────────
-    async def _execute(self, sug: Dict[str, Any], st_before: Dict[str, Any],
-                       settle: int) -> float:
-        fam  = sug["action"]
-        node = sug.get("target")
+    async def _budgets(self) -> Optional[DisruptionBudgets]:
+        if self.policy_v1 is None:
+            return None
+        try:
+            return await self.io.call("list_pod_disruption_budget",
+                                      DisruptionBudgets.from_api, self.policy_v1)
+        except (asyncio.TimeoutError, client.ApiException) as e:
+            self.log.warning("PDB list failed (%s); relying on API-server checks", e)
+            return None
+
+    def _plan(self, batch: List[Dict[str, Any]], st_before: Dict[str, Any],
+              budgets: Optional[DisruptionBudgets],
+              drain: Optional[DrainPlan] = None) -> List[Tuple[int, str, Any, tuple]]:
+        """Resolve each suggestion to one API call; evictions must fit the PDBs."""
+        snap, jobs = snapshot_of(st_before), []
+        for i, sug in enumerate(batch):
+            fam, node = sug["action"], sug.get("target")
+            if node and self.shards is not None and not self.shards.owns(node):
+                sug["skipped"] = "shard"            # handed over since observing
+                continue
+            if fam == ACTION_HARDWARE_TUNE and node:
+                jobs.append((i, "tune_node", self._tune_node,
+                             (node, snap.ip_of(snap.node_index[node]))))
+
+            elif fam in (ACTION_CONSOLIDATE, ACTION_DEFRAGMENT) and node:
+                pods = snap.pods_on(snap.node_index[node])
+                if not len(pods):
+                    continue
+                moves, dest = drain.moves(snap.node_index[node]) if drain is not None \
+                              else (pods[:0], pods[:0])
+                if len(moves):                      # planned: largest request first
+                    k = 0 if fam == ACTION_CONSOLIDATE else -1
+                    pod, sug["dest"] = moves[k], snap.node_names[dest[k]]
+                else:
+                    cpu = snap.pod_cpu[pods]
+                    pod = pods[cpu.argmax() if fam == ACTION_CONSOLIDATE else cpu.argmin()]
+                sug["pod"] = f"{snap.pod_ns[pod]}/{snap.pod_names[pod]}"
+                if budgets is not None and not budgets.take(snap.pod_ns[pod], snap.labels_of(pod)):
+                    sug["skipped"] = "pdb"
+                    continue
+                jobs.append((i, "evict_pod", self.sw_act.evict_pod,
+                             (snap.pod_names[pod], snap.pod_ns[pod])))
+        return jobs
 
-        if fam == ACTION_DO_NOTHING:
-            return 0.0
+    def _tune_node(self, node: str, ip: Optional[str]):
+        """Blocking.  The label records intent (and is reconciled if the call fails)."""
+        self.v1.patch_node(node, {"metadata": {"labels": {"optimiser/tune": TUNE_PROFILE}}})
+        if NODE_TUNER_URL and ip:
+            request_tune(NODE_TUNER_URL.format(ip=ip, node=node), TUNE_PROFILE)
 
-        if fam == ACTION_HARDWARE_TUNE and node:
-            patch = {"metadata": {"labels": {"optimiser/tune":"cpusave"}}}
-            self.v1.patch_node(node, patch)
+    async def _act(self, sug: Dict[str, Any], name: str, fn, args: tuple):
+        async with self._act_sem:
+            try:
+                sug["ok"] = await self.io.call(name, fn, *args) is not False
+                if not sug["ok"]:
+                    sug["error"] = "rejected"
+            except asyncio.TimeoutError:
+                sug["ok"], sug["error"] = False, "timeout"   # logged + counted by K8sExecutor
+            except Exception as e:          # counted by K8sExecutor
+                self.log.warning("%s failed: %s", name, e)
+                sug["ok"], sug["error"] = False, type(e).__name__
 
-        elif fam in (ACTION_CONSOLIDATE, ACTION_DEFRAGMENT) and node:
-            pods = [p for p in st_before["pods"].values() if p["node"] == node]
-            if pods:
-                getter = lambda p: p.get("cpu_mcores", 0.0)
-                pod = max(pods, key=getter) \
-                      if fam == ACTION_CONSOLIDATE \
-                      else min(pods, key=getter)
-                self.sw_act.evict_pod(pod["name"], pod["namespace"])
+    async def _execute(self, batch: List[Dict[str, Any]], st_before: Dict[str, Any],
+                       settle: float, drain: Optional[DrainPlan] = None
+                       ) -> Tuple[float, np.ndarray]:
+        """
+        Runs the batch concurrently (≤ ACTION_CONCURRENCY calls in flight),
+        settles once, and returns (cluster Δ W, per-action attributed Δ W).
+        """
+        per_action = np.zeros(len(batch))
+        if all(s["action"] == ACTION_DO_NOTHING for s in batch):
+            return 0.0, per_action
 
-        # wait for cluster to stabilise
-        await asyncio.sleep(settle)
+        with self._phase("act"):
+            evicts  = any(s["action"] in (ACTION_CONSOLIDATE, ACTION_DEFRAGMENT) for s in batch)
+            budgets = await self._budgets() if evicts else None
+            await asyncio.gather(*(self._act(batch[i], name, fn, args)
+                                   for i, name, fn, args in self._plan(batch, st_before, budgets, drain)))
 
-        st_after = await self.sb.get_cluster_state()
-        return _power(st_before) - _power(st_after)
+        # wait for the cluster to stabilise (bounded by ``settle``)
+        t0 = time.monotonic()
+        with self._phase("settle"):
+            st_after = await self._settle(settle)
+        self._last_settle = round(time.monotonic() - t0, 1)
+        self._next_state  = (time.monotonic(), st_after)
+
+        before, after = snapshot_of(st_before), snapshot_of(st_after)
+        total = before.total_power() - after.total_power()
+        done  = [i for i, s in enumerate(batch) if s.get("ok")]
+        for i in done:
+            node = batch[i]["target"]
+            j    = after.node_index.get(node)
+            per_action[i] = (before.power[before.node_index[node]]
+                             - (after.power[j] if j is not None else 0.0))
+        # what the target nodes do not explain (rescheduled pods landing
+        # elsewhere) is shared by the evictions, else by every action
+        share = [i for i in done if batch[i]["action"] != ACTION_HARDWARE_TUNE] or done
+        if share:
+            per_action[share] += (total - per_action[done].sum()) / len(share)
+        return total, per_action
 
     # ──────────────────────────────────────────────────────────────
-    async def run_loop_async(self, observation_interval=30, action_settle_time=90):
-        while True:
-            self.t += 1
-            st = await self.sb.get_cluster_state()
-            vec = self.state_vector(st)
+    async def step(self, action_settle_time=90) -> Dict[str, Any]:
+        """
+        One observe → decide → act → settle → learn cycle;
+        ``action_settle_time`` caps the settle wait.  A cycle that fails
+        before its reward is added takes its recorded rows back with it.
+        """
+        self.t += 1
+        with self._phase("cycle"):
+            try:
+                return await self._step(action_settle_time)
+            except BaseException:
+                self.memory.drop_pending()
+                raise
+
+    async def _step(self, action_settle_time) -> Dict[str, Any]:
+        if self.learner is not None:
+            try:
+                self._report(self.learner.poll())
+            except RuntimeError as e:       # policy kept; the next boundary submits again
+                self.log.error("%s (%s); keeping policy v%d", e, e.__cause__, self.learner.version)
+                if self.exp is not None:
+                    self.exp.ppo_update_failures.inc()
+        with self._phase("observe"):
+            st = await self._observe()
+        if self.shards is not None and not snapshot_of(st).n_nodes:
+            return {"action": ACTION_DO_NOTHING, "target": None, "shard": "none"}
 
-            fam, tgt = self.agent.select(vec, self.memory)
-            sug      = self._suggest(fam, tgt, st)
+        with self._phase("decide"):
+            with self._phase("vector"):
+                vec = self.state_vector(st)
+            batch, drain = None, None
+            if self.binpack_mode != "only":
+                with self._phase("inference"):
+                    snap = snapshot_of(st) if getattr(self.agent, "node_targets", False) else None
+                    if self.action_batch == 1 and self.learning:
+                        fams, tgts = self.agent.select(vec, self.memory, snap=snap)
+                        fams, tgts = [fams], [tgts]
+                    else:                           # suggest-only: nothing recorded
+                        fams, tgts = self.agent.select_batch(
+                            np.repeat(vec[None], self.action_batch, axis=0),
+                            self.memory if self.learning else None, snaps=snap)
+                batch = self._suggest_batch(fams, tgts, st)
+            if self.binpack_mode != "off":
+                with self._phase("binpack"):
+                    drain = plan_drain(snapshot_of(st))
+                batch = self._apply_plan(batch, drain, snapshot_of(st))
+            kept = self._drop_overridden(batch)
+        sug = batch[0] if self.action_batch == 1 else {"actions": batch}
+        if drain is not None:
+            sug["drainable"] = len(drain)
 
-            # human-readable log
+        # human-readable log
+        if self.verbose:
             print(f"\n── cycle {self.t} — {time.ctime()} ──")
             print("Nodes:", ", ".join(st["nodes"].keys()) or "Ø")
-            print("Suggested:", ACTION_NAMES[sug['action']], sug.get("target"))
+            for s in batch:
+                print("Suggested:", ACTION_NAMES[s['action']], s.get("target"))
 
-            # save suggestion
-            (SUGGESTION_DIR / f"sug_{self.t}.json").write_text(json.dumps(sug))
+        if self.suggest_only:
+            self._log(vec, sug)
+            return sug
 
-            # execute immediately (auto-mode)
-            delta = await self._execute(sug, st, action_settle_time)
-            if delta:
-                self.saved_w += delta
-                self.exp.record(before=0, after=0, action_id=fam)
+        # execute immediately (auto-mode)
+        self._last_settle = None
+        delta, per_action = await self._execute(batch, st, action_settle_time, drain)
+        sug["delta_w"] = delta
+        if self._last_settle is not None:
+            sug["settle_s"] = self._last_settle
+        if self.action_batch > 1:
+            for s, d in zip(batch, per_action):
+                s["delta_w"] = float(d)
+        if self.exp is not None:
+            self._export_outcome(batch, _power(st), delta)
+        if delta:
+            self.saved_w += delta
+            if self.verbose:
                 print(f"Δ power realised: {delta:.2f} W  (cum {self.saved_w:.2f} W)")
 
-            # reward bookkeeping
-            r = -_power(st)            # simple reward: lower is better
-            self.memory.high.rewards.append(r)
-            self.memory.low.rewards.append(r)
-            self.memory.high.is_terminals.append(False)
-            self.memory.low.is_terminals.append(False)
+        self._log(vec, sug)
+        if not self.learning:
+            return sug
+
+        # reward bookkeeping: lower power is better; in batch mode each
+        # action is additionally credited with its attributed Δ W
+        r = -_power(st)
+        if self.action_batch == 1:
+            if kept is None or kept[0]:
+                self.memory.add_reward(r, False)
+        else:
+            rewards = r + per_action
+            self.memory.add_rewards(rewards if kept is None else rewards[kept])
+
+        with self._phase("learn"):
+            if self.t % self.update_ts == 0 or self._update_due:
+                if self.learner is None:
+                    t0 = time.perf_counter()
+                    self._remember()
+                    stats = self.agent.update(self.memory)
+                    if self.experience is not None and self.replay_rows > 0:
+                        floor = self.version - REPLAY_MAX_AGE if REPLAY_MAX_AGE else None
+                        replay = self.agent.replay(self.experience, self.replay_rows,
+                                                   min_version=floor)
+                        stats.update({f"{k}_replay": v for k, v in replay.items() if v})
+                    self.version += 1
+                    if self.exp is not None:
+                        self.exp.ppo_update_seconds.observe(time.perf_counter() - t0)
+                    self._report(stats)
+                elif self.learner.busy:     # still busy → retry next cycle
+                    self._update_due = True
+                else:
+                    self._remember()
+                    self._update_due = not self.learner.submit(self.memory)
+            if self.ckpt_dir is not None and self.ckpt_every and self.t % self.ckpt_every == 0:
+                await asyncio.to_thread(self.checkpoint)
+        return sug
+
+    def _export_outcome(self, batch: List[Dict[str, Any]], p_before: float, delta: float):
+        acted = [s["action"] for s in batch if s.get("ok")]
+        if acted or delta:
+            self.exp.record(before=p_before, after=p_before - delta,
+                            action_id=acted[-1] if acted else batch[0]["action"])
+        for s in batch:
+            if s["action"] not in (ACTION_CONSOLIDATE, ACTION_DEFRAGMENT):
+                continue
+            if s.get("skipped") == "pdb":
+                self.exp.eviction_failures.labels(reason="pdb_budget").inc()
+            elif "error" in s:
+                self.exp.eviction_failures.labels(reason=s["error"]).inc()
+
+    def _log(self, vec, sug: Dict[str, Any]):
+        self.sug_log.append(self.t, vec, sug, self.policy_version)
 
-            if self.t % self.update_ts == 0:
-                self.agent.update(self.memory)
+    def _report(self, stats: Optional[Dict[str, Any]]):
+        if stats and self.verbose:
+            ver = f" → v{self.learner.version}" if self.learner is not None else ""
+            print(f"PPO update{ver}: " + ", ".join(
+                f"{k} {v['epochs']} epochs (KL {v['approx_kl']:.4f})"
+                for k, v in stats.items()))
 
-            await asyncio.sleep(observation_interval)
+    async def run_loop_async(self, observation_interval=30, action_settle_time=90,
+                             cycles: Optional[int] = None):
+        """
+        Runs ``cycles`` cycles (forever when None), starting one at most every
+        ``observation_interval`` s; time spent settling counts towards it.
+        A cycle cut short by an API timeout / error is counted and skipped.
+        """
+        lag = asyncio.create_task(monitor_loop_lag(self.exp)) if self.exp is not None else None
+        end = None if cycles is None else self.t + cycles
+        try:
+            while end is None or self.t < end:
+                t0 = time.monotonic()
+                try:
+                    await self.step(action_settle_time)
+                except (asyncio.TimeoutError, client.ApiException) as e:
+                    reason = "timeout" if isinstance(e, asyncio.TimeoutError) else str(e.status)
+                    self.log.warning("cycle %d skipped: %s", self.t, reason)
+                    if self.exp is not None:
+                        self.exp.cycles_skipped.labels(reason=reason).inc()
+                await asyncio.sleep(max(0.0, observation_interval - (time.monotonic() - t0)))
+        finally:
+            if lag is not None:
+                lag.cancel()
+            if self.learner is not None:
+                self.learner.close()
+            if self.experience is not None:
+                self.experience.close()
+            if self.shards is not None:
+                self.shards.close()
+            self.sug_log.close()
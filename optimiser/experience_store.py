@@ -0,0 +1,279 @@
+# SPDX-License-Identifier: Apache-2.0
+# optimiser/experience_store.py
+#
+# Persistent transition store for off-policy reuse (replay, importance-
+# weighted PPO, offline pretraining), kept on the models volume next to
+# the checkpoints so it survives restarts.
+# – one fixed-size record per transition: state, action, logprob (of the
+#   behaviour policy), reward, discounted return, terminal, policy version
+# – append-only chunk files of raw records; a crash mid-write leaves at
+#   most a partial last record, which is ignored / truncated on reopen
+# – readers np.memmap every chunk once (the growing one again when it has
+#   grown) and gather uniformly random rows across chunks
+# – the oldest chunks are dropped past EXP_MAX_ROWS
+#
+# The return is computed over the appended rollout (truncated at its end,
+# as the on-policy update does), so a sampled row is usable on its own.
+#
+#     exp = HierExperience("/models/experience")
+#     exp.append(memory, version=7)              # before the update clears it
+#     rows = exp.high.sample(4096)               # structured array
+#     agent.replay(exp, 4096)
+
+import os, json, threading
+from pathlib import Path
+from typing import Dict, List, Optional, Union
+
+import numpy as np
+import torch
+
+from optimiser.advanced_optimization import GAMMA, discounted_cumsum
+from optimiser.checkpoint      import CHECKPOINT_DIR, load_checkpoint, save_checkpoint
+from optimiser.decision_engine import TARGET_HEAD, HierarchicalAgent, HierMem
+from optimiser.node_policy     import NodeRollout
+
+EXPERIENCE_DIR = Path(os.getenv("EXPERIENCE_DIR", CHECKPOINT_DIR / "experience"))
+EXP_CHUNK_ROWS = int(os.getenv("EXP_CHUNK_ROWS", 65536))     # records per chunk file
+EXP_MAX_ROWS   = int(os.getenv("EXP_MAX_ROWS", 4_194_304))   # per level; oldest chunks dropped
+EXPERIENCE_STORE = os.getenv("EXPERIENCE_STORE", "1") == "1"
+REPLAY_ROWS    = int(os.getenv("REPLAY_ROWS", 0))            # rows per replay pass; 0 → off
+REPLAY_MAX_AGE = int(os.getenv("REPLAY_MAX_AGE", 0))         # policy versions; 0 → any
+FORMAT_VERSION = 1
+
+CHUNK_GLOB = "chunk-*.bin"
+
+
+def record_dtype(state_dim: int) -> np.dtype:
+    return np.dtype([("state", np.float32, (state_dim,)), ("action", np.int64),
+                     ("logprob", np.float32), ("reward", np.float32), ("ret", np.float32),
+                     ("terminal", np.bool_), ("version", np.int32)])
+
+
+# ───────────────────────────────────────────────
+class TransitionStore:
+    """
+    One policy level's transitions under ``directory``.  ``state_dim`` may
+    be omitted for an existing store (read from its meta.json); a store
+    written with another layout raises ValueError.
+    """
+    def __init__(self, directory: Union[str, Path], state_dim: Optional[int] = None,
+                 chunk_rows: int = EXP_CHUNK_ROWS, max_rows: int = EXP_MAX_ROWS):
+        self.directory  = Path(directory)
+        self.chunk_rows = chunk_rows
+        self.max_rows   = max_rows
+        meta_path = self.directory / "meta.json"
+        meta = json.loads(meta_path.read_text()) if meta_path.exists() else None
+        if meta is not None:
+            if meta.get("format") != FORMAT_VERSION:
+                raise ValueError(f"experience store format {meta.get('format')}, "
+                                 f"expected {FORMAT_VERSION}")
+            if state_dim is not None and meta["state_dim"] != state_dim:
+                raise ValueError(f"experience store has state_dim {meta['state_dim']}, "
+                                 f"agent has {state_dim}")
+            state_dim = meta["state_dim"]
+        elif state_dim is None:
+            raise FileNotFoundError(f"no experience store in {self.directory}")
+        else:
+            self.directory.mkdir(parents=True, exist_ok=True)
+            meta_path.write_text(json.dumps({"format": FORMAT_VERSION, "state_dim": state_dim}))
+        self.state_dim = state_dim
+        self.dtype     = record_dtype(state_dim)
+
+        self._lock = threading.Lock()                      # learner thread samples
+        self._maps: Dict[Path, np.memmap] = {}
+        self._f    = None
+        self._rows = 0                                     # records in the active chunk
+        self._seq  = 0
+        chunks = self._chunks()
+        if chunks:
+            self._seq = int(chunks[-1].stem.split("-")[1])
+            self._open(chunks[-1])
+
+    def _chunks(self) -> List[Path]:
+        return sorted(self.directory.glob(CHUNK_GLOB))
+
+    def _open(self, path: Path):
+        if self._f is not None:
+            self._f.close()
+        self._f = open(path, "ab")
+        whole = self._f.tell() // self.dtype.itemsize
+        if whole * self.dtype.itemsize != self._f.tell():  # torn last record
+            self._f.truncate(whole * self.dtype.itemsize)
+        self._rows = whole
+
+    def _rotate(self):
+        self._seq += 1
+        self._open(self.directory / f"chunk-{self._seq:08d}.bin")
+        chunks = self._chunks()
+        rows = [p.stat().st_size // self.dtype.itemsize for p in chunks]
+        total = sum(rows)
+        for p, n in zip(chunks[:-1], rows):                # never the active one
+            if total <= self.max_rows:
+                break
+            self._maps.pop(p, None)
+            p.unlink(missing_ok=True)
+            total -= n
+
+    # ───────────── write ───────────────────────────────────
+    def append(self, states, actions, logprobs, rewards, terminals, version: int = 0,
+               gamma: float = GAMMA) -> int:
+        """Appends one rollout (array-likes of equal length); returns rows written."""
+        s = np.asarray(states, dtype=np.float32).reshape(-1, self.state_dim)
+        n = len(s)
+        if n == 0:
+            return 0
+        rec = np.empty(n, dtype=self.dtype)
+        rec["state"]    = s
+        rec["action"]   = np.asarray(actions).reshape(-1)
+        rec["logprob"]  = np.asarray(logprobs, dtype=np.float32).reshape(-1)
+        rec["reward"]   = np.asarray(rewards, dtype=np.float32).reshape(-1)
+        rec["terminal"] = np.asarray(terminals).reshape(-1) != 0
+        rec["version"]  = version
+        rec["ret"]      = discounted_cumsum(torch.from_numpy(rec["reward"].copy()),
+                                            torch.from_numpy(rec["terminal"].astype(np.float32)),
+                                            gamma).numpy()
+        with self._lock:
+            done = 0
+            while done < n:
+                if self._f is None or self._rows >= self.chunk_rows:
+                    self._rotate()
+                k = min(n - done, self.chunk_rows - self._rows)
+                self._f.write(rec[done:done + k].tobytes())
+                self._f.flush()
+                self._rows += k
+                done += k
+        return n
+
+    # ───────────── read ────────────────────────────────────
+    def _load(self) -> List[np.memmap]:
+        out = []
+        for p in self._chunks():
+            try:
+                n = p.stat().st_size // self.dtype.itemsize
+            except FileNotFoundError:
+                continue
+            m = self._maps.get(p)
+            if m is None or len(m) != n:
+                if n == 0:
+                    continue
+                m = self._maps[p] = np.memmap(p, dtype=self.dtype, mode="r", shape=(n,))
+            out.append(m)
+        return out
+
+    def __len__(self):
+        with self._lock:
+            return sum(len(m) for m in self._load())
+
+    def sample(self, n: int, rng: Optional[np.random.Generator] = None,
+               min_version: Optional[int] = None) -> np.ndarray:
+        """
+        ``n`` rows drawn uniformly with replacement across all chunks (fewer
+        when ``min_version`` filters some out), as an in-memory structured array.
+        """
+        rng = rng or np.random.default_rng()
+        with self._lock:
+            maps = self._load()
+            sizes = np.array([len(m) for m in maps], dtype=np.int64)
+            total = int(sizes.sum())
+            if total == 0 or n <= 0:
+                return np.empty(0, dtype=self.dtype)
+            idx    = np.sort(rng.integers(0, total, n))
+            starts = np.cumsum(sizes) - sizes
+            cut    = np.searchsorted(idx, np.append(starts, total))
+            out    = np.empty(n, dtype=self.dtype)
+            for c, m in enumerate(maps):                    # one sorted gather per chunk
+                lo, hi = cut[c], cut[c + 1]
+                if lo < hi:
+                    out[lo:hi] = m[idx[lo:hi] - starts[c]]
+        if min_version is not None:
+            out = out[out["version"] >= min_version]
+        rng.shuffle(out)
+        return out
+
+    def close(self):
+        with self._lock:
+            if self._f is not None:
+                self._f.close()
+                self._f = None
+            self._maps.clear()
+
+
+# ───────────────────────────────────────────────
+class HierExperience:
+    """
+    The two levels of a HierarchicalAgent under ``directory``/{high,low};
+    each store is created on its first append.  The node target head's
+    ragged rollouts are not stored (family level only).
+    """
+    def __init__(self, directory: Union[str, Path] = EXPERIENCE_DIR, **kw):
+        self.directory = Path(directory)
+        self.kw = kw
+        self.high = self._existing("high")
+        self.low  = self._existing("low")
+
+    def _existing(self, level: str) -> Optional[TransitionStore]:
+        d = self.directory / level
+        return TransitionStore(d, **self.kw) if (d / "meta.json").exists() else None
+
+    def _store(self, level: str, state_dim: int) -> TransitionStore:
+        store = getattr(self, level)
+        if store is None:
+            store = TransitionStore(self.directory / level, state_dim, **self.kw)
+            setattr(self, level, store)
+        return store
+
+    def append(self, memory, version: int = 0, gamma: float = GAMMA) -> int:
+        """Rows of a HierMem that already have their reward; returns rows written."""
+        written = 0
+        for level in ("high", "low"):
+            buf = getattr(memory, level)
+            if isinstance(buf, NodeRollout) or not len(buf):
+                continue
+            s, a, lp, r, d, _ = buf.batch()
+            n = min(len(s), len(r))
+            if n == 0:
+                continue
+            written += self._store(level, s.shape[1]).append(
+                s[:n].cpu().numpy(), a[:n].cpu().numpy(), lp[:n].float().cpu().numpy(),
+                r[:n].cpu().numpy(), d[:n].cpu().numpy(), version, gamma=gamma)
+        return written
+
+    def close(self):
+        for store in (self.high, self.low):
+            if store is not None:
+                store.close()
+
+
+# ───────────── offline pretraining ─────────────────────────
+def main():
+    """
+    python -m optimiser.experience_store --max-nodes 64 --max-pods 512 --steps 200
+    Warm-starts from the checkpoint (if any), replays the store, saves back.
+    """
+    import argparse, logging
+
+    ap = argparse.ArgumentParser(description=main.__doc__)
+    ap.add_argument("--experience", type=Path, default=EXPERIENCE_DIR)
+    ap.add_argument("--checkpoint", type=Path, default=CHECKPOINT_DIR)
+    ap.add_argument("--max-nodes", type=int, required=True)
+    ap.add_argument("--max-pods", type=int, required=True)
+    ap.add_argument("--target-head", default=TARGET_HEAD)
+    ap.add_argument("--steps", type=int, default=100)
+    ap.add_argument("--rows", type=int, default=4096)
+    args = ap.parse_args()
+    logging.basicConfig(level=logging.INFO)
+
+    exp = HierExperience(args.experience)
+    if exp.high is None:
+        raise SystemExit(f"no transitions in {args.experience}")
+    agent  = HierarchicalAgent(exp.high.state_dim, args.max_nodes, args.max_pods,
+                               target_head=args.target_head)
+    memory = HierMem()
+    extra  = load_checkpoint(agent, memory, args.checkpoint) or {}
+    stats  = agent.pretrain(exp, args.steps, args.rows)
+    save_checkpoint(agent, memory, args.checkpoint, extra=extra)
+    print(f"{len(exp.high)} high-level rows, {args.steps} passes: {stats}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,12 +1,85 @@
-from prometheus_client import Gauge, Counter, start_http_server
+from prometheus_client import Gauge, Counter, Histogram, start_http_server
+
+from optimiser.profiler import SamplingProfiler
+
+# latency buckets (s): sub-ms inference … multi-minute settle / watch sessions
+FAST_BUCKETS = (.0005, .001, .0025, .005, .01, .025, .05, .1, .25, .5, 1, 2.5)
+SLOW_BUCKETS = (.01, .05, .1, .5, 1, 2.5, 5, 10, 20, 30, 60, 90, 120, 300, 600)
 
 class Exporter:
-    def __init__(self, port=9105):
+    def __init__(self, port=9105, profiler: bool = True):
         # gauges
         self.power_before   = Gauge("optimiser_power_before_w",  "Total Watts before action")
         self.power_after    = Gauge("optimiser_power_after_w",   "Total Watts after action")
         self.savings_total  = Counter("optimiser_cumulative_w",  "Cumulative Watts saved")
         self.last_action    = Gauge("optimiser_last_action_id",  "0=none,1=consolidate,…")
+        # event-loop health
+        self.k8s_call_seconds = Histogram("optimiser_k8s_call_seconds",
+                                          "Latency of blocking Kubernetes API calls",
+                                          ["call"])
+        self.k8s_timeouts     = Counter("optimiser_k8s_call_timeouts",
+                                        "Kubernetes API calls that hit their timeout",
+                                        ["call"])
+        self.loop_lag_seconds = Histogram("optimiser_event_loop_lag_seconds",
+                                          "How late the event loop wakes up (stall time)",
+                                          buckets=(.001, .005, .01, .05, .1, .5, 1, 5, 10, 30))
+        # control cycle
+        self.cycle_phase_seconds = Histogram("optimiser_cycle_phase_seconds",
+                                             "Wall time per control-cycle phase",
+                                             ["phase"],
+                                             buckets=FAST_BUCKETS[:4] + SLOW_BUCKETS)
+        # hot path
+        self.prom_query_seconds  = Histogram("optimiser_prom_query_seconds",
+                                             "Prometheus instant-query latency (cache hits ≈ 0)",
+                                             ["query"], buckets=FAST_BUCKETS + (5, 10, 30))
+        self.informer_seconds    = Histogram("optimiser_informer_seconds",
+                                             "Informer LIST duration / WATCH session length",
+                                             ["resource", "op"], buckets=SLOW_BUCKETS)
+        self.informer_events     = Counter("optimiser_informer_events",
+                                           "Watch events applied by the informers",
+                                           ["resource", "type"])
+        self.state_build_seconds = Histogram("optimiser_state_build_seconds",
+                                             "ClusterSnapshot build from informer rows + Prometheus",
+                                             buckets=FAST_BUCKETS)
+        self.prom_unmatched      = Gauge("optimiser_prom_unmatched_series",
+                                         "Series of the last cycle that matched no node / pod",
+                                         ["query"])
+        self.ppo_update_seconds  = Histogram("optimiser_ppo_update_seconds",
+                                             "Duration of one (two-level) PPO update",
+                                             buckets=SLOW_BUCKETS)
+        # failures
+        self.api_errors          = Counter("optimiser_api_errors",
+                                           "Failed Kubernetes / Prometheus calls",
+                                           ["call", "code"])
+        self.eviction_failures   = Counter("optimiser_eviction_failures",
+                                           "Planned evictions that did not happen",
+                                           ["reason"])
+        self.cycles_skipped      = Counter("optimiser_cycles_skipped",
+                                           "Control cycles abandoned on a failed API call",
+                                           ["reason"])
+        # learning
+        self.policy_version   = Gauge("optimiser_policy_version",
+                                      "Version of the policy weights the control loop acts with")
+        self.ppo_update_failures = Counter("optimiser_ppo_update_failures",
+                                           "Background PPO updates that failed (policy kept)")
+        # sharding (several replicas, see sharding.py); the gauges above are
+        # per shard, these two describe the whole cluster on every replica
+        self.cluster_power    = Gauge("optimiser_cluster_power_w",
+                                      "Total Watts of all nodes, not just this replica's shards")
+        self.cluster_nodes    = Gauge("optimiser_cluster_nodes", "Nodes in the whole cluster")
+        self.shard_nodes      = Gauge("optimiser_shard_nodes",
+                                      "Nodes in the shards this replica holds")
+        self.shards_owned     = Gauge("optimiser_shards_owned", "Shard leases this replica holds")
+        self.shard_members    = Gauge("optimiser_shard_members", "Live controller replicas")
+        self.shard_rebalances = Counter("optimiser_shard_rebalances",
+                                        "Changes of this replica's shard set")
+        # profiling (SIGUSR2 toggles a sampling profiler, see profiler.py)
+        self.profiling        = Gauge("optimiser_profiler_running",
+                                      "1 while the sampling profiler is collecting")
+        self.profiler = None
+        if profiler:
+            self.profiler = SamplingProfiler(on_change=lambda on: self.profiling.set(int(on)))
+            self.profiler.install_toggle()
         start_http_server(port)
 
     def record(self, before, after, action_id):
@@ -14,3 +87,7 @@ class Exporter:
         if before > after:
             self.savings_total.inc(before-after)
         self.last_action.set(action_id)
+
+    def api_error(self, call: str, exc: BaseException):
+        code = getattr(exc, "status", None) or type(exc).__name__
+        self.api_errors.labels(call=call, code=str(code)).inc()
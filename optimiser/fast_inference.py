@@ -0,0 +1,107 @@
+# SPDX-License-Identifier: Apache-2.0
+# optimiser/fast_inference.py
+#
+# NumPy forward pass for the actor MLPs (Linear → Tanh → … → Softmax).
+# – weights are copied out of ``ActorCritic.actor`` once (and again after
+#   every PPO update); a decision is then a handful of small matmuls,
+#   with no autocast, Categorical object or torch.compile dispatch
+# – optional int8: per-output-channel symmetric weights, per-row dynamic
+#   activation scale, float bias / tanh / softmax; the integer products are
+#   summed by a float32 BLAS matmul, exact while |Σ| < 2**24 (fan-in ≤ 1040)
+# – sampling by inverse CDF from a preallocated PCG64 generator and
+#   reused uniform buffers
+#
+#     fast = FastActor.from_actor(unwrap(ppo.policy_old).actor)
+#     a, logp = fast.sample(state_vec)
+
+from typing import List, Optional, Tuple
+
+import numpy as np
+import torch.nn as nn
+
+
+def _quantize(w: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """(in, out) float → int8 + one scale per output column."""
+    scale = np.abs(w).max(axis=0) / 127.0
+    scale[scale == 0] = 1.0
+    return np.clip(np.rint(w / scale), -127, 127).astype(np.int8), scale.astype(np.float32)
+
+
+class FastActor:
+    """Inference-only copy of an actor; not thread-safe (shared buffers)."""
+    def __init__(self, weights: List[np.ndarray], biases: List[np.ndarray],
+                 quantize: bool = False, seed: Optional[int] = None):
+        self.quantized = quantize
+        self.b = [np.ascontiguousarray(b, dtype=np.float32) for b in biases]
+        if quantize:
+            if max(w.shape[0] for w in weights) > 1040:
+                raise ValueError("int8 path is exact only up to 1040 inputs per layer")
+            q = [_quantize(np.asarray(w, dtype=np.float32)) for w in weights]
+            self.wq    = [w for w, _ in q]                               # int8, kept for export
+            self._wf   = [w.astype(np.float32) for w in self.wq]         # integer-valued
+            self.scale = [s for _, s in q]
+        else:
+            self.w = [np.ascontiguousarray(w, dtype=np.float32) for w in weights]
+        self.rng  = np.random.Generator(np.random.PCG64(seed))
+        self._u1  = np.empty(1)
+        self._u   = np.empty(0)
+
+    @classmethod
+    def from_actor(cls, actor: nn.Sequential, quantize: bool = False,
+                   seed: Optional[int] = None) -> "FastActor":
+        lin = [m for m in actor if isinstance(m, nn.Linear)]
+        if not isinstance(actor[-1], nn.Softmax) or \
+                any(not isinstance(m, (nn.Linear, nn.Tanh, nn.Softmax)) for m in actor):
+            raise TypeError("expected Linear/Tanh layers ending in Softmax")
+        return cls([m.weight.detach().float().cpu().numpy().T for m in lin],
+                   [m.bias.detach().float().cpu().numpy() for m in lin], quantize, seed)
+
+    def load_actor(self, actor: nn.Sequential):
+        """Refresh the weights in place (same shapes), keeping the RNG stream."""
+        new = FastActor.from_actor(actor, self.quantized)
+        new.rng = self.rng
+        self.__dict__.update(new.__dict__)
+
+    @property
+    def in_features(self) -> int:
+        return (self.wq if self.quantized else self.w)[0].shape[0]
+
+    # ───────────────────────────────────────────
+    def _linear(self, i: int, x: np.ndarray) -> np.ndarray:
+        if not self.quantized:
+            return x @ self.w[i] + self.b[i]
+        sx = np.abs(x).max(axis=1, keepdims=True) / 127.0
+        sx[sx == 0] = 1.0
+        xq = np.rint(x / sx)
+        return (xq @ self._wf[i]) * (sx * self.scale[i]) + self.b[i]
+
+    def probs(self, x) -> np.ndarray:
+        """(B, n_actions) action probabilities for (B, in) or (in,) inputs."""
+        h = np.asarray(x, dtype=np.float32).reshape(-1, self.in_features)
+        last = len(self.b) - 1
+        for i in range(last):
+            h = np.tanh(self._linear(i, h))
+        z = self._linear(last, h)
+        z -= z.max(axis=1, keepdims=True)
+        np.exp(z, out=z)
+        z /= z.sum(axis=1, keepdims=True)
+        return z
+
+    def sample(self, x) -> Tuple[np.ndarray, np.ndarray]:
+        """(actions, log-probs), one per input row."""
+        p = self.probs(x)
+        n = len(p)
+        if n == 1:
+            u = self.rng.random(out=self._u1)
+        else:
+            if len(self._u) < n:
+                self._u = np.empty(n)
+            u = self.rng.random(out=self._u[:n])
+        np.subtract(1.0, u, out=u)                  # (0, 1]: never lands on a p = 0 action
+        cdf = np.cumsum(p, axis=1)
+        a   = np.minimum((cdf < (u * cdf[:, -1])[:, None]).sum(axis=1), p.shape[1] - 1)
+        return a, np.log(p[np.arange(n), a])
+
+    def nbytes(self) -> int:
+        ws = self.wq if self.quantized else self.w
+        return sum(w.nbytes for w in ws) + sum(b.nbytes for b in self.b)
@@ -1,28 +1,31 @@
-import subprocess, os, logging
+import os, time, logging
+from optimiser.node_tuner import SysfsTuner, STATUS_FILE
 GOVERNOR = os.getenv("CPU_GOV", "powersave")      # or "schedutil"
+RAPL_W   = float(os.getenv("RAPL_W", 0))           # per package; 0 → leave as is
 
-def set_cpufreq(governor: str = GOVERNOR):
+def set_cpufreq(governor: str = GOVERNOR, tuner: SysfsTuner = None):
     try:
-        subprocess.run(
-            ["cpupower", "frequency-set", "-g", governor],
-            check=True, capture_output=True)
+        (tuner or SysfsTuner()).set_governor(governor)
         logging.info(f"cpufreq governor set → {governor}")
         return True
     except Exception as e:
         logging.error("cpufreq set failed: %s", e)
         return False
 
-def set_rapl(limit_watts: int):
+def set_rapl(limit_watts: float = RAPL_W, tuner: SysfsTuner = None):
+    """Limit on every RAPL package, not only intel-rapl:0."""
+    if not limit_watts:
+        return False
     try:
-        with open("/sys/class/powercap/intel-rapl:0/constraint_0_power_limit_uw", "w") as f:
-            f.write(str(limit_watts * 1_000_000))
+        (tuner or SysfsTuner()).set_rapl(limit_watts)
         logging.info("RAPL limit set → %d W", limit_watts)
         return True
     except Exception as e:
         logging.error("RAPL write failed: %s", e); return False
 if __name__ == "__main__":
-    # Runs once in the DaemonSet container
-    ok1 = set_cpufreq()
-    ok2 = set_rapl()
+    # One-shot variant of optimiser.node_tuner (no HTTP endpoint)
+    tuner = SysfsTuner()
+    ok1 = set_cpufreq(GOVERNOR, tuner)
+    ok2 = set_rapl(RAPL_W, tuner)
     status = "SUCCESS" if ok1 or ok2 else "NO-ACTION"
-    open("/tmp/node-tuner.status", "w").write(f"{status} {time.time()}\n")
+    STATUS_FILE.write_text(f"{status} {time.time()}\n")
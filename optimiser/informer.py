@@ -0,0 +1,215 @@
+# SPDX-License-Identifier: Apache-2.0
+# optimiser/informer.py
+#
+# List-once / watch-forever cache for Kubernetes objects.
+# – one full LIST, then WATCH from its resourceVersion
+# – ADDED / MODIFIED / DELETED applied to an in-memory store
+# – 410 Gone (expired resourceVersion) → transparent relist
+# – optional change journal: ``changes()`` hands a consumer the keys touched
+#   since its last call, so it can update incrementally (StateEngine)
+# – start() waits at most INFORMER_SYNC_TIMEOUT s for the first LIST and
+#   raises TimeoutError after that, instead of hanging start-up
+
+import os, time, logging, threading
+from typing import Any, Callable, Dict, List, Optional
+
+from kubernetes import client, watch
+
+WATCH_TIMEOUT_S = 300          # server-side watch timeout, then re-watch
+RETRY_BACKOFF_S = 5.0          # pause after an unexpected watch failure
+SYNC_TIMEOUT_S  = float(os.getenv("INFORMER_SYNC_TIMEOUT", 60))   # first LIST, in start()
+
+
+class ResourceExpired(Exception):
+    """The watched resourceVersion is too old – the store must be relisted."""
+
+
+def _uid_key(obj) -> str:
+    return obj.metadata.uid
+
+
+def name_key(obj) -> str:
+    return obj.metadata.name
+
+
+def _is_gone(event: Dict[str, Any]) -> bool:
+    raw = event.get("raw_object") or event.get("object") or {}
+    code = raw.get("code") if isinstance(raw, dict) else getattr(raw, "code", None)
+    return code == 410
+
+
+# ───────────────────────────────────────────────
+class Informer:
+    """
+    Keeps ``transform(obj)`` for every object returned by ``list_fn`` in a
+    dict keyed by ``key_fn(obj)``.  ``watch_factory`` defaults to
+    ``kubernetes.watch.Watch``; anything with ``stream(func, **kw)`` and
+    ``stop()`` works, which is how the informer is driven from a fake
+    event stream.  With ``journal=True`` every key written since the last
+    ``changes()`` call is remembered (latest row, None once deleted).
+    """
+    def __init__(self,
+                 list_fn: Callable,
+                 key_fn: Callable = _uid_key,
+                 transform: Optional[Callable] = None,
+                 watch_factory: Callable = watch.Watch,
+                 timeout_seconds: int = WATCH_TIMEOUT_S,
+                 name: str = "",
+                 exporter=None,
+                 journal: bool = False):
+        self.list_fn       = list_fn
+        self.key_fn        = key_fn
+        self.transform     = transform or (lambda o: o)
+        self.watch_factory = watch_factory
+        self.timeout       = timeout_seconds
+        self.name          = name or getattr(list_fn, "__name__", "informer")
+        self.log           = logging.getLogger(f"informer.{self.name}")
+        self.exp           = exporter
+        self.journal       = journal
+
+        self.resource_version: Optional[str] = None
+        self.relists = 0
+        self.synced  = threading.Event()
+
+        self._store: Dict[str, Any] = {}
+        self._lock   = threading.Lock()
+        self._stop   = threading.Event()
+        self._watch  = None
+        self._thread: Optional[threading.Thread] = None
+        self._changes: Dict[str, Any] = {}
+        self._relisted = True
+
+    # ───────────────────────────────────────────
+    def list(self) -> str:
+        """Full LIST; atomically replaces the store and returns its resourceVersion."""
+        t0    = time.perf_counter()
+        resp  = self.list_fn()
+        store = {self.key_fn(o): self.transform(o) for o in resp.items}
+        if self.exp is not None:
+            self.exp.informer_seconds.labels(self.name, "list").observe(time.perf_counter() - t0)
+        with self._lock:
+            self._store = store
+            self.resource_version = resp.metadata.resource_version
+            self._changes  = {}
+            self._relisted = True
+        self.relists += 1
+        self.synced.set()
+        self.log.info("listed %d objects @ rv=%s", len(store), self.resource_version)
+        return self.resource_version
+
+    def apply(self, event: Dict[str, Any]):
+        """Apply one watch event to the store (raises ResourceExpired on 410)."""
+        kind = event["type"]
+        if kind == "ERROR":
+            if _is_gone(event):
+                raise ResourceExpired(self.resource_version)
+            raise client.ApiException(reason=str(event.get("raw_object")))
+
+        if self.exp is not None:
+            self.exp.informer_events.labels(self.name, kind).inc()
+        obj = event["object"]
+        rv  = obj.metadata.resource_version
+        if kind == "BOOKMARK":
+            self.resource_version = rv
+            return
+
+        key = self.key_fn(obj)
+        with self._lock:
+            if kind == "DELETED":
+                self._store.pop(key, None)
+                row = None
+            else:                                   # ADDED | MODIFIED
+                row = self._store[key] = self.transform(obj)
+            if self.journal:
+                self._changes[key] = row
+            self.resource_version = rv
+
+    def watch_once(self):
+        """One WATCH session from the current resourceVersion until it times out."""
+        self._watch = self.watch_factory()
+        t0 = time.perf_counter()
+        try:
+            for ev in self._watch.stream(self.list_fn,
+                                         resource_version=self.resource_version,
+                                         timeout_seconds=self.timeout,
+                                         allow_watch_bookmarks=True):
+                self.apply(ev)
+                if self._stop.is_set():
+                    break
+        finally:
+            self._watch.stop()
+            if self.exp is not None:                # short sessions = flapping watches
+                self.exp.informer_seconds.labels(self.name, "watch").observe(time.perf_counter() - t0)
+
+    def run(self):
+        """LIST + WATCH loop; relists on 410 Gone, backs off on other failures."""
+        while not self._stop.is_set():
+            try:
+                if self.resource_version is None:
+                    self.list()
+                self.watch_once()
+            except ResourceExpired:
+                self.log.info("resourceVersion %s expired – relisting", self.resource_version)
+                self.resource_version = None
+            except client.ApiException as e:
+                if e.status == 410:
+                    self.resource_version = None
+                    continue
+                if self.exp is not None:
+                    self.exp.api_error(f"watch_{self.name}", e)
+                self.log.warning("watch failed → %s", e.reason)
+                self._stop.wait(RETRY_BACKOFF_S)
+            except Exception as e:
+                self.log.warning("watch failed → %s", e)
+                self._stop.wait(RETRY_BACKOFF_S)
+
+    # ───────────────────────────────────────────
+    def start(self, wait: bool = True, timeout: Optional[float] = SYNC_TIMEOUT_S):
+        """
+        Starts the LIST + WATCH thread; with ``wait``, blocks until the first
+        LIST has landed and raises TimeoutError (thread stopped) if it has
+        not after ``timeout`` s.
+        """
+        self._thread = threading.Thread(target=self.run, name=f"informer-{self.name}",
+                                        daemon=True)
+        self._thread.start()
+        if wait and not self.synced.wait(timeout):
+            self.stop()
+            raise TimeoutError(f"informer {self.name}: no successful LIST in {timeout:.0f} s")
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._watch is not None:
+            self._watch.stop()
+
+    def items(self) -> List[Any]:
+        """Point-in-time copy of the cached (transformed) objects."""
+        with self._lock:
+            return list(self._store.values())
+
+    def store(self) -> Dict[str, Any]:
+        """Point-in-time copy of the whole ``{key: row}`` store."""
+        with self._lock:
+            return dict(self._store)
+
+    def changes(self) -> Optional[Dict[str, Any]]:
+        """
+        ``{key: row or None}`` written since the previous call, or None when
+        the consumer must resync from ``store()`` (first call, after a
+        relist, or journaling off).
+        """
+        with self._lock:
+            if not self.journal or self._relisted:
+                self._relisted = False
+                self._changes  = {}
+                return None
+            out, self._changes = self._changes, {}
+            return out
+
+    def get(self, key: str):
+        with self._lock:
+            return self._store.get(key)
+
+    def __len__(self):
+        return len(self._store)
@@ -0,0 +1,63 @@
+# SPDX-License-Identifier: Apache-2.0
+# optimiser/k8s_io.py
+#
+# Runs the blocking kubernetes-client calls off the event loop.
+# – bounded thread pool, per-call timeout
+# – latency of every call + event-loop lag exported as histograms
+# – failed calls counted by call name and HTTP status
+
+import os, time, asyncio, logging
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable
+
+K8S_IO_WORKERS   = int(os.getenv("K8S_IO_WORKERS", 4))
+K8S_CALL_TIMEOUT = float(os.getenv("K8S_CALL_TIMEOUT", 15))
+LOOP_LAG_PERIOD  = float(os.getenv("LOOP_LAG_PERIOD", 0.5))
+
+
+class K8sExecutor:
+    """
+    ``await io.call("patch_node", v1.patch_node, name, body)`` runs the call
+    in a small dedicated pool so the controller loop, the Prometheus
+    gathers and the metrics endpoint keep progressing.  A call that outlives
+    its timeout raises ``asyncio.TimeoutError``; the worker thread finishes
+    it in the background (the kubernetes client cannot be interrupted).
+    """
+    def __init__(self, exporter=None, workers: int = K8S_IO_WORKERS,
+                 timeout: float = K8S_CALL_TIMEOUT):
+        self.exp     = exporter
+        self.timeout = timeout
+        self.pool    = ThreadPoolExecutor(max_workers=workers,
+                                          thread_name_prefix="k8s-io")
+        self.log     = logging.getLogger("k8s-io")
+
+    async def call(self, name: str, fn: Callable, *args, timeout: float = None, **kw):
+        loop = asyncio.get_running_loop()
+        t0   = time.perf_counter()
+        fut  = loop.run_in_executor(self.pool, lambda: fn(*args, **kw))
+        try:
+            return await asyncio.wait_for(fut, timeout or self.timeout)
+        except asyncio.TimeoutError:
+            self.log.warning("%s timed out after %.1fs", name, timeout or self.timeout)
+            if self.exp is not None:
+                self.exp.k8s_timeouts.labels(call=name).inc()
+            raise
+        except Exception as e:
+            if self.exp is not None:
+                self.exp.api_error(name, e)
+            raise
+        finally:
+            if self.exp is not None:
+                self.exp.k8s_call_seconds.labels(call=name).observe(time.perf_counter() - t0)
+
+    def shutdown(self):
+        self.pool.shutdown(wait=False, cancel_futures=True)
+
+
+async def monitor_loop_lag(exporter, period: float = LOOP_LAG_PERIOD):
+    """Sleeps ``period`` forever and exports how late each wake-up was."""
+    loop = asyncio.get_running_loop()
+    while True:
+        t0 = loop.time()
+        await asyncio.sleep(period)
+        exporter.loop_lag_seconds.observe(max(0.0, loop.time() - t0 - period))
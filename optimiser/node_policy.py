@@ -0,0 +1,303 @@
+# SPDX-License-Identifier: Apache-2.0
+# optimiser/node_policy.py
+#
+# Per-node target policy for the hierarchical agent.
+# – every node is one row of a (n_nodes, NODE_FEATURES) matrix
+#   (ClusterSnapshot.node_features); a shared MLP scores all rows in one
+#   batched pass, one score column per action family
+# – ineligible nodes are masked to −inf before a softmax over the nodes of
+#   that cluster, so no probability lands on nodes that do not exist or
+#   cannot be acted on, and the parameter count is independent of size
+# – rollouts are ragged (node count varies per step); NodeRollout keeps all
+#   rows back-to-back with a CSR offset per step, PPO minibatches over steps
+#
+#     pol = NodeTargetPolicy()
+#     i   = pol.select_action(snap.node_features(), mask, fam, rollout)
+#     ... rollout.add_reward(r, done); pol.update(rollout)
+
+from collections import deque
+from typing import Optional, Tuple
+
+import numpy as np
+import torch
+import torch.nn as nn
+
+from optimiser.advanced_optimization import (
+    H1, H2, LR_ACTOR, LR_CRITIC, K_EPOCHS, MINIBATCH, TARGET_KL, MAX_GRAD_NORM,
+    EPS_CLIP, GAMMA, ADVANTAGE, GAE_LAMBDA, discounted_cumsum, gae, ppo_epochs)
+from optimiser.cluster_snapshot import NODE_FEATURES
+
+
+# ───────────── ragged helpers ──────────────────────────────
+def segment_log_softmax(logits: torch.Tensor, seg: torch.Tensor, n_seg: int) -> torch.Tensor:
+    """log-softmax of ``logits`` within each segment ``seg`` (rows may be −inf)."""
+    mx = logits.new_full((n_seg,), -torch.inf).scatter_reduce(
+        0, seg, logits, reduce="amax", include_self=True)
+    z  = (logits - mx[seg]).exp()
+    lse = z.new_zeros(n_seg).index_add(0, seg, z).log() + mx
+    return logits - lse[seg]
+
+
+def _rows_of(ptr: torch.Tensor, steps: torch.Tensor
+             ) -> Tuple[torch.Tensor, torch.Tensor, torch.Tensor]:
+    """
+    Rows of ``steps`` gathered from CSR ``ptr``: their global indexes, the
+    step (0..len(steps)-1) each belongs to, and where each step starts.
+    """
+    start  = ptr[steps]
+    counts = ptr[steps + 1] - start
+    seg    = torch.repeat_interleave(torch.arange(len(steps)), counts)
+    first  = torch.cumsum(counts, 0) - counts
+    return start[seg] + torch.arange(int(counts.sum())) - first[seg], seg, first
+
+
+# ───────────────────────────────────────────────
+class NodeScorer(nn.Module):
+    """Shared per-node body; score head per row, value head on the pooled rows."""
+    def __init__(self, n_features: int = NODE_FEATURES, n_families: int = 4):
+        super().__init__()
+        self.body  = nn.Sequential(nn.Linear(n_features, H1), nn.Tanh(),
+                                   nn.Linear(H1, H2),         nn.Tanh())
+        self.score = nn.Linear(H2, n_families)
+        self.value = nn.Linear(H2, n_families)
+
+    def forward(self, x, seg, n_seg: int, fam, mask):
+        """(per-row log-probs, per-step values) for rows ``x`` grouped by ``seg``."""
+        h      = self.body(x)
+        logits = self.score(h).gather(1, fam[seg].unsqueeze(1)).squeeze(1)
+        logits = logits.masked_fill(~mask, -torch.inf)
+        counts = torch.bincount(seg, minlength=n_seg).clamp(min=1).unsqueeze(1)
+        pooled = h.new_zeros(n_seg, h.shape[1]).index_add(0, seg, h) / counts
+        vals   = self.value(pooled).gather(1, fam.unsqueeze(1)).squeeze(1)
+        return segment_log_softmax(logits.float(), seg, n_seg), vals.float()
+
+
+# ───────────────────────────────────────────────
+class NodeRollout:
+    """
+    Ragged counterpart of ``RolloutBuffer``: per-step family, chosen node,
+    log-prob, value, reward and done; node rows and masks of all steps
+    concatenated, step s owning rows ``ptr[s]:ptr[s+1]``.  A step that
+    chose no node (``skip``) records no row, and the reward added for it
+    is dropped, so rewards stay aligned with the recorded steps.
+    """
+    def __init__(self):
+        self._x: list = []
+        self._m: list = []
+        self._fam, self._act, self._lp, self._v = [], [], [], []
+        self._r, self._d = [], []
+        self._has_v = True
+        self._awaiting: deque = deque()             # per step without reward: recorded?
+
+    def add(self, node_x: np.ndarray, mask: np.ndarray, fam: int, action: int,
+            logprob: float, value: Optional[float] = None):
+        self._x.append(np.asarray(node_x, dtype=np.float32))
+        self._m.append(np.asarray(mask, dtype=bool))
+        self._fam.append(int(fam)); self._act.append(int(action))
+        self._lp.append(float(logprob))
+        if value is None:
+            self._has_v = False
+        else:
+            self._v.append(float(value))
+        self._awaiting.append(True)
+
+    def skip(self):
+        self._awaiting.append(False)
+
+    def add_reward(self, reward: float, done: bool):
+        if self._awaiting and not self._awaiting.popleft():
+            if done and self._d:                    # episode still ends here
+                self._d[-1] = True
+            return
+        self._r.append(float(reward)); self._d.append(bool(done))
+
+    def add_rewards(self, rewards, dones):
+        for r, d in zip(rewards, dones):
+            self.add_reward(r, d)
+
+    def batch(self):
+        """(rows, row masks, step ptr, family, chosen node, logprob, reward, done, value | None)."""
+        counts = np.fromiter((len(x) for x in self._x), dtype=np.int64, count=len(self._x))
+        ptr = np.zeros(len(counts) + 1, dtype=np.int64)
+        np.cumsum(counts, out=ptr[1:])
+        dim = self._x[0].shape[1] if self._x else NODE_FEATURES
+        return (torch.from_numpy(np.concatenate(self._x) if self._x
+                                 else np.zeros((0, dim), np.float32)),
+                torch.from_numpy(np.concatenate(self._m) if self._m else np.zeros(0, bool)),
+                torch.from_numpy(ptr),
+                torch.tensor(self._fam, dtype=torch.long),
+                torch.tensor(self._act, dtype=torch.long),
+                torch.tensor(self._lp,  dtype=torch.float32),
+                torch.tensor(self._r,   dtype=torch.float32),
+                torch.tensor(self._d,   dtype=torch.float32),
+                torch.tensor(self._v, dtype=torch.float32)
+                if self._has_v and len(self._v) == len(self._x) else None)
+
+    def regroup(self, n_streams: int):
+        """Same contract as ``RolloutBuffer.regroup``: round-robin → stream-major."""
+        n = len(self._x)
+        if n_streams <= 1 or n == 0:
+            return
+        if n != len(self._r) or n % n_streams:
+            raise ValueError("regroup needs whole ticks with one reward per row")
+        T   = n // n_streams
+        idx = np.arange(n).reshape(T, n_streams).T.reshape(-1)
+        for name in ("_x", "_m", "_fam", "_act", "_lp", "_v", "_r", "_d"):
+            col = getattr(self, name)
+            if len(col) == n:
+                setattr(self, name, [col[i] for i in idx])
+        for i in range(T - 1, n, T):
+            self._d[i] = True
+
+    def state_dict(self) -> dict:
+        return {"kind": "node",
+                "x": list(self._x), "mask": list(self._m), "fam": list(self._fam),
+                "act": list(self._act), "logprobs": list(self._lp),
+                "values": list(self._v) if self._has_v else None,
+                "rewards": list(self._r), "is_terminals": list(self._d)}
+
+    def load_state_dict(self, sd: dict):
+        self._x, self._m = list(sd["x"]), list(sd["mask"])
+        self._fam, self._act, self._lp = list(sd["fam"]), list(sd["act"]), list(sd["logprobs"])
+        self._has_v = sd["values"] is not None
+        self._v = list(sd["values"] or [])
+        self._r, self._d = list(sd["rewards"]), list(sd["is_terminals"])
+        self._awaiting.clear()
+
+    def nbytes(self) -> int:
+        return sum(x.nbytes + m.nbytes for x, m in zip(self._x, self._m))
+
+    def __len__(self):
+        return len(self._x)
+
+    def drop_pending(self):
+        n = len(self._r)
+        for col in (self._x, self._m, self._fam, self._act, self._lp, self._v):
+            del col[n:]
+        self._awaiting.clear()
+
+    def keep_pending(self, keep):
+        """Keep only the steps awaiting a reward whose ``keep`` flag is set."""
+        keep = list(keep)
+        rec  = [k for k, recorded in zip(keep, self._awaiting) if recorded]
+        n    = len(self._r)
+        for col in (self._x, self._m, self._fam, self._act, self._lp, self._v):
+            if len(col) > n:
+                col[n:] = [x for x, k in zip(col[n:], rec) if k]
+        self._awaiting = deque(r for r, k in zip(self._awaiting, keep) if k)
+
+    def clear(self):
+        for col in (self._x, self._m, self._fam, self._act, self._lp, self._v, self._r, self._d):
+            col.clear()
+        self._awaiting.clear()
+        self._has_v = True
+
+
+# ───────────────────────────────────────────────
+class NodeTargetPolicy:
+    """
+    PPO over NodeScorer with the same tunables and update schedule as
+    ``PPOAgent`` (minibatches of steps, KL early stop, grad clipping).
+    Not torch.compile()d – the node count changes every call.
+    """
+    def __init__(self,
+                 n_families: int = 4,
+                 n_features: int = NODE_FEATURES,
+                 lr_actor: float = LR_ACTOR,
+                 lr_critic: float = LR_CRITIC,
+                 gamma: float = GAMMA,
+                 K_epochs: int = K_EPOCHS,
+                 eps_clip: float = EPS_CLIP,
+                 advantage: str = ADVANTAGE,
+                 gae_lambda: float = GAE_LAMBDA,
+                 minibatch: int = MINIBATCH,
+                 target_kl: float = TARGET_KL,
+                 max_grad_norm: float = MAX_GRAD_NORM):
+        self.gamma, self.K_epochs, self.eps_clip = gamma, K_epochs, eps_clip
+        if advantage not in ("mc", "gae"):
+            raise ValueError(f"unknown advantage estimator {advantage!r}")
+        self.advantage, self.gae_lambda = advantage, gae_lambda
+        self.minibatch, self.target_kl  = minibatch, target_kl
+        self.max_grad_norm = max_grad_norm
+        self.last_update: dict = {}
+
+        self.policy     = NodeScorer(n_features, n_families)
+        self.policy_old = NodeScorer(n_features, n_families)
+        self.policy_old.load_state_dict(self.policy.state_dict())
+        self.opt = torch.optim.Adam(
+            [{"params": list(self.policy.body.parameters())
+                        + list(self.policy.score.parameters()), "lr": lr_actor},
+             {"params": self.policy.value.parameters(), "lr": lr_critic}])
+        self.gen = torch.Generator()
+
+    # ───────────────────────────────────────────
+    def state_dict(self) -> dict:
+        return {"policy": self.policy.state_dict(), "opt": self.opt.state_dict()}
+
+    def load_state_dict(self, sd: dict):
+        self.policy.load_state_dict(sd["policy"])
+        self.policy_old.load_state_dict(sd["policy"])
+        if sd.get("opt"):
+            self.opt.load_state_dict(sd["opt"])
+
+    # ───────────────────────────────────────────
+    @torch.no_grad()
+    def select_action(self, node_x: np.ndarray, mask: np.ndarray, fam: int,
+                      memory: Optional[NodeRollout] = None) -> int:
+        """Index of the chosen node (row of ``node_x``); −1 for an empty cluster."""
+        n = len(node_x)
+        if n == 0:
+            if memory is not None:
+                memory.skip()
+            return -1
+        mask = np.asarray(mask, dtype=bool)
+        if not mask.any():                        # nothing eligible → uniform over all
+            mask = np.ones(n, dtype=bool)
+        x   = torch.from_numpy(np.ascontiguousarray(node_x, dtype=np.float32))
+        seg = torch.zeros(n, dtype=torch.long)
+        logp, val = self.policy_old(x, seg, 1, torch.tensor([fam]), torch.from_numpy(mask))
+        i = int(torch.multinomial(logp.exp(), 1, generator=self.gen))
+        if memory is not None:
+            memory.add(node_x, mask, fam, i, float(logp[i]),
+                       float(val[0]) if self.advantage == "gae" else None)
+        return i
+
+    # ───────────────────────────────────────────
+    def _evaluate(self, x, m, ptr, fam, act, steps):
+        rows, seg, first = _rows_of(ptr, steps)
+        logp, vals = self.policy(x[rows], seg, len(steps), fam[steps], m[rows])
+        new_lp = logp[first + act[steps]]
+        p      = logp.exp()
+        # masked rows: p = 0, logp = −inf; zero logp there, not the product,
+        # or the backward pass of p · logp yields 0 · −inf = NaN
+        ent    = -p.new_zeros(len(steps)).index_add(0, seg, p * logp.masked_fill(~m[rows], 0.0))
+        return new_lp, vals, ent
+
+    def update(self, memory: NodeRollout) -> dict:
+        """PPO epochs over the recorded steps; same stats as ``PPOAgent.update``."""
+        x, m, ptr, fam, act, lp, r, d, v = memory.batch()
+        n = len(fam)
+        if n == 0:                              # only DO_NOTHING / skipped steps
+            memory.clear()
+            self.last_update = {}
+            return self.last_update
+        if self.advantage == "gae":
+            if v is None:
+                with torch.no_grad():
+                    v = self._evaluate(x, m, ptr, fam, act, torch.arange(n))[1]
+            last = 0.0 if d[-1] else float(v[-1])
+            fixed_adv, returns = gae(r, v, d, self.gamma, self.gae_lambda, last)
+            fixed_adv = (fixed_adv - fixed_adv.mean()) / (fixed_adv.std(unbiased=False) + 1e-7)
+        else:
+            returns = discounted_cumsum(r, d, self.gamma)
+            returns = (returns - returns.mean()) / (returns.std(unbiased=False) + 1e-7)
+            fixed_adv = None
+
+        epochs, kl, loss = ppo_epochs(
+            self, lambda idx: self._evaluate(x, m, ptr, fam, act, idx),
+            n, lp, returns, fixed_adv, self.K_epochs)
+
+        self.policy_old.load_state_dict(self.policy.state_dict())
+        memory.clear()
+        self.last_update = {"epochs": epochs, "approx_kl": kl, "loss": float(loss.detach())}
+        return self.last_update
@@ -0,0 +1,214 @@
+# SPDX-License-Identifier: Apache-2.0
+# optimiser/node_tuner.py
+#
+# Node-local hardware tuning daemon (runs in the node-tuner DaemonSet).
+# – cpufreq governors and RAPL power limits read / written straight
+#   through sysfs, no cpupower subprocess
+# – one write per cpufreq policy (frequency domain) when the kernel exposes
+#   policies, else per CPU; every RAPL package zone, not just intel-rapl:0
+# – last-known values are cached, writes that would not change anything
+#   are skipped
+# – a small HTTP endpoint lets the controller's HARDWARE_TUNE apply a
+#   profile immediately instead of waiting for a label to be reconciled:
+#
+#     GET  /state                        → {"governors": {...}, "rapl_w": {...}}
+#     POST /tune  {"profile": "cpusave"} → applied changes
+#     POST /tune  {"governor": "powersave", "rapl_w": 120}
+#
+# SYSFS_ROOT points the tuner at a fake tree for tests.
+
+import os, json, time, hmac, logging, threading, urllib.request
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Union
+
+SYSFS_ROOT      = Path(os.getenv("SYSFS_ROOT", "/sys"))
+NODE_TUNER_ADDR = os.getenv("NODE_TUNER_ADDR", "0.0.0.0")
+NODE_TUNER_PORT = int(os.getenv("NODE_TUNER_PORT", 9110))
+NODE_TUNER_TOKEN = os.getenv("NODE_TUNER_TOKEN", "")           # shared secret; "" → none
+DEFAULT_GOV     = os.getenv("DEFAULT_GOV", "")                 # applied on start; "" → keep
+CPUSAVE_GOV     = os.getenv("CPUSAVE_GOV", "powersave")
+CPUSAVE_RAPL_W  = float(os.getenv("CPUSAVE_RAPL_W", 0))        # per package; 0 → untouched
+STATUS_FILE     = Path(os.getenv("NODE_TUNER_STATUS", "/tmp/node-tuner.status"))
+
+log = logging.getLogger("node-tuner")
+
+
+# ───────────────────────────────────────────────
+class SysfsTuner:
+    def __init__(self, root: Union[str, Path] = SYSFS_ROOT):
+        self.root = Path(root)
+        cpu = self.root / "devices/system/cpu"
+        # policyN covers all CPUs of one frequency domain → fewest writes
+        self.gov_files: Dict[str, Path] = {
+            p.parent.name: p for p in sorted(cpu.glob("cpufreq/policy*/scaling_governor"))}
+        if not self.gov_files:
+            self.gov_files = {p.parent.parent.name: p
+                              for p in sorted(cpu.glob("cpu[0-9]*/cpufreq/scaling_governor"))}
+        # top-level zones only (intel-rapl:N, not the intel-rapl:N:M subzones)
+        self.rapl_zones: Dict[str, Path] = {
+            z.name: z for z in sorted((self.root / "class/powercap").glob("intel-rapl:*"))
+            if z.name.count(":") == 1 and (z / "constraint_0_power_limit_uw").exists()}
+        self._lock = threading.Lock()
+        self._gov:  Dict[str, str] = {}
+        self._rapl: Dict[str, int] = {}
+        self.refresh()
+
+    # ───────────── reads ───────────────────────────────────
+    def refresh(self):
+        """Re-read everything (something else may have written sysfs)."""
+        with self._lock:
+            self._gov  = {k: p.read_text().strip() for k, p in self.gov_files.items()}
+            self._rapl = {k: int((z / "constraint_0_power_limit_uw").read_text())
+                          for k, z in self.rapl_zones.items()}
+
+    def available_governors(self) -> List[str]:
+        for p in self.gov_files.values():
+            avail = p.with_name("scaling_available_governors")
+            if avail.exists():
+                return avail.read_text().split()
+        return []
+
+    def state(self) -> Dict[str, Any]:
+        with self._lock:
+            return {"governors": dict(self._gov),
+                    "rapl_w": {k: uw / 1e6 for k, uw in self._rapl.items()}}
+
+    # ───────────── writes ──────────────────────────────────
+    def set_governor(self, governor: str, targets: Optional[List[str]] = None) -> int:
+        """Governor on every policy / CPU (or ``targets``); returns files written."""
+        avail = self.available_governors()
+        if avail and governor not in avail:
+            raise ValueError(f"governor {governor!r} not in {avail}")
+        written = 0
+        with self._lock:
+            for k in targets or self.gov_files:
+                if self._gov.get(k) == governor:
+                    continue
+                self.gov_files[k].write_text(governor)
+                self._gov[k] = governor
+                written += 1
+        if written:
+            log.info("cpufreq governor → %s on %d domains", governor, written)
+        return written
+
+    def set_rapl(self, watts: float, zones: Optional[List[str]] = None) -> int:
+        """Long-term power limit of every package (or ``zones``), capped at max_power_uw."""
+        written = 0
+        with self._lock:
+            for k in zones or self.rapl_zones:
+                z  = self.rapl_zones[k]
+                uw = int(watts * 1_000_000)
+                cap = z / "constraint_0_max_power_uw"
+                if cap.exists():
+                    uw = min(uw, int(cap.read_text()))
+                if self._rapl.get(k) == uw:
+                    continue
+                (z / "constraint_0_power_limit_uw").write_text(str(uw))
+                self._rapl[k] = uw
+                written += 1
+        if written:
+            log.info("RAPL limit → %.0f W on %d packages", watts, written)
+        return written
+
+    def apply(self, req: Dict[str, Any]) -> Dict[str, Any]:
+        """``{"profile": name}`` and/or explicit ``governor`` / ``rapl_w``."""
+        name = req.get("profile")
+        if name is not None and name not in PROFILES:
+            raise ValueError(f"unknown profile {name!r}")
+        req = {**PROFILES.get(name, {}), **{k: v for k, v in req.items() if k != "profile"}}
+        out = {}
+        if req.get("governor"):
+            out["governor"] = self.set_governor(req["governor"])
+        if req.get("rapl_w"):
+            out["rapl"] = self.set_rapl(float(req["rapl_w"]))
+        return out
+
+
+PROFILES: Dict[str, Dict[str, Any]] = {
+    "cpusave": {"governor": CPUSAVE_GOV, "rapl_w": CPUSAVE_RAPL_W},
+}
+
+
+# ───────────── HTTP endpoint ───────────────────────────────
+class _Handler(BaseHTTPRequestHandler):
+    tuner: SysfsTuner = None
+    token: str = ""
+
+    def _reply(self, code: int, body: Dict[str, Any]):
+        data = json.dumps(body).encode()
+        self.send_response(code)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _authorised(self) -> bool:
+        if not self.token:
+            return True
+        got = self.headers.get("Authorization", "")
+        return hmac.compare_digest(got, f"Bearer {self.token}")
+
+    def do_GET(self):
+        if self.path != "/state":
+            return self._reply(404, {"error": "not found"})
+        self._reply(200, self.tuner.state())
+
+    def do_POST(self):
+        if self.path != "/tune":
+            return self._reply(404, {"error": "not found"})
+        if not self._authorised():
+            return self._reply(401, {"error": "unauthorised"})
+        try:
+            n   = int(self.headers.get("Content-Length") or 0)
+            req = json.loads(self.rfile.read(n) or b"{}")
+            self._reply(200, {"applied": self.tuner.apply(req), **self.tuner.state()})
+        except (ValueError, KeyError) as e:
+            self._reply(400, {"error": str(e)})
+        except OSError as e:
+            log.error("sysfs write failed: %s", e)
+            self._reply(500, {"error": str(e)})
+
+    def log_message(self, fmt, *args):
+        log.debug(fmt, *args)
+
+
+def make_server(tuner: SysfsTuner, addr: str = NODE_TUNER_ADDR, port: int = NODE_TUNER_PORT,
+                token: str = NODE_TUNER_TOKEN) -> ThreadingHTTPServer:
+    handler = type("Handler", (_Handler,), {"tuner": tuner, "token": token})
+    server  = ThreadingHTTPServer((addr, port), handler)
+    log.info("node tuner listening on %s:%d", addr, server.server_address[1])
+    return server
+
+
+def serve(tuner: SysfsTuner, **kw) -> ThreadingHTTPServer:
+    """``make_server`` on a daemon thread; ``server.shutdown()`` stops it."""
+    server = make_server(tuner, **kw)
+    threading.Thread(target=server.serve_forever, name="node-tuner-http", daemon=True).start()
+    return server
+
+
+# ───────────── controller side ─────────────────────────────
+def request_tune(url: str, profile: str = "cpusave", token: str = NODE_TUNER_TOKEN,
+                 timeout: float = 5.0) -> Dict[str, Any]:
+    """POST a profile to a node's tuner (blocking; run it off the event loop)."""
+    req = urllib.request.Request(url.rstrip("/") + "/tune", method="POST",
+                                 data=json.dumps({"profile": profile}).encode(),
+                                 headers={"Content-Type": "application/json"})
+    if token:
+        req.add_header("Authorization", f"Bearer {token}")
+    with urllib.request.urlopen(req, timeout=timeout) as resp:
+        return json.loads(resp.read())
+
+
+def main():
+    logging.basicConfig(level=logging.INFO)
+    tuner = SysfsTuner()
+    log.info("%d cpufreq domains, %d RAPL packages", len(tuner.gov_files), len(tuner.rapl_zones))
+    ok = bool(DEFAULT_GOV) and tuner.set_governor(DEFAULT_GOV) >= 0
+    STATUS_FILE.write_text(f"{'SUCCESS' if ok else 'NO-ACTION'} {time.time()}\n")
+    make_server(tuner).serve_forever()
+
+
+if __name__ == "__main__":
+    main()
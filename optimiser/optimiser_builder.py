@@ -1,7 +1,10 @@
-import os, asyncio, aiohttp, time, orjson, numpy as np
+import os, asyncio, time, orjson, numpy as np
 from kubernetes import client, config
 from typing import Dict, Any
 
+from optimiser.k8s_io import K8sExecutor
+from optimiser.prom_client import PromQueryEngine, series
+
 PROM_URL = os.getenv("PROM_URL", "http://localhost:9090")
 
 PROM_QUERIES = {
@@ -18,27 +21,27 @@ PROM_QUERIES = {
 }
 
 class StateBuilder:
-    def __init__(self):
+    def __init__(self, io: K8sExecutor = None, prom: PromQueryEngine = None):
         config.load_incluster_config()
-        self.v1 = client.CoreV1Api()
+        self.v1   = client.CoreV1Api()
+        self.io   = io or K8sExecutor()
+        self.prom = prom or PromQueryEngine(PROM_URL)
     # ---------------------------------------------------
-    async def _prom_query(self, session, query):
-        async with session.get(f"{PROM_URL}/api/v1/query",
-                               params={"query": query, "time": time.time()}) as r:
-            j = await r.json()
-            return {tuple(m['metric'].values()): float(m['value'][1])
-                    for m in j['data']['result']}
+    async def _prom_query(self):
+        res = await self.prom.query_many(PROM_QUERIES)
+        return {name: series(r) for name, r in res.items()}
     # ---------------------------------------------------
     async def build_state(self) -> Dict[str, Any]:
-        async with aiohttp.ClientSession() as s:
-            results = await asyncio.gather(
-                *[self._prom_query(s, q) for q in PROM_QUERIES.values()]
-            )
-        prom_data = dict(zip(PROM_QUERIES.keys(), results))
+        prom_data, node_list, pod_list = await asyncio.gather(
+            self._prom_query(),
+            self.io.call("list_node", self.v1.list_node),
+            self.io.call("list_pod_for_all_namespaces",
+                         self.v1.list_pod_for_all_namespaces),
+        )
 
         # ----- Node info from K8s API --------------
         nodes = {}
-        for n in self.v1.list_node().items:
+        for n in node_list.items:
             name = n.metadata.name
             alloc = n.status.allocatable
             nodes[name] = {
@@ -52,7 +55,7 @@ class StateBuilder:
 
         # ---- Pods (only essential data) ------------
         pods = {}
-        for p in self.v1.list_pod_for_all_namespaces().items:
+        for p in pod_list.items:
             pods[p.metadata.uid] = {
                 "name": p.metadata.name,
                 "ns":   p.metadata.namespace,
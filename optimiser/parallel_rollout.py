@@ -0,0 +1,202 @@
+# SPDX-License-Identifier: Apache-2.0
+# optimiser/parallel_rollout.py
+#
+# Multi-process rollout collection for HierarchicalAgent.
+# – N worker processes, each stepping its own environment copy
+# – CPU-only policy snapshot per worker, refreshed from shared-memory
+#   weights whenever the learner publishes a new version
+# – trajectories written into preallocated shared-memory tensors, so only
+#   a (worker, version) tuple crosses the queue
+# – the learner (this process) runs PPOAgent.update and republishes
+# – gray target head only: the node head's ragged per-node rows do not fit
+#   the fixed-shape shared-memory tensors (ValueError for such an agent)
+# – a worker that dies, or sends nothing for ROLLOUT_TIMEOUT s, shuts the
+#   pool down with a RuntimeError naming it
+#
+#     pool = ParallelRollout(agent, SimFactory(n_nodes=50, n_pods=800),
+#                            n_workers=8, steps_per_worker=256)
+#     pool.train(iterations=100)
+#     pool.close()
+
+import copy, os, queue, time
+from typing import Callable, Dict, List
+
+import numpy as np
+import torch
+import torch.multiprocessing as mp
+
+from optimiser.advanced_optimization import unwrap
+from optimiser.cluster_snapshot import N_FEATURES, snapshot_of
+from optimiser.decision_engine  import HierarchicalAgent, HierMem
+from optimiser.fast_inference   import FastActor
+
+ROLLOUT_WORKERS = int(os.getenv("ROLLOUT_WORKERS", os.cpu_count() or 1))
+ROLLOUT_STEPS   = int(os.getenv("ROLLOUT_STEPS", 256))
+ROLLOUT_TIMEOUT = float(os.getenv("ROLLOUT_TIMEOUT", 600))   # s without word from a worker
+ROLLOUT_POLL_S  = 1.0                                        # liveness check interval
+
+
+class SimFactory:
+    """Picklable ``env_fn(worker_id)`` building a seeded ClusterSimulator."""
+    def __init__(self, seed: int = 0, **sim_kwargs):
+        self.seed, self.kw = seed, sim_kwargs
+
+    def __call__(self, worker_id: int):
+        from optimiser.simulator import ClusterSimulator
+        return ClusterSimulator(seed=self.seed + worker_id, **self.kw)
+
+
+# ───────────── worker process ──────────────────────────────
+@torch.no_grad()
+def _worker(wid: int, env_fn: Callable, shared: Dict[str, torch.nn.Module],
+            lock, version, buf: Dict[str, torch.Tensor], cmd_q, done_q, seed: int):
+    torch.set_num_threads(1)
+    env   = env_fn(wid)
+    local = {k: copy.deepcopy(m) for k, m in shared.items()}
+    fast  = {k: FastActor.from_actor(m.actor, seed=2 * (seed + wid) + i)     # NumPy sampling
+             for i, (k, m) in enumerate(local.items())}
+    seen  = -1
+    T     = buf["rew"].shape[0]
+    done_q.put((wid, seen))                         # ready
+    while cmd_q.get() is not None:
+        if version.value != seen:
+            with lock:
+                for k, m in local.items():
+                    m.load_state_dict(shared[k].state_dict())
+                    fast[k].load_actor(m.actor)
+                seen = version.value
+        for t in range(T):
+            st = torch.from_numpy(snapshot_of(env.observe()).features())
+            fam, lp_h = (x[0].item() for x in fast["high"].sample(st.numpy()))
+            low_st = torch.cat([st, st.new_tensor([fam])])
+            tgt, lp_l = (x[0].item() for x in fast["low"].sample(low_st.numpy()))
+            env.apply(fam, tgt)
+            buf["s_high"][t] = st;      buf["a_high"][t] = fam; buf["lp_high"][t] = lp_h
+            buf["s_low"][t]  = low_st;  buf["a_low"][t]  = tgt; buf["lp_low"][t]  = lp_l
+            buf["rew"][t]    = -env.total_power()
+        done_q.put((wid, seen))
+
+
+# ───────────── learner side ────────────────────────────────
+class ParallelRollout:
+    """
+    Synchronous PPO with a process pool: every iteration all workers
+    collect ``steps_per_worker`` transitions with the same published
+    policy version, then the learner updates once on the union (one
+    trajectory per worker, cut at its end) and broadcasts the weights.
+    """
+    def __init__(self,
+                 agent: HierarchicalAgent,
+                 env_fn: Callable,
+                 n_workers: int = ROLLOUT_WORKERS,
+                 steps_per_worker: int = ROLLOUT_STEPS,
+                 state_dim: int = N_FEATURES,
+                 seed: int = 0,
+                 timeout: float = ROLLOUT_TIMEOUT):
+        if getattr(agent, "node_targets", False):
+            raise ValueError("parallel rollout supports the gray head only")
+        self.agent   = agent
+        self.n       = n_workers
+        self.T       = steps_per_worker
+        self.version = 0
+        self.timeout = timeout
+        self.memory  = HierMem()
+
+        ctx = mp.get_context("spawn")
+        self._lock    = ctx.Lock()
+        self._ver     = ctx.Value("q", 0)
+        self._shared  = {"high": copy.deepcopy(unwrap(agent.high.policy)).cpu().share_memory(),
+                         "low":  copy.deepcopy(unwrap(agent.low.policy)).cpu().share_memory()}
+        self._done_q  = ctx.Queue()
+        self._cmd_q: List = []
+        self._bufs:  List[Dict[str, torch.Tensor]] = []
+        self._procs: List = []
+        T, D = steps_per_worker, state_dim
+        for wid in range(n_workers):
+            buf = {"s_high": torch.zeros(T, D),     "a_high": torch.zeros(T, dtype=torch.long),
+                   "lp_high": torch.zeros(T),
+                   "s_low":  torch.zeros(T, D + 1), "a_low":  torch.zeros(T, dtype=torch.long),
+                   "lp_low":  torch.zeros(T),
+                   "rew":    torch.zeros(T)}
+            for t in buf.values():
+                t.share_memory_()
+            q = ctx.Queue()
+            p = ctx.Process(target=_worker, name=f"rollout-{wid}", daemon=True,
+                            args=(wid, env_fn, self._shared, self._lock, self._ver,
+                                  buf, q, self._done_q, seed))
+            p.start()
+            self._bufs.append(buf); self._cmd_q.append(q); self._procs.append(p)
+        self._wait()                                # until every env is built
+
+    # ───────────────────────────────────────────
+    def _wait(self) -> Dict[int, int]:
+        """
+        One (worker, version) message from every worker.  Checks worker
+        liveness while waiting; a dead or silent worker closes the pool.
+        """
+        got, deadline = {}, time.monotonic() + self.timeout
+        while len(got) < self.n:
+            try:
+                wid, ver = self._done_q.get(timeout=ROLLOUT_POLL_S)
+            except queue.Empty:
+                for wid, p in enumerate(self._procs):
+                    if wid not in got and not p.is_alive():
+                        self.close()
+                        raise RuntimeError(f"rollout worker {wid} exited (code {p.exitcode})")
+                if time.monotonic() > deadline:
+                    silent = [w for w in range(self.n) if w not in got]
+                    self.close()
+                    raise RuntimeError(f"rollout worker {silent[0]} sent nothing in "
+                                       f"{self.timeout:g} s (waiting on {silent})")
+                continue
+            got[wid], deadline = ver, time.monotonic() + self.timeout
+        return got
+
+    def publish(self):
+        """Copy the learner's current weights into shared memory (new version)."""
+        with self._lock:
+            self._shared["high"].load_state_dict(unwrap(self.agent.high.policy).state_dict())
+            self._shared["low"].load_state_dict(unwrap(self.agent.low.policy).state_dict())
+            self._ver.value += 1
+            self.version = self._ver.value
+
+    def collect(self) -> HierMem:
+        """One synchronous round: every worker fills its buffer once."""
+        for q in self._cmd_q:
+            q.put("go")
+        for wid, ver in sorted(self._wait().items()):
+            if ver != self.version:
+                raise RuntimeError(f"worker {wid} used policy v{ver}, expected v{self.version}")
+        mem   = self.memory
+        dones = np.zeros(self.T, dtype=bool); dones[-1] = True
+        for buf in self._bufs:                   # one contiguous trajectory per worker
+            mem.high.add_batch(buf["s_high"], buf["a_high"], buf["lp_high"])
+            mem.low.add_batch(buf["s_low"], buf["a_low"], buf["lp_low"])
+            mem.add_rewards(buf["rew"].numpy(), dones)
+        return mem
+
+    def train(self, iterations: int) -> Dict[str, float]:
+        t_collect = t_update = 0.0
+        stats = {}
+        for _ in range(iterations):
+            self.publish()
+            t0 = time.perf_counter()
+            mem = self.collect()
+            t1 = time.perf_counter()
+            stats = self.agent.update(mem)
+            t_update += time.perf_counter() - t1
+            t_collect += t1 - t0
+        steps = iterations * self.n * self.T
+        return {"transitions": steps,
+                "collect_steps_per_s": steps / t_collect if t_collect else 0.0,
+                "collect_s": t_collect, "update_s": t_update,
+                "last_update": stats}
+
+    def close(self):
+        for q in self._cmd_q:
+            q.put(None)
+        for p in self._procs:
+            p.join(timeout=5)
+            if p.is_alive():
+                p.terminate()
+                p.join()
@@ -0,0 +1,124 @@
+# SPDX-License-Identifier: Apache-2.0
+# optimiser/profiler.py
+#
+# In-process sampling profiler for production pods.
+# – a daemon thread snapshots every thread's Python stack each interval
+# – identical stacks are counted; dump() writes Brendan Gregg "collapsed"
+#   lines (``thread;file:func;… count``) for flamegraph.pl / speedscope
+# – off by default; toggled at runtime with SIGUSR2 (each stop dumps):
+#
+#     kubectl exec deploy/optimiser -- kill -USR2 1    # start
+#     kubectl exec deploy/optimiser -- kill -USR2 1    # stop → $PROFILE_DIR/*.collapsed
+#
+# A run that hits PROFILE_MAX_S stops and dumps on its own.
+
+import os, sys, time, signal, logging, threading
+from collections import Counter
+from pathlib import Path
+from typing import Optional, Union
+
+PROFILE_DIR      = Path(os.getenv("PROFILE_DIR", "/tmp/optimiser-profiles"))
+PROFILE_INTERVAL = float(os.getenv("PROFILE_INTERVAL", 0.005))    # s between samples
+PROFILE_MAX_S    = float(os.getenv("PROFILE_MAX_S", 300))         # auto-stop
+
+log = logging.getLogger("profiler")
+
+
+def _collapse(frame) -> str:
+    parts = []
+    while frame is not None:
+        co = frame.f_code
+        parts.append(f"{os.path.basename(co.co_filename)}:{co.co_name}")
+        frame = frame.f_back
+    return ";".join(reversed(parts))
+
+
+class SamplingProfiler:
+    def __init__(self, out_dir: Union[str, Path] = PROFILE_DIR,
+                 interval: float = PROFILE_INTERVAL, max_seconds: float = PROFILE_MAX_S,
+                 on_change=None):
+        self.out_dir   = Path(out_dir)
+        self.interval  = interval
+        self.max_s     = max_seconds
+        self.on_change = on_change                      # callback(running: bool)
+        self.stacks: Counter = Counter()
+        self.samples   = 0
+        self._stop     = threading.Event()
+        self._lock     = threading.Lock()               # one finish per run
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    # ───────────────────────────────────────────
+    def _run(self):
+        me, end = threading.get_ident(), time.monotonic() + self.max_s
+        names = {}
+        while not self._stop.wait(self.interval) and time.monotonic() < end:
+            if len(names) != threading.active_count():
+                names = {t.ident: t.name for t in threading.enumerate()}
+            for tid, frame in sys._current_frames().items():
+                if tid != me:
+                    self.stacks[f"{names.get(tid, tid)};{_collapse(frame)}"] += 1
+            self.samples += 1
+        if not self._stop.is_set():
+            log.info("profile reached the %.0f s cap", self.max_s)
+            self._finish()
+
+    def _finish(self) -> Optional[Path]:
+        with self._lock:
+            if self._thread is None:                    # the other side got here first
+                return None
+            self._thread = None
+            path = self.dump()
+        if self.on_change:
+            self.on_change(False)
+        return path
+
+    def start(self):
+        with self._lock:
+            if self._thread is not None:
+                return
+            self.stacks.clear(); self.samples = 0
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="sampling-profiler", daemon=True)
+            self._thread.start()
+        log.info("profiling every %.1f ms", self.interval * 1e3)
+        if self.on_change:
+            self.on_change(True)
+
+    def stop(self) -> Optional[Path]:
+        """Stops sampling and dumps what was collected."""
+        thread = self._thread
+        if thread is None:
+            return None
+        self._stop.set()
+        thread.join()
+        return self._finish()
+
+    def toggle(self, *_):
+        """Signal-handler compatible start/stop switch."""
+        if self.running:
+            # dumping from the handler would block the interrupted thread
+            threading.Thread(target=self.stop, name="profiler-dump", daemon=True).start()
+        else:
+            self.start()
+
+    def dump(self, path: Optional[Path] = None) -> Path:
+        path = path or self.out_dir / f"profile-{time.strftime('%Y%m%d-%H%M%S')}.collapsed"
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with open(path, "w") as f:
+            for stack, n in self.stacks.most_common():
+                f.write(f"{stack} {n}\n")
+        log.info("wrote %d samples (%d stacks) to %s", self.samples, len(self.stacks), path)
+        return path
+
+    def install_toggle(self, sig: int = signal.SIGUSR2) -> bool:
+        """Bind ``sig`` to toggle(); only possible from the main thread."""
+        try:
+            signal.signal(sig, self.toggle)
+            return True
+        except ValueError:
+            log.warning("not in the main thread – no signal toggle for the profiler")
+            return False
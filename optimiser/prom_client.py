@@ -0,0 +1,200 @@
+# SPDX-License-Identifier: Apache-2.0
+# optimiser/prom_client.py
+#
+# Long-lived Prometheus instant-query engine shared by the state builders.
+# – one aiohttp session / keep-alive connection pool for the process
+# – concurrency cap, per-request timeout, retries with back-off
+# – TTL cache keyed on (query, step-aligned timestamp)
+# – optional fan-in of many instant queries into a single request
+# – per-query-name latency and failures exported when given an Exporter
+# – responses decoded with orjson, cyclic GC paused meanwhile (see decode)
+
+import os, gc, math, time, asyncio, logging
+from typing import Any, Dict, List, Optional, Tuple
+
+import aiohttp
+import orjson
+
+PROM_TIMEOUT     = float(os.getenv("PROM_TIMEOUT", 10))
+PROM_RETRIES     = int(os.getenv("PROM_RETRIES", 2))
+PROM_CONCURRENCY = int(os.getenv("PROM_MAX_CONCURRENCY", 8))
+PROM_POOL_SIZE   = int(os.getenv("PROM_POOL_SIZE", 16))
+PROM_STEP        = float(os.getenv("PROM_STEP", 15))      # ≈ scrape interval
+PROM_FAN_IN      = os.getenv("PROM_FAN_IN", "0") == "1"
+
+FAN_IN_LABEL = "optimiser_q"          # tags each sub-query's series when fanned in
+CACHE_MAX    = 1024
+
+
+class PromError(Exception):
+    """Prometheus answered, but not with ``status: success``."""
+
+
+def decode(body: bytes) -> Any:
+    """
+    orjson decode with the cyclic GC paused: a 10⁵-series answer is ~10⁶
+    fresh dicts / lists / strings, and collections triggered part-way
+    through would rescan them repeatedly (≈4× the parse itself).
+    """
+    enabled = gc.isenabled()
+    gc.disable()
+    try:
+        return orjson.loads(body)
+    finally:
+        if enabled:
+            gc.enable()
+
+
+def series(result: List[Dict[str, Any]]) -> Dict[Tuple, float]:
+    """Instant-vector result → ``{label-values tuple: value}``."""
+    return {tuple(m['metric'].values()): float(m['value'][1]) for m in result}
+
+
+# ───────────────────────────────────────────────
+class PromQueryEngine:
+    def __init__(self,
+                 url: str,
+                 step: float = PROM_STEP,
+                 ttl: Optional[float] = None,
+                 timeout: float = PROM_TIMEOUT,
+                 retries: int = PROM_RETRIES,
+                 max_concurrency: int = PROM_CONCURRENCY,
+                 pool_size: int = PROM_POOL_SIZE,
+                 fan_in: bool = PROM_FAN_IN,
+                 exporter=None):
+        self.url       = url.rstrip("/")
+        self.step      = step
+        self.ttl       = step if ttl is None else ttl
+        self.timeout   = timeout
+        self.retries   = retries
+        self.pool_size = pool_size
+        self.fan_in    = fan_in
+        self.exp       = exporter
+        self.log       = logging.getLogger("prom-client")
+
+        self._sem      = asyncio.Semaphore(max_concurrency)
+        self._session: Optional[aiohttp.ClientSession] = None
+        self._cache:   Dict[Tuple[str, float], Tuple[float, list]] = {}
+        self._pending: Dict[Tuple[str, float], asyncio.Future] = {}
+        self.hits = self.misses = 0
+
+    # ───────────────────────────────────────────
+    def _sess(self) -> aiohttp.ClientSession:
+        if self._session is None or self._session.closed:
+            self._session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit=self.pool_size,
+                                               keepalive_timeout=60),
+                timeout=aiohttp.ClientTimeout(total=self.timeout))
+        return self._session
+
+    def _aligned(self, ts: Optional[float]) -> float:
+        ts = time.time() if ts is None else ts
+        return math.floor(ts / self.step) * self.step if self.step else ts
+
+    async def _fetch(self, q: str, ts: float) -> list:
+        for attempt in range(self.retries + 1):
+            try:
+                async with self._sem:
+                    async with self._sess().get(f"{self.url}/api/v1/query",
+                                                params={"query": q, "time": ts}) as r:
+                        if r.status >= 500:
+                            raise aiohttp.ClientResponseError(
+                                r.request_info, r.history, status=r.status)
+                        js = decode(await r.read())
+                if js.get("status") != "success":
+                    raise PromError(js.get("error", js.get("status")))
+                return js['data']['result']
+            except (aiohttp.ClientError, asyncio.TimeoutError, PromError) as e:
+                if attempt == self.retries or isinstance(e, PromError):
+                    if self.exp is not None:
+                        self.exp.api_error("prometheus", e)
+                    raise
+                self.log.debug("query retry %d (%s): %s", attempt + 1, e, q)
+                await asyncio.sleep(0.2 * 2 ** attempt)
+
+    def _remember(self, key: Tuple[str, float], result: list):
+        now = time.monotonic()
+        if len(self._cache) >= CACHE_MAX:
+            self._cache = {k: v for k, v in self._cache.items() if v[0] > now}
+        self._cache[key] = (now + self.ttl, result)
+
+    def _cached(self, key: Tuple[str, float]) -> Optional[list]:
+        hit = self._cache.get(key)
+        if hit is not None and hit[0] > time.monotonic():
+            self.hits += 1
+            return hit[1]
+        return None
+
+    # ───────────────────────────────────────────
+    async def query(self, q: str, ts: Optional[float] = None) -> list:
+        """Instant query at the step-aligned ``ts``; concurrent callers share one request."""
+        key = (q, self._aligned(ts))
+        hit = self._cached(key)
+        if hit is not None:
+            return hit
+        if key in self._pending:
+            return await asyncio.shield(self._pending[key])
+
+        self.misses += 1
+        fut = asyncio.get_running_loop().create_future()
+        self._pending[key] = fut
+        try:
+            result = await self._fetch(q, key[1])
+            self._remember(key, result)
+            fut.set_result(result)
+            return result
+        except asyncio.CancelledError:
+            fut.cancel()
+            raise
+        except Exception as e:
+            fut.set_exception(e)
+            fut.exception()                 # mark retrieved when nobody else waits
+            raise
+        finally:
+            del self._pending[key]
+
+    async def query_many(self, queries: Dict[str, str],
+                         ts: Optional[float] = None) -> Dict[str, list]:
+        """``{name: promql}`` → ``{name: result}``; one request when fan-in is on."""
+        if not self.fan_in or len(queries) < 2:
+            res = await asyncio.gather(*[self._timed(name, q, ts) for name, q in queries.items()])
+            return dict(zip(queries, res))
+
+        aligned = self._aligned(ts)
+        out, todo = {}, {}
+        for name, q in queries.items():
+            hit = self._cached((q, aligned))
+            if hit is not None:
+                out[name] = hit
+            else:
+                todo[name] = q
+        if not todo:
+            return out
+
+        self.misses += len(todo)
+        t0 = time.perf_counter()
+        combined = " or ".join(
+            f'label_replace({q}, "{FAN_IN_LABEL}", "{name}", "", "")'
+            for name, q in todo.items())
+        split = {name: [] for name in todo}
+        for m in await self._fetch(combined, aligned):
+            split[m['metric'].pop(FAN_IN_LABEL)].append(m)
+        for name, result in split.items():
+            self._remember((todo[name], aligned), result)
+            if self.exp is not None:                # every sub-query waited this long
+                self.exp.prom_query_seconds.labels(query=name).observe(time.perf_counter() - t0)
+        out.update(split)
+        return out
+
+    async def _timed(self, name: str, q: str, ts: Optional[float]) -> list:
+        if self.exp is None:
+            return await self.query(q, ts)
+        t0 = time.perf_counter()
+        try:
+            return await self.query(q, ts)
+        finally:
+            self.exp.prom_query_seconds.labels(query=name).observe(time.perf_counter() - t0)
+
+    async def close(self):
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
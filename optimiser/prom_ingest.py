@@ -0,0 +1,85 @@
+# SPDX-License-Identifier: Apache-2.0
+# optimiser/prom_ingest.py
+#
+# Prometheus instant-vector results → dense per-node / per-pod arrays.
+# – a series is resolved by the labels that name its subject: a node by
+#   "node", else "instance" (node name, InternalIP or either with :port),
+#   a pod by "namespace" + "pod"; extra labels do not break the match
+# – values go straight into preallocated float64 arrays in snapshot order,
+#   with no per-sample tuple keys or intermediate {labels: value} dicts
+# – series that resolve to nothing (missing label, node / pod not in the
+#   cache) are counted per query instead of silently reading as 0
+#
+#     ing  = PromIngest(node_index, ip_index, pod_index)
+#     util = ing.nodes("node_cpu_util", result, n_nodes)
+#     ing.unmatched                              # {"node_cpu_util": 0, ...}
+
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+NODE_LABELS = ("node", "instance")
+_NO_PODS: Dict[str, int] = {}
+
+
+def total(result: List[Dict[str, Any]]) -> float:
+    """Sum of all samples (scalar-style queries such as ``sum(...)``)."""
+    return sum(float(m["value"][1]) for m in result)
+
+
+class PromIngest:
+    """
+    Resolves series against ``node_index`` (name → row), ``ip_index``
+    (InternalIP → row) and ``pod_index`` (namespace → pod name → row).
+    """
+    def __init__(self, node_index: Dict[str, int], ip_index: Dict[str, int],
+                 pod_index: Dict[str, Dict[str, int]]):
+        self.node_index = node_index
+        self.ip_index   = ip_index
+        self.pod_index  = pod_index
+        self.unmatched: Dict[str, int] = {}
+
+    def _node(self, labels: Dict[str, str]) -> Optional[int]:
+        for key in NODE_LABELS:
+            v = labels.get(key)
+            if v is None:
+                continue
+            i = self.node_index.get(v)
+            if i is None:
+                i = self.ip_index.get(v)
+            if i is None and ":" in v:                      # host:port, [v6]:port
+                host = v.rsplit(":", 1)[0].strip("[]")
+                i = self.node_index.get(host)
+                if i is None:
+                    i = self.ip_index.get(host)
+            return i
+        return None
+
+    def nodes(self, name: str, result: List[Dict[str, Any]], n: int,
+              add: bool = False) -> np.ndarray:
+        """(n,) values per node row; ``add`` sums several series per node."""
+        out, miss = np.zeros(n), 0
+        for m in result:
+            i = self._node(m["metric"])
+            if i is None:
+                miss += 1
+            elif add:
+                out[i] += float(m["value"][1])
+            else:
+                out[i] = float(m["value"][1])
+        self.unmatched[name] = miss
+        return out
+
+    def pods(self, name: str, result: List[Dict[str, Any]], n: int) -> np.ndarray:
+        """(n,) summed values per pod row."""
+        out, miss = np.zeros(n), 0
+        index = self.pod_index
+        for m in result:
+            labels = m["metric"]
+            j = index.get(labels.get("namespace"), _NO_PODS).get(labels.get("pod"))
+            if j is None:
+                miss += 1
+            else:
+                out[j] += float(m["value"][1])
+        self.unmatched[name] = miss
+        return out
@@ -0,0 +1,377 @@
+# SPDX-License-Identifier: Apache-2.0
+# optimiser/sharding.py
+#
+# Node sharding for running several controller replicas on one cluster.
+# – nodes map to SHARD_COUNT shards on a consistent hash ring (node name),
+#   so changing the shard count moves only ~1/N of the nodes
+# – every replica heartbeats a member lease; shards are spread over the
+#   live members by rendezvous hashing, so a join / leave moves only the
+#   shards that member wins / held
+# – a replica acts on a shard only while it holds that shard's lease: a
+#   shard changes hands only once the old owner released it or its lease
+#   expired, so two replicas never act on the same node
+# – leases: MemoryLeases (one process, tests), FileLeases (shared
+#   directory, flock), KubeLeases (coordination.k8s.io/v1 Lease objects)
+# – each replica also holds the lowest free slot lease (0, 1, …): a small
+#   ordinal that outlives pod names, so per-replica state on the models
+#   volume (checkpoint, experience) is picked up again after a restart
+# – a renew thread keeps the leases alive independent of the cycle length;
+#   if renewing fails for a whole LEASE_TTL the replica owns nothing
+#
+#     shards = ShardCoordinator(KubeLeases("optimiser"), "optimiser-7d9f-x2").start()
+#     keep   = shards.mask(snap.node_names)        # bool per node row
+#     shards.owns("node-17")
+
+import os, json, time, fcntl, socket, hashlib, logging, threading
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Dict, FrozenSet, Iterable, Optional, Sequence, Tuple, Union
+
+import numpy as np
+from kubernetes import client
+
+SHARD_LEASES    = os.getenv("SHARD_LEASES", "")          # "" (off) | memory | file:<dir> | k8s
+SHARD_COUNT     = int(os.getenv("SHARD_COUNT", 64))
+SHARD_IDENTITY  = os.getenv("SHARD_IDENTITY", socket.gethostname())   # pod name in k8s
+SHARD_NAMESPACE = os.getenv("SHARD_NAMESPACE", "default")  # where KubeLeases live
+LEASE_PREFIX    = os.getenv("SHARD_LEASE_PREFIX", "optimiser")
+LEASE_TTL       = float(os.getenv("SHARD_LEASE_TTL", 30))  # s; renewed every TTL / 3
+SHARD_SLOTS     = int(os.getenv("SHARD_SLOTS", 256))       # max replicas with a slot
+RING_VNODES     = 128                                      # ring points per shard
+
+log = logging.getLogger("sharding")
+
+
+def _hash(key: str) -> int:
+    return int.from_bytes(hashlib.blake2b(key.encode(), digest_size=8).digest(), "big")
+
+
+# ───────────────────────────────────────────────
+class HashRing:
+    """Consistent hash ring: ``vnodes`` points per shard, key → next point clockwise."""
+    def __init__(self, shards: Iterable[int], vnodes: int = RING_VNODES):
+        points = sorted((_hash(f"{s}#{v}"), s) for s in shards for v in range(vnodes))
+        self._keys   = np.array([h for h, _ in points], dtype=np.uint64)
+        self._shards = np.array([s for _, s in points], dtype=np.int32)
+
+    def shard(self, key: str) -> int:
+        i = int(np.searchsorted(self._keys, np.uint64(_hash(key)), side="right"))
+        return int(self._shards[i % len(self._shards)])
+
+    def shards(self, keys: Sequence[str]) -> np.ndarray:
+        h = np.fromiter((_hash(k) for k in keys), dtype=np.uint64, count=len(keys))
+        return self._shards[np.searchsorted(self._keys, h, side="right") % len(self._shards)]
+
+
+def assign(shard: int, members: Sequence[str]) -> Optional[str]:
+    """Rendezvous (highest-random-weight) owner of ``shard`` among ``members``."""
+    return max(members, key=lambda m: _hash(f"{shard}/{m}"), default=None)
+
+
+# ───────────── lease backends ──────────────────────────────
+# acquire(name, holder, ttl, now) → bool   take or renew (free, expired or own)
+# release(name, holder)                   give up, if still held by ``holder``
+# holders(prefix, now) → {name: holder}   live leases whose name starts with prefix
+
+class MemoryLeases:
+    """In-process leases; coordinators sharing one instance see each other."""
+    def __init__(self):
+        self._leases: Dict[str, Tuple[str, float]] = {}
+        self._lock = threading.Lock()
+
+    def acquire(self, name: str, holder: str, ttl: float, now: float) -> bool:
+        with self._lock:
+            cur = self._leases.get(name)
+            if cur is not None and cur[0] != holder and cur[1] > now:
+                return False
+            self._leases[name] = (holder, now + ttl)
+            return True
+
+    def release(self, name: str, holder: str):
+        with self._lock:
+            if self._leases.get(name, ("",))[0] == holder:
+                del self._leases[name]
+
+    def holders(self, prefix: str, now: float) -> Dict[str, str]:
+        with self._lock:
+            return {n: h for n, (h, exp) in self._leases.items()
+                    if n.startswith(prefix) and exp > now}
+
+
+class FileLeases:
+    """
+    One JSON file per lease under ``directory`` (a volume every replica
+    mounts); read-modify-write is serialised with flock on ``.lock``.
+    """
+    def __init__(self, directory: Union[str, Path]):
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self._lockfile = self.directory / ".lock"
+
+    def _locked(self):
+        f = open(self._lockfile, "a")
+        fcntl.flock(f, fcntl.LOCK_EX)
+        return f                                    # closing it releases the lock
+
+    def _read(self, path: Path) -> Optional[Dict]:
+        try:
+            return json.loads(path.read_text())
+        except (FileNotFoundError, ValueError):
+            return None
+
+    def acquire(self, name: str, holder: str, ttl: float, now: float) -> bool:
+        path = self.directory / f"{name}.json"
+        with self._locked():
+            cur = self._read(path)
+            if cur is not None and cur["holder"] != holder and cur["expires"] > now:
+                return False
+            tmp = path.with_name(f".{path.name}.tmp")
+            tmp.write_text(json.dumps({"holder": holder, "expires": now + ttl}))
+            os.replace(tmp, path)
+            return True
+
+    def release(self, name: str, holder: str):
+        path = self.directory / f"{name}.json"
+        with self._locked():
+            cur = self._read(path)
+            if cur is not None and cur["holder"] == holder:
+                path.unlink(missing_ok=True)
+
+    def holders(self, prefix: str, now: float) -> Dict[str, str]:
+        out = {}
+        with self._locked():
+            for path in self.directory.glob(f"{prefix}*.json"):
+                cur = self._read(path)
+                if cur is not None and cur["expires"] > now:
+                    out[path.stem] = cur["holder"]
+        return out
+
+
+class KubeLeases:
+    """
+    coordination.k8s.io/v1 Leases in ``namespace``.  Updates carry the
+    resourceVersion that was read, so of two replicas racing for a free
+    lease the API server lets exactly one win (the other gets 409).
+    Expiry is judged on ``now`` against renewTime + leaseDurationSeconds.
+    """
+    def __init__(self, namespace: str = SHARD_NAMESPACE, coordination_v1=None):
+        self.api       = coordination_v1 or client.CoordinationV1Api()
+        self.namespace = namespace
+
+    @staticmethod
+    def _expired(spec, now: float) -> bool:
+        if not spec.holder_identity or spec.renew_time is None:
+            return True
+        return spec.renew_time.timestamp() + (spec.lease_duration_seconds or 0) <= now
+
+    def acquire(self, name: str, holder: str, ttl: float, now: float) -> bool:
+        ts = datetime.fromtimestamp(now, timezone.utc)
+        try:
+            lease = self.api.read_namespaced_lease(name, self.namespace)
+        except client.ApiException as e:
+            if e.status != 404:
+                raise
+            body = client.V1Lease(
+                metadata=client.V1ObjectMeta(name=name,
+                                             labels={"app.kubernetes.io/managed-by": LEASE_PREFIX}),
+                spec=client.V1LeaseSpec(holder_identity=holder, lease_duration_seconds=int(ttl),
+                                        acquire_time=ts, renew_time=ts, lease_transitions=0))
+            try:
+                self.api.create_namespaced_lease(self.namespace, body)
+                return True
+            except client.ApiException as e:
+                if e.status == 409:                 # created by someone else meanwhile
+                    return False
+                raise
+        spec = lease.spec
+        if spec.holder_identity != holder:
+            if not self._expired(spec, now):
+                return False
+            spec.acquire_time = ts
+            spec.lease_transitions = (spec.lease_transitions or 0) + 1
+        spec.holder_identity        = holder
+        spec.lease_duration_seconds = int(ttl)
+        spec.renew_time             = ts
+        try:
+            self.api.replace_namespaced_lease(name, self.namespace, lease)
+            return True
+        except client.ApiException as e:
+            if e.status == 409:                     # lost the race on resourceVersion
+                return False
+            raise
+
+    def release(self, name: str, holder: str):
+        """Deletes the Lease (only the version we read), so none pile up per pod name."""
+        try:
+            lease = self.api.read_namespaced_lease(name, self.namespace)
+            if lease.spec.holder_identity != holder:
+                return
+            pre = client.V1Preconditions(resource_version=lease.metadata.resource_version)
+            self.api.delete_namespaced_lease(name, self.namespace,
+                                             body=client.V1DeleteOptions(preconditions=pre))
+        except client.ApiException as e:
+            if e.status not in (404, 409):
+                raise
+
+    def holders(self, prefix: str, now: float) -> Dict[str, str]:
+        leases = self.api.list_namespaced_lease(
+            self.namespace, label_selector=f"app.kubernetes.io/managed-by={LEASE_PREFIX}").items
+        return {l.metadata.name: l.spec.holder_identity for l in leases
+                if l.metadata.name.startswith(prefix) and not self._expired(l.spec, now)}
+
+
+def lease_backend(spec: str):
+    """``memory`` | ``file:<dir>`` | ``k8s`` → backend; "" → None (sharding off)."""
+    if not spec:
+        return None
+    if spec == "memory":
+        return MemoryLeases()
+    if spec.startswith("file:"):
+        return FileLeases(spec[len("file:"):])
+    if spec == "k8s":
+        return KubeLeases()
+    raise ValueError(f"unknown SHARD_LEASES {spec!r}")
+
+
+# ───────────────────────────────────────────────
+class ShardCoordinator:
+    """
+    Holds this replica's member and slot leases and the leases of the
+    shards rendezvous hashing gives it among the live members.  ``sync()``
+    does one renew / rebalance round; ``start()`` runs it every ``ttl / 3`` s.
+    """
+    def __init__(self, leases, identity: str = SHARD_IDENTITY, shards: int = SHARD_COUNT,
+                 ttl: float = LEASE_TTL, prefix: str = LEASE_PREFIX, exporter=None,
+                 slots: int = SHARD_SLOTS):
+        self.leases   = leases
+        self.identity = identity
+        self.n_shards = shards
+        self.ttl      = ttl
+        self.prefix   = prefix
+        self.exp      = exporter
+        self.ring     = HashRing(range(shards))
+        self.members: Tuple[str, ...] = ()
+        self.rebalances = 0
+        self.n_slots  = slots
+        self.slot: Optional[int] = None             # fixed once claimed
+        self._slot_held = False
+        self._owned: FrozenSet[int] = frozenset()
+        self._renewed = float("-inf")               # time of the last successful sync
+        self._shard_of: Dict[str, int] = {}
+        self._stop   = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def _member(self, identity: str) -> str:
+        return f"{self.prefix}-member-{identity}"
+
+    def _shard(self, s: int) -> str:
+        return f"{self.prefix}-shard-{s}"
+
+    def _slot(self, k: int) -> str:
+        return f"{self.prefix}-slot-{k}"
+
+    def _renew_slot(self, now: float):
+        if self.slot is None:
+            self.slot = next((k for k in range(self.n_slots)
+                              if self.leases.acquire(self._slot(k), self.identity, self.ttl, now)),
+                             None)
+            held = self.slot is not None
+            if not held:
+                log.warning("%s: all %d slots are taken", self.identity, self.n_slots)
+        else:
+            held = self.leases.acquire(self._slot(self.slot), self.identity, self.ttl, now)
+            if not held and self._slot_held:
+                log.warning("%s: slot %d was taken over", self.identity, self.slot)
+        self._slot_held = held
+
+    # ───────────── leases ──────────────────────────────────
+    def sync(self, now: Optional[float] = None) -> FrozenSet[int]:
+        """Renew, pick up / hand over shards for the current member set."""
+        now = time.time() if now is None else now
+        if not self.leases.acquire(self._member(self.identity), self.identity, self.ttl, now):
+            log.warning("member lease of %s is held by another replica", self.identity)
+        self._renew_slot(now)
+        members = tuple(sorted(set(self.leases.holders(self._member(""), now).values())))
+        want    = {s for s in range(self.n_shards) if assign(s, members) == self.identity}
+        for s in self._owned - want:                # handed over before anyone can take it
+            self.leases.release(self._shard(s), self.identity)
+        owned = frozenset(s for s in sorted(want)
+                          if self.leases.acquire(self._shard(s), self.identity, self.ttl, now))
+        if owned != self._owned or members != self.members:
+            if owned != self._owned:
+                self.rebalances += 1
+                if self.exp is not None:
+                    self.exp.shard_rebalances.inc()
+            log.info("%s: %d members, owns %d/%d shards",
+                     self.identity, len(members), len(owned), self.n_shards)
+        self._owned, self.members, self._renewed = owned, members, now
+        if self.exp is not None:
+            self.exp.shard_members.set(len(members))
+            self.exp.shards_owned.set(len(owned))
+        return owned
+
+    @property
+    def owned(self) -> FrozenSet[int]:
+        """Shards held now; none once the leases may have expired unrenewed."""
+        if time.time() - self._renewed >= self.ttl:
+            return frozenset()
+        return self._owned
+
+    @property
+    def holds_slot(self) -> bool:
+        """``slot`` is (still) this replica's, so its per-slot state may be written."""
+        return self._slot_held and time.time() - self._renewed < self.ttl
+
+    def _run(self):
+        while not self._stop.wait(self.ttl / 3):
+            try:
+                self.sync()
+            except Exception as e:                  # keep trying; owned lapses after ttl
+                log.warning("lease renewal failed: %s", e)
+
+    def start(self):
+        self.sync()
+        self._thread = threading.Thread(target=self._run, name="shard-leases", daemon=True)
+        self._thread.start()
+        return self
+
+    def close(self):
+        """Stop renewing and release every lease, so the shards move on at once."""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=self.ttl)
+        for s in self._owned:
+            self.leases.release(self._shard(s), self.identity)
+        self.leases.release(self._member(self.identity), self.identity)
+        if self.slot is not None:
+            self.leases.release(self._slot(self.slot), self.identity)
+        self._owned, self._slot_held = frozenset(), False
+
+    # ───────────── node → shard ────────────────────────────
+    def shard_of(self, node: str) -> int:
+        s = self._shard_of.get(node)
+        if s is None:
+            s = self._shard_of[node] = self.ring.shard(node)
+        return s
+
+    def owns(self, node: str) -> bool:
+        return self.shard_of(node) in self.owned
+
+    def mask(self, names: Sequence[str]) -> np.ndarray:
+        """Bool per name: is that node in one of this replica's shards."""
+        cache = self._shard_of
+        if len(cache) > 2 * len(names) + 1024:      # forget removed nodes
+            cache.clear()
+        new = [n for n in names if n not in cache]
+        if new:
+            cache.update(zip(new, self.ring.shards(new).tolist()))
+        shard = np.fromiter((cache[n] for n in names), dtype=np.int32, count=len(names))
+        owned = np.zeros(self.n_shards, dtype=bool)
+        owned[list(self.owned)] = True
+        return owned[shard]
+
+
+def coordinator_from_env(exporter=None) -> Optional[ShardCoordinator]:
+    """Started coordinator for SHARD_LEASES, or None with sharding off."""
+    leases = lease_backend(SHARD_LEASES)
+    return ShardCoordinator(leases, exporter=exporter).start() if leases is not None else None
@@ -0,0 +1,387 @@
+# SPDX-License-Identifier: Apache-2.0
+# optimiser/simulator.py
+#
+# Offline environments for training without Kubernetes or Prometheus.
+# – ClusterSimulator: nodes, pods, utilisation and power, vectorised
+# – TraceReplay: plays back recorded StateBuilder states
+#
+# Both speak the StateBuilder interface (async get_cluster_state) and the
+# CoreV1Api / PolicyV1Api subset the controller uses (patch_node,
+# create_namespaced_pod_eviction, list_pod_disruption_budget_for_all_namespaces),
+# so an OptimizationController can be built on top of them unchanged:
+#
+#     sim  = ClusterSimulator(n_nodes=20, n_pods=300)
+#     ctrl = OptimizationController(agent, sim, HierMem(), None,
+#                                   core_v1=sim, verbose=False)
+#     await ctrl.run_loop_async(0, 0, cycles=10_000)
+#
+# train() skips the controller and steps many simulators with one batched
+# policy call per tick.
+
+import json, time, asyncio, threading
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Union
+
+import numpy as np
+from kubernetes import client
+
+from optimiser.cluster_snapshot import ClusterSnapshot, snapshot_of
+from optimiser.state_engine import RollingFeatures
+from optimiser.energy_optimization_controller import (
+    ACTION_CONSOLIDATE, ACTION_DEFRAGMENT, ACTION_DO_NOTHING, ACTION_HARDWARE_TUNE)
+
+TUNE_LABEL = "optimiser/tune"
+
+
+# ───────────────────────────────────────────────
+class ClusterSimulator:
+    """
+    Synthetic cluster.  Pod CPU demand follows a mean-reverting random walk;
+    the scheduler places pods on the least (default, like kube-scheduler)
+    or most allocated node whose free *requests* fit.  Node power is
+    ``idle + (peak − idle) · util^0.9``; an empty node drops to ``off_w``
+    (scaled down by the autoscaler) and a tuned node trades 15 % dynamic
+    power for 10 % higher utilisation.  Every ``get_cluster_state`` call
+    advances the clock by one tick.
+
+    Pods carry an ``app`` label (``app-0`` … ``app-{n_apps-1}``).  ``pdbs``
+    is a list of ``{"namespace", "match_labels", "max_unavailable"}``; an
+    evicted pod counts as unavailable for ``pdb_recovery`` ticks and an
+    eviction that would exceed a budget fails with 429, as on a real
+    API server.
+
+    ``observe`` also fills the rolling state features (power trend, util
+    variance, pod churn, idle-power fraction) as StateBuilder does,
+    including its ``commit`` flag; the idle share of a node's power is
+    ``idle_w`` (``off_w`` when empty).
+    """
+    def __init__(self,
+                 n_nodes: int = 10,
+                 n_pods: int = 100,
+                 node_cpu: float = 16.0,              # cores
+                 node_mem: float = 64 * 2**30,        # bytes
+                 idle_w: float = 60.0,
+                 peak_w: float = 250.0,
+                 off_w: float = 5.0,
+                 scheduler: str = "least",
+                 volatility: float = 0.05,
+                 seed: Optional[int] = None,
+                 n_apps: int = 25,
+                 pdbs: Optional[List[Dict[str, Any]]] = None,
+                 pdb_recovery: int = 3):
+        self.rng       = np.random.default_rng(seed)
+        self.idle_w, self.peak_w, self.off_w = idle_w, peak_w, off_w
+        self.scheduler = scheduler
+        self.vol       = volatility
+        self.tick      = 0
+
+        self.node_names = [f"sim-node-{i}" for i in range(n_nodes)]
+        self.node_index = {n: i for i, n in enumerate(self.node_names)}
+        self.alloc_cpu  = np.full(n_nodes, node_cpu)
+        self.alloc_mem  = np.full(n_nodes, node_mem)
+        self.tuned      = np.zeros(n_nodes, dtype=bool)
+
+        self.pod_uids   = [f"sim-uid-{j}" for j in range(n_pods)]
+        self.pod_names  = [f"sim-pod-{j}" for j in range(n_pods)]
+        self.pod_ns     = [("kube-system" if j % 20 == 0 else f"ns-{j % 7}")
+                           for j in range(n_pods)]
+        self.pod_index  = {(ns, n): j for j, (ns, n) in enumerate(zip(self.pod_ns, self.pod_names))}
+        self.kube_sys   = np.array([ns == "kube-system" for ns in self.pod_ns])
+        self.pod_labels = [{"app": f"app-{j % n_apps}"} for j in range(n_pods)]
+        self.pdbs       = list(pdbs or ())
+        self.pdb_recovery = pdb_recovery
+        self.evicted_at = np.full(n_pods, -10**9, dtype=np.int64)
+        # mean demand in millicores, request slightly above the mean
+        self.pod_mean   = self.rng.lognormal(np.log(400), 0.8, n_pods).clip(20, 4000)
+        self.pod_req    = self.pod_mean * 1.2
+        self.pod_mem    = self.rng.lognormal(np.log(512 * 2**20), 0.7, n_pods)
+        self.pod_cpu    = self.pod_mean.copy()
+        self.pod_node   = np.full(n_pods, -1, dtype=np.int32)
+        for j in self.rng.permutation(n_pods):
+            self.pod_node[j] = self._schedule(j)
+
+        self.evictions = 0
+        self.churn     = 0                       # placements / evictions since the last commit
+        self._pending: Optional[tuple] = None    # last observe's reading, uncommitted
+        self.rolling   = RollingFeatures()
+        self._lock     = threading.RLock()       # API calls arrive from K8sExecutor threads
+
+    # ───────────── workload / scheduling ────────────────────
+    def _used(self, col: np.ndarray) -> np.ndarray:
+        placed = self.pod_node >= 0
+        return np.bincount(self.pod_node[placed], weights=col[placed],
+                           minlength=len(self.node_names))
+
+    def _schedule(self, j: int, exclude: int = -1) -> int:
+        free_cpu = self.alloc_cpu * 1000 - self._used(self.pod_req)
+        free_mem = self.alloc_mem - self._used(self.pod_mem)
+        fits = (free_cpu >= self.pod_req[j]) & (free_mem >= self.pod_mem[j])
+        if exclude >= 0:
+            fits[exclude] = False
+        if not fits.any():
+            return -1                               # stays Pending
+        score = free_cpu / (self.alloc_cpu * 1000)
+        score = np.where(fits, score if self.scheduler == "least" else -score, -np.inf)
+        return int(score.argmax())
+
+    def advance(self):
+        self.tick += 1
+        noise = self.rng.standard_normal(len(self.pod_cpu))
+        self.pod_cpu += 0.2 * (self.pod_mean - self.pod_cpu) + self.vol * self.pod_mean * noise
+        np.clip(self.pod_cpu, 1.0, None, out=self.pod_cpu)
+        pending = np.flatnonzero(self.pod_node < 0)
+        for j in pending:
+            self.pod_node[j] = self._schedule(j)
+        self.churn += int((self.pod_node[pending] >= 0).sum())
+
+    # ───────────── observation ──────────────────────────────
+    def _empty(self) -> np.ndarray:
+        return np.bincount(self.pod_node[self.pod_node >= 0],
+                           minlength=len(self.node_names)) == 0
+
+    def _node_metrics(self):
+        cap   = self.alloc_cpu * 1000
+        util  = np.clip(self._used(self.pod_cpu) / cap, 0.0, 1.0)
+        util  = np.where(self.tuned, np.minimum(util / 0.9, 1.0), util)
+        dyn   = (self.peak_w - self.idle_w) * util ** 0.9 * np.where(self.tuned, 0.85, 1.0)
+        power = np.where(self._empty(), self.off_w, self.idle_w + dyn)
+        mem   = self._used(self.pod_mem) / self.alloc_mem
+        return util, mem, power
+
+    def snapshot(self) -> ClusterSnapshot:
+        util, mem, power = self._node_metrics()
+        kube_sys = self.pod_cpu[self.kube_sys].sum()
+        return ClusterSnapshot(
+            self.node_names, self.alloc_cpu, self.alloc_mem, util, mem, power,
+            self.pod_uids, self.pod_names, self.pod_ns,
+            self.pod_node.copy(), self.pod_cpu.copy(),
+            kube_sys_cpu=kube_sys / 1000, ts=float(self.tick),
+            pod_labels=self.pod_labels, pod_req_cpu=self.pod_req, pod_req_mem=self.pod_mem)
+
+    def observe(self, commit: bool = True) -> Dict[str, Any]:
+        """Synchronous ``get_cluster_state`` (advances one tick)."""
+        with self._lock:
+            self.advance()
+            snap = self.snapshot()
+            idle = np.where(self._empty(), self.off_w, self.idle_w).sum()
+            self._pending = (snap.cpu_util, snap.total_power(), idle, snap.n_pods)
+            snap.rolling = self._commit() if commit else \
+                           self.rolling.features(snap.n_nodes, snap.n_pods)
+        return {
+            "ts": snap.ts,
+            "nodes": snap.nodes_view(),
+            "pods": snap.pods_view(),
+            "snapshot": snap,
+            "cluster_wide": {"kube_system_cpu_overhead": snap.kube_sys_cpu,
+                             **snap.rolling_dict()},
+        }
+
+    async def get_cluster_state(self, commit: bool = True) -> Dict[str, Any]:
+        return self.observe(commit)
+
+    def _commit(self) -> Optional[np.ndarray]:
+        if self._pending is None:
+            return None
+        util, power, idle, n_pods = self._pending
+        self._pending = None
+        out = self.rolling.push(util, power, self.churn, idle, n_pods)
+        self.churn = 0
+        return out
+
+    def commit(self, state: Dict[str, Any]) -> Dict[str, Any]:
+        """``StateBuilder.commit``: the last uncommitted reading becomes a cycle."""
+        with self._lock:
+            rolling = self._commit()
+        if rolling is not None:
+            snap = snapshot_of(state)
+            snap.rolling = rolling
+            state["cluster_wide"].update(snap.rolling_dict())
+        return state
+
+    def total_power(self) -> float:
+        return float(self._node_metrics()[2].sum())
+
+    # ───────────── actuation ────────────────────────────────
+    def evict_pod(self, name: str, namespace: str) -> bool:
+        j = self.pod_index.get((namespace, name))
+        if j is None or namespace == "kube-system":
+            return False
+        if self._blocking_pdb(j) is not None:
+            return False
+        src = int(self.pod_node[j])
+        self.evicted_at[j] = self.tick
+        self.pod_node[j] = -1
+        self.pod_node[j] = self._schedule(j, exclude=src)
+        self.evictions += 1
+        self.churn     += 1
+        return True
+
+    def tune_node(self, name: str, on: bool = True):
+        self.tuned[self.node_index[name]] = on
+
+    def apply(self, fam: int, node_idx: int):
+        """The controller's action semantics, without the API round-trip."""
+        if fam == ACTION_DO_NOTHING or not len(self.node_names):
+            return
+        node_idx %= len(self.node_names)
+        if fam == ACTION_HARDWARE_TUNE:
+            self.tuned[node_idx] = True
+        elif fam in (ACTION_CONSOLIDATE, ACTION_DEFRAGMENT):
+            pods = np.flatnonzero(self.pod_node == node_idx)
+            if len(pods):
+                cpu = self.pod_cpu[pods]
+                j = pods[cpu.argmax() if fam == ACTION_CONSOLIDATE else cpu.argmin()]
+                self.evict_pod(self.pod_names[j], self.pod_ns[j])
+
+    # ───────────── disruption budgets ───────────────────────
+    def _pdb_pods(self, pdb: Dict[str, Any]) -> np.ndarray:
+        sel = pdb.get("match_labels", {})
+        return np.array([ns == pdb["namespace"] and
+                         all(lab.get(k) == v for k, v in sel.items())
+                         for ns, lab in zip(self.pod_ns, self.pod_labels)], dtype=bool)
+
+    def _disruptions_allowed(self, pdb: Dict[str, Any]) -> int:
+        pods = self._pdb_pods(pdb)
+        down = (self.tick - self.evicted_at < self.pdb_recovery) | (self.pod_node < 0)
+        return max(0, int(pdb["max_unavailable"]) - int((pods & down).sum()))
+
+    def _blocking_pdb(self, j: int) -> Optional[Dict[str, Any]]:
+        for pdb in self.pdbs:
+            if self._pdb_pods(pdb)[j] and self._disruptions_allowed(pdb) <= 0:
+                return pdb
+        return None
+
+    # CoreV1Api / PolicyV1Api subset used by OptimizationController / SoftwareActuator
+    def create_namespaced_pod_eviction(self, name: str, namespace: str, body=None):
+        with self._lock:
+            j = self.pod_index.get((namespace, name))
+            if j is not None and self._blocking_pdb(j) is not None:
+                raise client.ApiException(status=429, reason="Too Many Requests")
+            self.evict_pod(name, namespace)
+
+    def list_pod_disruption_budget_for_all_namespaces(self, **kw):
+        with self._lock:
+            allowed = [self._disruptions_allowed(pdb) for pdb in self.pdbs]
+        return client.V1PodDisruptionBudgetList(items=[
+            client.V1PodDisruptionBudget(
+                metadata=client.V1ObjectMeta(name=f"pdb-{i}", namespace=pdb["namespace"]),
+                spec=client.V1PodDisruptionBudgetSpec(
+                    selector=client.V1LabelSelector(match_labels=pdb.get("match_labels", {}))),
+                status=client.V1PodDisruptionBudgetStatus(
+                    current_healthy=0, desired_healthy=0, expected_pods=0,
+                    disruptions_allowed=allowed[i]))
+            for i, pdb in enumerate(self.pdbs)])
+
+    def patch_node(self, name: str, body: Dict[str, Any]):
+        labels = (body.get("metadata") or {}).get("labels") or {}
+        if TUNE_LABEL in labels:
+            self.tune_node(name, labels[TUNE_LABEL] is not None)
+
+
+# ───────────────────────────────────────────────
+class TraceReplay:
+    """
+    Replays recorded states (``record_trace`` JSONL, or a list of state
+    dicts).  Actions are accepted and logged but do not alter the trace –
+    it is an open-loop environment for pretraining and evaluation.
+    """
+    def __init__(self, trace: Union[str, Path, Sequence[Dict[str, Any]]], loop: bool = True):
+        self.states  = load_trace(trace) if isinstance(trace, (str, Path)) else list(trace)
+        if not self.states:
+            raise ValueError("empty trace")
+        self.loop    = loop
+        self.pos     = 0
+        self.actions: List[tuple] = []
+
+    def observe(self) -> Dict[str, Any]:
+        if self.pos >= len(self.states):
+            if not self.loop:
+                raise StopIteration("trace exhausted")
+            self.pos = 0
+        st = dict(self.states[self.pos])
+        self.pos += 1
+        st.setdefault("snapshot", ClusterSnapshot.from_state(st))
+        return st
+
+    async def get_cluster_state(self, commit: bool = True) -> Dict[str, Any]:
+        return self.observe()
+
+    def commit(self, state: Dict[str, Any]) -> Dict[str, Any]:
+        return state                                # recorded features are replayed as-is
+
+    def total_power(self) -> float:
+        return snapshot_of(self.states[max(self.pos - 1, 0)]).total_power()
+
+    def apply(self, fam: int, node_idx: int):
+        self.actions.append(("apply", fam, node_idx))
+
+    def create_namespaced_pod_eviction(self, name: str, namespace: str, body=None):
+        self.actions.append(("evict", namespace, name))
+
+    def patch_node(self, name: str, body: Dict[str, Any]):
+        self.actions.append(("patch_node", name, body))
+
+
+# ───────────── trace I/O ───────────────────────────────────
+def state_to_dict(state: Dict[str, Any]) -> Dict[str, Any]:
+    """Plain-JSON form of a StateBuilder state (views materialised, snapshot dropped)."""
+    return {
+        "ts":    state.get("ts"),
+        "nodes": {k: dict(v) for k, v in state["nodes"].items()},
+        "pods":  {k: dict(v) for k, v in state["pods"].items()},
+        "cluster_wide": {k: v for k, v in state.get("cluster_wide", {}).items()
+                         if isinstance(v, (int, float))},
+    }
+
+
+def load_trace(path: Union[str, Path]) -> List[Dict[str, Any]]:
+    with open(path) as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+async def record_trace(collector, path: Union[str, Path], samples: int,
+                       interval: float = 30.0):
+    """Append ``samples`` live states from a StateBuilder to a JSONL trace."""
+    with open(path, "a") as f:
+        for i in range(samples):
+            f.write(json.dumps(state_to_dict(await collector.get_cluster_state())) + "\n")
+            f.flush()
+            if i + 1 < samples:
+                await asyncio.sleep(interval)
+
+
+# ───────────── fast training loop ──────────────────────────
+def train(agent, envs: Iterable, steps: int, memory=None,
+          update_timestep: int = 400) -> Dict[str, float]:
+    """
+    Steps every env once per tick with one ``select_batch`` call, so a
+    tick costs one forward pass per policy level regardless of env count.
+    Reward is −total power after the action (same sign as the controller).
+    ``update_timestep`` counts transitions, not ticks; before each update
+    the interleaved rows are regrouped into one trajectory per env.
+    """
+    from optimiser.decision_engine import HierMem
+
+    envs   = list(envs)
+    memory = memory if memory is not None else HierMem()
+    t0, updates, since, rewards = time.perf_counter(), 0, 0, []
+    for _ in range(steps):
+        states = [env.observe() for env in envs]
+        snaps  = [snapshot_of(s) for s in states]
+        vecs   = np.stack([s.features() for s in snaps])
+        fams, tgts = agent.select_batch(vecs, memory, snaps=snaps)
+        r = np.empty(len(envs), dtype=np.float32)
+        for k, env in enumerate(envs):
+            env.apply(int(fams[k]), int(tgts[k]))
+            r[k] = -env.total_power()
+        memory.add_rewards(r)
+        rewards.append(float(r.mean()))
+        since += len(envs)
+        if since >= update_timestep:
+            memory.regroup(len(envs))
+            agent.update(memory)
+            updates, since = updates + 1, 0
+    dt = time.perf_counter() - t0
+    return {"transitions": steps * len(envs), "seconds": dt,
+            "steps_per_s": steps * len(envs) / dt, "updates": updates,
+            "mean_reward": float(np.mean(rewards)) if rewards else 0.0}
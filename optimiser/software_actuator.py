@@ -5,22 +5,29 @@ Runs in the same container as the controller (no extra privileges).
 """
 from kubernetes import client
 import logging, math
+from typing import Dict, List, Optional, Tuple
 
 class SoftwareActuator:
-    def __init__(self, core_v1: client.CoreV1Api):
+    def __init__(self, core_v1: client.CoreV1Api, exporter=None):
         self.v1 = core_v1
+        self.exp = exporter
         self.log = logging.getLogger("software-actuator")
 
     # ─────────────────────────────────────────────────────────
-    def evict_pod(self, name: str, namespace: str):
+    def evict_pod(self, name: str, namespace: str) -> bool:
+        """True if the API server accepted the eviction (429 = blocked by a PDB)."""
         if namespace == "kube-system":
-            self.log.info("Skip eviction of kube-system pod %s", name); return
+            self.log.info("Skip eviction of kube-system pod %s", name); return False
         body = client.V1Eviction(metadata=client.V1ObjectMeta(name=name, namespace=namespace))
         try:
             self.v1.create_namespaced_pod_eviction(name, namespace, body)
             self.log.info("Evicted pod %s/%s", namespace, name)
+            return True
         except client.ApiException as e:
             self.log.warning("Evict failed %s/%s → %s", namespace, name, e.reason)
+            if self.exp is not None:
+                self.exp.api_error("evict_pod", e)
+            return False
 
     # ─────────────────────────────────────────────────────────
     def right_size_requests(self, pod, new_cpu_millicores: int):
@@ -65,3 +72,55 @@ class SoftwareActuator:
         patch = {"metadata": {"labels": {"optimiser/scale": direction}}}
         self.v1.patch_node(node.metadata.name, patch)
         self.log.info("Requested '%s' for node %s", direction, node.metadata.name)
+
+
+# ─────────────────────────────────────────────────────────
+def selector_matches(selector, labels: Dict[str, str]) -> bool:
+    """``V1LabelSelector`` semantics (policy/v1: null selects none, {} selects all)."""
+    if selector is None:
+        return False
+    for k, v in (selector.match_labels or {}).items():
+        if labels.get(k) != v:
+            return False
+    for e in selector.match_expressions or ():
+        has = e.key in labels
+        if e.operator == "In" and not (has and labels[e.key] in e.values):
+            return False
+        if e.operator == "NotIn" and has and labels[e.key] in e.values:
+            return False
+        if e.operator == "Exists" and not has:
+            return False
+        if e.operator == "DoesNotExist" and has:
+            return False
+    return True
+
+
+class DisruptionBudgets:
+    """
+    Client-side view of the PodDisruptionBudgets for one batch of evictions.
+    ``take`` reserves one disruption from every budget covering the pod, so
+    concurrent evictions planned in the same cycle cannot overdraw a PDB
+    (the API server would reject the surplus with 429 anyway).
+    """
+    def __init__(self, pdbs: List):
+        self._by_ns: Dict[str, List[Tuple[int, object]]] = {}
+        self.allowed: List[int] = []
+        for i, pdb in enumerate(pdbs):
+            self._by_ns.setdefault(pdb.metadata.namespace, []).append((i, pdb.spec.selector))
+            self.allowed.append(int((pdb.status and pdb.status.disruptions_allowed) or 0))
+
+    @classmethod
+    def from_api(cls, policy_v1) -> "DisruptionBudgets":
+        return cls(policy_v1.list_pod_disruption_budget_for_all_namespaces().items)
+
+    def covering(self, namespace: str, labels: Optional[Dict[str, str]]) -> List[int]:
+        return [i for i, sel in self._by_ns.get(namespace, ())
+                if selector_matches(sel, labels or {})]
+
+    def take(self, namespace: str, labels: Optional[Dict[str, str]]) -> bool:
+        idx = self.covering(namespace, labels)
+        if any(self.allowed[i] <= 0 for i in idx):
+            return False
+        for i in idx:
+            self.allowed[i] -= 1
+        return True
@@ -2,88 +2,170 @@
 Turns the huge Prometheus metric space + Kubernetes API objects
 into a **compact numeric state vector** that the RL agent consumes,
 while also returning the full rich dict so the controller can print
-friendly status messages.
+friendly status messages.  The dict's "nodes"/"pods" are views over a
+columnar ClusterSnapshot (state["snapshot"]) built once per cycle from a
+StateEngine, which keeps node / pod rows between cycles and applies only
+what changed (informer journal, or a diff against the previous LIST).
 """
-import os, time, asyncio, aiohttp
-from typing import Dict, Any
+import os, time, asyncio
+from typing import Dict, Any, Optional, Tuple
 from kubernetes import client, config
 
+from optimiser.informer import Informer, name_key
+from optimiser.k8s_io   import K8sExecutor
+from optimiser.prom_client import PromQueryEngine
+from optimiser.prom_ingest import total
+from optimiser.cluster_snapshot import snapshot_of
+from optimiser.state_engine import StateEngine
+
 PROM_URL = os.getenv("PROM_URL", "http://prometheus-k8s.monitoring:9090")
+# list+watch caches instead of a full LIST of nodes and pods every cycle
+USE_INFORMERS = os.getenv("K8S_INFORMERS", "1") == "1"
 
 PROM_QUERIES = {
     # adjust / extend freely – every metric you listed is available
     "node_cpu_watts": 'kepler_node_cpu_watts',
+    "node_idle_watts": 'kepler_node_cpu_idle_watts',
     "node_cpu_util":  'instance:node_cpu_utilisation:ratio5m',
     "node_mem_util":  'instance:node_memory_utilisation:ratio',
-    "pod_cpu_usage":  'sum by(pod) (rate(container_cpu_usage_seconds_total{image!=""}[5m]))',
+    "pod_cpu_usage":  'sum by(namespace, pod) (rate(container_cpu_usage_seconds_total{image!=""}[5m]))',
     "kube_sys_cpu":   'sum(rate(container_cpu_usage_seconds_total{namespace="kube-system"}[5m]))',
 }
 
+# ───────────── compact rows kept per object ─────────────────
+def _cpu_cores(q: str) -> float:
+    return float(q[:-1]) / 1000 if q.endswith("m") else float(q)
+
+_MEM_UNITS = (("Ki", 2**10), ("Mi", 2**20), ("Gi", 2**30), ("Ti", 2**40),
+              ("k", 10**3), ("M", 10**6), ("G", 10**9), ("T", 10**12))
+
+def _mem_bytes(q: str) -> int:
+    for suffix, mult in _MEM_UNITS:
+        if q.endswith(suffix):
+            return int(float(q[:-len(suffix)]) * mult)
+    return int(float(q))
+
+def _requests(p) -> Tuple[float, int]:
+    """Summed container requests: (cpu cores, memory bytes)."""
+    cpu, mem = 0.0, 0
+    for c in p.spec.containers or ():
+        req = (c.resources and c.resources.requests) or {}
+        if "cpu" in req:
+            cpu += _cpu_cores(req["cpu"])
+        if "memory" in req:
+            mem += _mem_bytes(req["memory"])
+    return cpu, mem
+
+def node_row(n) -> Dict[str, Any]:
+    alloc = n.status.allocatable
+    return {
+        "name":      n.metadata.name,
+        "alloc_cpu": _cpu_cores(alloc['cpu']),
+        "alloc_mem": _mem_bytes(alloc['memory']),
+        "ip":        next((a.address for a in n.status.addresses or ()
+                           if a.type == "InternalIP"), None),
+    }
+
+def pod_row(p) -> Dict[str, Any]:
+    cpu, mem = _requests(p)
+    return {
+        "uid":       p.metadata.uid,
+        "name":      p.metadata.name,
+        "namespace": p.metadata.namespace,
+        "node":      p.spec.node_name,
+        "labels":    p.metadata.labels or {},
+        "req_cpu":   cpu,
+        "req_mem":   mem,
+        "daemon":    any(o.kind == "DaemonSet" for o in p.metadata.owner_references or ()),
+    }
+
 class StateBuilder:
-    def __init__(self):
-        config.load_incluster_config()
-        self.v1 = client.CoreV1Api()
+    def __init__(self, use_informers: bool = USE_INFORMERS, io: K8sExecutor = None,
+                 prom: PromQueryEngine = None, exporter=None, core_v1=None):
+        if core_v1 is None:
+            config.load_incluster_config()
+        self.v1   = core_v1 if core_v1 is not None else client.CoreV1Api()
+        self.exp  = exporter
+        self.io   = io or K8sExecutor(exporter=exporter)
+        self.prom = prom or PromQueryEngine(PROM_URL, exporter=exporter)
+        self.engine = StateEngine()
+        self.node_informer = self.pod_informer = None
+        if use_informers:
+            self.node_informer = Informer(self.v1.list_node, key_fn=name_key,
+                                          transform=node_row, name="nodes",
+                                          exporter=exporter, journal=True).start()
+            self.pod_informer  = Informer(self.v1.list_pod_for_all_namespaces,
+                                          transform=pod_row, name="pods",
+                                          exporter=exporter, journal=True).start()
 
     # ─────────────────────────────────────────────────────────
-    async def _prom(self, session: aiohttp.ClientSession, q: str):
-        async with session.get(f"{PROM_URL}/api/v1/query",
-                               params={"query": q, "time": time.time()}) as r:
-            js = await r.json()
-            return {tuple(m['metric'].values()): float(m['value'][1])
-                    for m in js['data']['result']}
+    # Full rows from a LIST, or None when an informer feeds the engine.
+    async def _nodes(self) -> Optional[Dict[str, Dict[str, Any]]]:
+        if self.node_informer is not None:
+            return None
+        resp = await self.io.call("list_node", self.v1.list_node)
+        return {n.metadata.name: node_row(n) for n in resp.items}
+
+    async def _pods(self) -> Optional[Dict[str, Dict[str, Any]]]:
+        if self.pod_informer is not None:
+            return None
+        resp = await self.io.call("list_pod_for_all_namespaces",
+                                  self.v1.list_pod_for_all_namespaces)
+        return {p.metadata.uid: pod_row(p) for p in resp.items}
+
+    def _ingest(self, kind: str, informer: Optional[Informer],
+                rows: Optional[Dict[str, Dict[str, Any]]]):
+        if rows is None:
+            rows = informer.changes()
+            if rows is not None:
+                return self.engine.apply(kind, rows)
+            rows = informer.store()
+        self.engine.sync(kind, rows)
 
     # ─────────────────────────────────────────────────────────
-    async def get_cluster_state(self) -> Dict[str, Any]:
-        async with aiohttp.ClientSession() as s:
-            res = await asyncio.gather(*[self._prom(s, q) for q in PROM_QUERIES.values()])
-        prom = dict(zip(PROM_QUERIES.keys(), res))
-
-        nodes = {}
-        for n in self.v1.list_node().items:
-            name = n.metadata.name
-            alloc = n.status.allocatable
-            nodes[name] = {
-                "alloc_cpu": float(alloc['cpu'].rstrip('m')) / 1000,
-                "alloc_mem": int(alloc['memory'].rstrip('Ki')) * 1024,
-                "cpu_util":  prom["node_cpu_util"].get((name,), 0),
-                "mem_util":  prom["node_mem_util"].get((name,), 0),
-                "cpu_power_watts": prom["node_cpu_watts"].get((name,), 0),
-            }
+    async def _prom(self) -> Dict[str, list]:
+        # raw results; StateEngine resolves their labels to snapshot rows
+        return await self.prom.query_many(PROM_QUERIES)
 
-        pods = {}
-        for p in self.v1.list_pod_for_all_namespaces().items:
-            pods[p.metadata.uid] = {
-                "name":      p.metadata.name,
-                "namespace": p.metadata.namespace,
-                "node":      p.spec.node_name,
-                "cpu_millicores": prom["pod_cpu_usage"].get((p.metadata.name,), 0)*1000
-            }
+    # ─────────────────────────────────────────────────────────
+    async def get_cluster_state(self, commit: bool = True) -> Dict[str, Any]:
+        """
+        ``commit`` makes this reading a cycle of the rolling features; pass
+        False for intermediate reads and ``commit`` the state if it is
+        used as an observation after all.
+        """
+        prom, node_rows, pod_rows = await asyncio.gather(
+            self._prom(), self._nodes(), self._pods())
 
+        t0 = time.perf_counter()
+        self._ingest("nodes", self.node_informer, node_rows)
+        self._ingest("pods", self.pod_informer, pod_rows)
+        kube_sys = total(prom["kube_sys_cpu"])
+        snap = self.engine.snapshot(prom, kube_sys_cpu=kube_sys, ts=time.time(), commit=commit)
+        if self.exp is not None:
+            self.exp.state_build_seconds.observe(time.perf_counter() - t0)
+            for name, n in self.engine.unmatched.items():
+                self.exp.prom_unmatched.labels(query=name).set(n)
         return {
-            "ts": time.time(),
-            "nodes": nodes,
-            "pods": pods,
+            "ts": snap.ts,
+            "nodes": snap.nodes_view(),
+            "pods": snap.pods_view(),
+            "snapshot": snap,
             "cluster_wide": {
-                "kube_system_cpu_overhead": prom["kube_sys_cpu"]
+                "kube_system_cpu_overhead": kube_sys,
+                **snap.rolling_dict(),
             }
         }
 
+    def commit(self, state: Dict[str, Any]) -> Dict[str, Any]:
+        """Push an uncommitted last reading into the rolling windows; ``state`` updated in place."""
+        rolling = self.engine.commit()
+        if rolling is not None:
+            snap = snapshot_of(state)
+            snap.rolling = rolling
+            state["cluster_wide"].update(snap.rolling_dict())
+        return state
+
     # ─────────────────────────────────────────────────────────
     def to_vector(self, state: Dict[str, Any]):
-        nodes = list(state['nodes'].values())
-        if not nodes:                       # empty cluster?
-            return [0]*12
-        cpu_utils  = [n['cpu_util'] for n in nodes]
-        power      = [n['cpu_power_watts'] for n in nodes]
-        return [
-            len(nodes),                        # 0
-            len(state['pods']),                # 1
-            sum(power)/len(power),             # 2 mean W
-            max(power),                        # 3 max  W
-            max(cpu_utils),                    # 4 max  CPU util
-            sum(cpu_utils)/len(cpu_utils),     # 5 mean CPU util
-            max(state['cluster_wide'].get('kube_system_cpu_overhead',0), 1e-6),
-                                               # 6 kube-system CPU
-            # placeholders for future metrics
-            0, 0, 0, 0, 0                      # 7-11
-        ]
+        return snapshot_of(state).features()
@@ -0,0 +1,401 @@
+# SPDX-License-Identifier: Apache-2.0
+# optimiser/state_engine.py
+#
+# Incremental cluster state kept between cycles.
+# – node / pod rows live in dense columnar tables; an informer's change
+#   journal (or a diff against the previous LIST) is applied as upserts
+#   and swap-removes, so a quiet cycle does O(changes) Python work
+# – per-node pod count and requested cpu / memory are updated with each
+#   pod delta instead of being re-aggregated
+# – name / InternalIP / namespace+pod indexes are maintained alongside, so
+#   Prometheus results are scattered straight into arrays (prom_ingest)
+# – RollingFeatures: ring buffers of the last STATE_WINDOW cycles of
+#   per-node utilisation and cluster power / churn / idle power; running
+#   sums make every statistic O(1) per node per cycle.  They fill state
+#   vector slots 7-10 (cluster_snapshot.ROLLING_FEATURES):
+#       7  power_trend          least-squares slope of total power / mean
+#       8  util_variance        mean over nodes of windowed util variance
+#       9  pod_churn_rate       pods added / removed / moved per cycle / pods
+#      10  idle_power_fraction  Σ kepler_node_cpu_idle_watts / Σ node watts
+# – a cycle is one committed snapshot: intermediate reads (the controller's
+#   settle polls) use snapshot(commit=False), and commit() pushes such a
+#   reading later if it becomes the observation after all
+#
+#     engine = StateEngine()
+#     engine.sync("nodes", rows_by_name)        # or engine.apply("pods", informer.changes())
+#     snap = engine.snapshot(results, kube_sys_cpu, ts=time.time())   # raw query results
+
+import os
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+import numpy as np
+
+from optimiser.cluster_snapshot import ClusterSnapshot, ROLLING_FEATURES
+from optimiser.prom_ingest import PromIngest
+
+STATE_WINDOW = int(os.getenv("STATE_WINDOW", 20))       # cycles in the rolling windows
+RESUM_EVERY  = 64                                       # ring wraps between exact re-sums
+
+
+# ───────────────────────────────────────────────
+class _Table:
+    """Rows in dense slots 0..n-1; removing a row moves the last one into its slot."""
+    def __init__(self, num: Dict[str, type], obj: Tuple[str, ...], capacity: int = 256):
+        self.index: Dict[str, int] = {}
+        self.keys:  List[str] = []
+        self.num = {c: np.zeros(capacity, dtype=t) for c, t in num.items()}
+        self.obj: Dict[str, list] = {c: [] for c in obj}
+
+    def __len__(self):
+        return len(self.keys)
+
+    def col(self, c: str) -> np.ndarray:
+        return self.num[c][:len(self.keys)]
+
+    def upsert(self, key: str, vals: Dict[str, Any]) -> Tuple[int, bool]:
+        """Writes the columns present in ``vals``; returns (slot, inserted)."""
+        i = self.index.get(key)
+        new = i is None
+        if new:
+            i = len(self.keys)
+            for c, a in self.num.items():
+                if i >= len(a):
+                    a = self.num[c] = np.concatenate([a, np.zeros_like(a)])
+                a[i] = 0
+            for l in self.obj.values():
+                l.append(None)
+            self.index[key] = i
+            self.keys.append(key)
+        for c, v in vals.items():
+            if c in self.num:
+                self.num[c][i] = v
+            else:
+                self.obj[c][i] = v
+        return i, new
+
+    def remove(self, key: str) -> Optional[Tuple[int, int]]:
+        """Drops ``key``; returns (its slot, old slot of the row moved there)."""
+        i = self.index.pop(key, None)
+        if i is None:
+            return None
+        last = len(self.keys) - 1
+        moved = self.keys.pop()
+        if i != last:
+            self.keys[i] = moved
+            self.index[moved] = i
+            for a in self.num.values():
+                a[i] = a[last]
+        for l in self.obj.values():
+            if i != last:
+                l[i] = l[last]
+            l.pop()
+        return i, last
+
+
+# ───────────────────────────────────────────────
+class RollingFeatures:
+    """
+    Windowed statistics over the last ``window`` cycles.  Per-node columns
+    are addressed by slot; callers that reorder nodes report it through
+    ``move`` / ``reset`` so a column's history follows its node.
+    """
+    def __init__(self, window: int = STATE_WINDOW, capacity: int = 64):
+        self.w      = max(int(window), 2)
+        self.util   = np.zeros((self.w, capacity))         # ring, one row per cycle
+        self.u_sum  = np.zeros(capacity)
+        self.u_sq   = np.zeros(capacity)
+        self.u_n    = np.zeros(capacity, dtype=np.int64)   # cycles seen per node (≤ w)
+        self.power  = np.zeros(self.w)
+        self.churn  = np.zeros(self.w)
+        self.idle   = np.zeros(self.w)
+        self.p_s1 = self.p_st = self.c_sum = self.i_sum = 0.0
+        self.head = 0
+        self.n    = 0                                      # cycles in the window (≤ w)
+        self.t    = 0
+
+    def _fit(self, n: int):
+        cap = self.util.shape[1]
+        if n <= cap:
+            return
+        grow = max(n, 2 * cap) - cap
+        self.util  = np.pad(self.util, ((0, 0), (0, grow)))
+        self.u_sum = np.pad(self.u_sum, (0, grow))
+        self.u_sq  = np.pad(self.u_sq, (0, grow))
+        self.u_n   = np.pad(self.u_n, (0, grow))
+
+    def reset(self, i: int):
+        """Forget node slot ``i`` (a new node starts without history)."""
+        if i < self.util.shape[1]:
+            self.util[:, i] = 0.0
+            self.u_sum[i] = self.u_sq[i] = 0.0
+            self.u_n[i] = 0
+
+    def move(self, src: int, dst: int):
+        self._fit(max(src, dst) + 1)
+        self.util[:, dst] = self.util[:, src]
+        self.u_sum[dst], self.u_sq[dst], self.u_n[dst] = self.u_sum[src], self.u_sq[src], self.u_n[src]
+        self.reset(src)
+
+    def push(self, util: np.ndarray, power: float, churn: float, idle_w: float,
+             n_pods: int) -> np.ndarray:
+        """Adds one cycle (util aligned to node slots) and returns the features."""
+        n = len(util)
+        self._fit(n)
+        h = self.head
+        old = self.util[h, :n]
+        self.u_sum[:n] += util - old
+        self.u_sq[:n]  += util * util - old * old
+        self.util[h, :n] = util
+        np.minimum(self.u_n[:n] + 1, self.w, out=self.u_n[:n])
+
+        # Σy and Σt·y over t = 0 (oldest) … n-1; sliding drops y0, shifts t by one
+        if self.n == self.w:
+            y0 = self.power[h]
+            self.p_st += (self.w - 1) * power - (self.p_s1 - y0)
+            self.p_s1 += power - y0
+        else:
+            self.p_st += self.n * power
+            self.p_s1 += power
+            self.n += 1
+        self.power[h] = power
+        self.c_sum += churn - self.churn[h]
+        self.churn[h] = churn
+        frac = idle_w / power if power > 0 else 0.0
+        self.i_sum += frac - self.idle[h]
+        self.idle[h] = frac
+
+        self.head = (h + 1) % self.w
+        self.t += 1
+        if self.t % (RESUM_EVERY * self.w) == 0:
+            self._resum()
+        return self.features(n, n_pods)
+
+    def _resum(self):
+        """Exact sums from the rings, against drift of the running ones."""
+        self.u_sum = self.util.sum(axis=0)
+        self.u_sq  = (self.util * self.util).sum(axis=0)
+        y = np.roll(self.power, -self.head)[self.w - self.n:]     # oldest → newest
+        self.p_s1 = float(y.sum())
+        self.p_st = float(np.arange(self.n) @ y)
+        self.c_sum = float(self.churn.sum())
+        self.i_sum = float(self.idle.sum())
+
+    def features(self, n_nodes: int, n_pods: int) -> np.ndarray:
+        out = np.zeros(len(ROLLING_FEATURES), dtype=np.float32)
+        m = self.n
+        if m == 0:
+            return out
+        if m >= 2 and self.p_s1 > 0:
+            st, stt = m * (m - 1) / 2, (m - 1) * m * (2 * m - 1) / 6
+            slope   = (m * self.p_st - st * self.p_s1) / (m * stt - st * st)
+            out[0]  = slope / (self.p_s1 / m)
+        c = self.u_n[:n_nodes]
+        seen = c >= 2
+        if seen.any():
+            mean = self.u_sum[:n_nodes][seen] / c[seen]
+            var  = self.u_sq[:n_nodes][seen] / c[seen] - mean * mean
+            out[1] = np.maximum(var, 0.0).mean()
+        out[2] = self.c_sum / m / max(n_pods, 1)
+        out[3] = self.i_sum / m
+        return out
+
+
+# ───────────────────────────────────────────────
+class StateEngine:
+    """Node / pod tables updated by deltas; ``snapshot`` joins them with Prometheus."""
+    def __init__(self, window: int = STATE_WINDOW):
+        self.nodes = _Table({"alloc_cpu": np.float64, "alloc_mem": np.float64,
+                             "pods": np.int64, "req_cpu": np.float64, "req_mem": np.float64},
+                            ("ip", "row"))
+        self.pods  = _Table({"node": np.int32, "req_cpu": np.float64, "req_mem": np.float64,
+                             "daemon": bool},
+                            ("name", "namespace", "labels", "node_name", "row"))
+        self.rolling = RollingFeatures(window)
+        self.churn   = 0                                    # pod deltas since the last commit
+        self._pending: Optional[tuple] = None               # last snapshot's reading, uncommitted
+        self._orphans: Dict[str, Set[str]] = {}             # unknown node name → pod keys
+        self.ip_index:  Dict[str, int] = {}                 # InternalIP → node slot
+        self.pod_index: Dict[str, Dict[str, int]] = {}      # namespace → pod name → slot
+        self.ingest = PromIngest(self.nodes.index, self.ip_index, self.pod_index)
+
+    # ───────────── deltas ───────────────────────────────────
+    def apply(self, kind: str, changes: Dict[str, Optional[Dict[str, Any]]]):
+        """``{key: row}`` upserts and ``{key: None}`` deletions for "nodes" or "pods"."""
+        self._pending = None                                # node slots may move
+        upsert, remove = self._ops(kind)
+        for key, row in changes.items():
+            if row is None:
+                remove(key)
+            else:
+                upsert(key, row)
+
+    def sync(self, kind: str, rows: Dict[str, Dict[str, Any]]):
+        """Full ``{key: row}`` state; only rows that differ from the tables are applied."""
+        table = self.nodes if kind == "nodes" else self.pods
+        self._pending = None
+        upsert, remove = self._ops(kind)
+        for key in [k for k in table.keys if k not in rows]:
+            remove(key)
+        stored, index = table.obj["row"], table.index
+        for key, row in rows.items():
+            i = index.get(key)
+            if i is None or (stored[i] is not row and stored[i] != row):
+                upsert(key, row)
+
+    def _ops(self, kind: str):
+        if kind == "nodes":
+            return self._upsert_node, self._remove_node
+        if kind == "pods":
+            return self._upsert_pod, self._remove_pod
+        raise ValueError(f"unknown table {kind!r}")
+
+    def _upsert_node(self, name: str, row: Dict[str, Any]):
+        N, ip = self.nodes, row.get("ip")
+        i = N.index.get(name)
+        if i is not None and N.obj["ip"][i] != ip:
+            self.ip_index.pop(N.obj["ip"][i], None)
+        i, new = N.upsert(name, {"alloc_cpu": row["alloc_cpu"], "alloc_mem": row["alloc_mem"],
+                                 "ip": ip, "row": row})
+        if ip:
+            self.ip_index[ip] = i
+        if not new:
+            return
+        self.rolling.reset(i)
+        for key in self._orphans.pop(name, ()):             # pods bound before the node arrived
+            self._place(self.pods.index[key], i)
+
+    def _remove_node(self, name: str):
+        pn = self.pods.col("node")
+        i = self.nodes.index.get(name)
+        if i is None:
+            return
+        for j in np.flatnonzero(pn == i):                   # its pods wait for the node to return
+            self._unplace(int(j))
+            self._orphans.setdefault(name, set()).add(self.pods.keys[j])
+        self.ip_index.pop(self.nodes.obj["ip"][i], None)
+        _, last = self.nodes.remove(name)
+        if last != i:
+            pn[pn == last] = i
+            self.rolling.move(last, i)
+            moved_ip = self.nodes.obj["ip"][i]
+            if moved_ip:
+                self.ip_index[moved_ip] = i
+        else:
+            self.rolling.reset(i)
+
+    def _place(self, j: int, i: int):
+        P, N = self.pods, self.nodes.num
+        P.num["node"][j] = i
+        N["pods"][i]    += 1
+        N["req_cpu"][i] += P.num["req_cpu"][j]
+        N["req_mem"][i] += P.num["req_mem"][j]
+
+    def _unplace(self, j: int):
+        P, N = self.pods, self.nodes.num
+        i = P.num["node"][j]
+        if i < 0:
+            return
+        N["pods"][i]    -= 1
+        N["req_cpu"][i] -= P.num["req_cpu"][j]
+        N["req_mem"][i] -= P.num["req_mem"][j]
+        P.num["node"][j] = -1
+
+    def _forget_orphan(self, key: str, node_name: Optional[str]):
+        keys = self._orphans.get(node_name)
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self._orphans[node_name]
+
+    def _upsert_pod(self, key: str, row: Dict[str, Any]):
+        P = self.pods
+        node_name = row.get("node")
+        j = P.index.get(key)
+        if j is None:
+            self.churn += 1
+        else:
+            old = P.obj["node_name"][j]
+            if old != node_name:                            # bound / rescheduled
+                self.churn += 1
+            self._unplace(j)
+            self._forget_orphan(key, old)
+        j, _ = P.upsert(key, {"node": -1, "req_cpu": row.get("req_cpu", 0.0) * 1000,
+                              "req_mem": row.get("req_mem", 0), "daemon": row.get("daemon", False),
+                              "name": row["name"], "namespace": row["namespace"],
+                              "labels": row.get("labels"), "node_name": node_name, "row": row})
+        self.pod_index.setdefault(row["namespace"], {})[row["name"]] = j
+        i = self.nodes.index.get(node_name, -1) if node_name else -1
+        if i >= 0:
+            self._place(j, i)
+        elif node_name:
+            self._orphans.setdefault(node_name, set()).add(key)
+
+    def _remove_pod(self, key: str):
+        P = self.pods
+        j = P.index.get(key)
+        if j is None:
+            return
+        self.churn += 1
+        self._unplace(j)
+        self._forget_orphan(key, P.obj["node_name"][j])
+        ns, name = P.obj["namespace"][j], P.obj["name"][j]
+        names = self.pod_index.get(ns)
+        if names is not None and names.get(name) == j:
+            del names[name]
+            if not names:
+                del self.pod_index[ns]
+        _, last = P.remove(key)
+        if last != j:                                       # row ``last`` now lives at j
+            self.pod_index[P.obj["namespace"][j]][P.obj["name"][j]] = j
+
+    # ───────────── aggregates ───────────────────────────────
+    def node_requests(self) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """Per node slot: (pods, requested cpu millicores, requested memory bytes)."""
+        N = self.nodes
+        return N.col("pods").copy(), N.col("req_cpu").copy(), N.col("req_mem").copy()
+
+    # ───────────── snapshot ─────────────────────────────────
+    @property
+    def unmatched(self) -> Dict[str, int]:
+        """Series per query of the last snapshot that matched no node / pod."""
+        return self.ingest.unmatched
+
+    def snapshot(self, prom: Dict[str, list], kube_sys_cpu: float = 0.0,
+                 ts: Optional[float] = None, commit: bool = True) -> ClusterSnapshot:
+        """
+        ClusterSnapshot in table order from raw ``{query name: result}``
+        Prometheus answers.  ``commit`` pushes its reading into the rolling
+        windows as this cycle's; otherwise it carries the features of the
+        cycles committed so far and ``commit()`` can still push it.
+        """
+        N, P, ing = self.nodes, self.pods, self.ingest
+        n, p = len(N), len(P)
+        snap = ClusterSnapshot(
+            list(N.keys), N.col("alloc_cpu").copy(), N.col("alloc_mem").copy(),
+            ing.nodes("node_cpu_util", prom["node_cpu_util"], n),
+            ing.nodes("node_mem_util", prom["node_mem_util"], n),
+            ing.nodes("node_cpu_watts", prom["node_cpu_watts"], n, add=True),
+            list(P.keys), list(P.obj["name"]), list(P.obj["namespace"]),
+            P.col("node").copy(),
+            ing.pods("pod_cpu_usage", prom["pod_cpu_usage"], p) * 1000,
+            kube_sys_cpu=kube_sys_cpu, ts=ts,
+            pod_labels=list(P.obj["labels"]),
+            pod_req_cpu=P.col("req_cpu").copy(), pod_req_mem=P.col("req_mem").copy(),
+            pod_daemon=P.col("daemon").copy(), node_ips=list(N.obj["ip"]))
+        idle = ing.nodes("node_idle_watts", prom.get("node_idle_watts", ()), n, add=True).sum()
+        self._pending = (snap.cpu_util, snap.total_power(), idle, snap.n_pods)
+        snap.rolling = self.commit() if commit else self.rolling.features(n, snap.n_pods)
+        return snap
+
+    def commit(self) -> Optional[np.ndarray]:
+        """
+        Push the last snapshot's reading as one cycle (at most once, and not
+        after a later ingest); the new rolling features, or None.
+        """
+        if self._pending is None:
+            return None
+        util, power, idle, n_pods = self._pending
+        self._pending = None
+        out = self.rolling.push(util, power, self.churn, idle, n_pods)
+        self.churn = 0
+        return out
@@ -0,0 +1,213 @@
+# SPDX-License-Identifier: Apache-2.0
+# optimiser/suggestion_log.py
+#
+# Append-only, segmented JSONL log of controller decisions.
+# – one line per cycle: cycle, wall time, policy version, state vector,
+#   suggestion (action / target / Δ W …)
+# – segments rotate by size and age; old segments are dropped by total
+#   size and age, so the directory holds a handful of files, not one per cycle
+# – SuggestionLogReader memory-maps segments and answers range queries by
+#   cycle or by time with a binary search over line offsets; segments whose
+#   ranges overlap (cycles restart at 0 when the controller starts without
+#   a checkpoint) are scanned linearly instead
+#
+#     log = SuggestionLog("/tmp/k8s_optimizer_suggestions")
+#     log.append(t, vec, sug, version)
+#     for rec in SuggestionLogReader(log.directory).by_cycle(1000, 1100): ...
+
+import os, mmap, time
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Union
+
+import numpy as np
+import orjson
+
+SUG_SEGMENT_BYTES = int(os.getenv("SUG_SEGMENT_BYTES", 8 * 2**20))
+SUG_SEGMENT_AGE   = float(os.getenv("SUG_SEGMENT_AGE", 3600))        # s, then rotate
+SUG_MAX_BYTES     = int(os.getenv("SUG_MAX_BYTES", 64 * 2**20))      # whole log
+SUG_MAX_AGE       = float(os.getenv("SUG_MAX_AGE", 7 * 86400))       # s
+
+SEGMENT_GLOB = "sug-*.jsonl"
+
+
+def _segments(directory: Path) -> List[Path]:
+    """Oldest first – names embed the creation time in ms, zero-padded."""
+    return sorted(directory.glob(SEGMENT_GLOB))
+
+
+# ───────────────────────────────────────────────
+class SuggestionLog:
+    def __init__(self,
+                 directory: Union[str, Path],
+                 segment_bytes: int = SUG_SEGMENT_BYTES,
+                 segment_age: float = SUG_SEGMENT_AGE,
+                 max_bytes: int = SUG_MAX_BYTES,
+                 max_age: float = SUG_MAX_AGE):
+        self.directory     = Path(directory)
+        self.segment_bytes = segment_bytes
+        self.segment_age   = segment_age
+        self.max_bytes     = max_bytes
+        self.max_age       = max_age
+        self.directory.mkdir(parents=True, exist_ok=True)
+        for legacy in self.directory.glob("sug_*.json"):     # one-file-per-cycle era
+            legacy.unlink(missing_ok=True)
+
+        self._f = None
+        self._opened = 0.0
+        self._size = 0
+
+    # ───────────────────────────────────────────
+    def _rotate(self):
+        if self._f is not None:
+            self._f.close()
+        now  = time.time()
+        path = self.directory / f"sug-{int(now * 1000):013d}.jsonl"
+        self._f      = open(path, "ab", buffering=0)
+        self._opened = now
+        self._size   = 0
+        self._retain(now)
+
+    def _retain(self, now: float):
+        segs  = _segments(self.directory)[:-1]              # never the active one
+        sizes = [p.stat() for p in segs]
+        total = sum(s.st_size for s in sizes) + self._size
+        for p, st in zip(segs, sizes):
+            if total <= self.max_bytes and now - st.st_mtime <= self.max_age:
+                break
+            p.unlink(missing_ok=True)
+            total -= st.st_size
+
+    def append(self, cycle: int, state_vec, sug: Dict[str, Any],
+               policy_version: int = 0, ts: Optional[float] = None):
+        ts = time.time() if ts is None else ts
+        if (self._f is None or self._size >= self.segment_bytes
+                or ts - self._opened >= self.segment_age):
+            self._rotate()
+        line = orjson.dumps({"t": cycle, "ts": ts, "v": policy_version,
+                             "state": np.asarray(state_vec, dtype=np.float32).tolist(),
+                             "sug": sug},
+                            option=orjson.OPT_SERIALIZE_NUMPY) + b"\n"
+        self._f.write(line)                                 # one write() per record
+        self._size += len(line)
+
+    def close(self):
+        if self._f is not None:
+            self._f.close()
+            self._f = None
+
+
+# ───────────────────────────────────────────────
+class _Segment:
+    """mmap of one segment + the byte offsets of its complete lines."""
+    __slots__ = ("path", "size", "mm", "starts", "ends")
+
+    def __init__(self, path: Path):
+        self.path  = path
+        self.size  = path.stat().st_size
+        self.mm    = None
+        self.starts = self.ends = np.zeros(0, dtype=np.int64)
+        if self.size:
+            with open(path, "rb") as f:
+                self.mm = mmap.mmap(f.fileno(), self.size, access=mmap.ACCESS_READ)
+            nl = np.flatnonzero(np.frombuffer(self.mm, dtype=np.uint8) == 0x0A)
+            self.ends   = nl
+            self.starts = np.concatenate([[0], nl[:-1] + 1]) if len(nl) else nl
+
+    def __len__(self):
+        return len(self.ends)
+
+    def record(self, i: int) -> Dict[str, Any]:
+        return orjson.loads(self.mm[self.starts[i]:self.ends[i]])
+
+    def lower_bound(self, key: str, value: float) -> int:
+        lo, hi = 0, len(self)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self.record(mid)[key] < value:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+
+    def close(self):
+        if self.mm is not None:
+            self.mm.close()
+
+
+class SuggestionLogReader:
+    """
+    Read side; safe to use while a SuggestionLog appends (a partially
+    written last line is ignored).  Sealed segments are mapped once; the
+    newest one is re-mapped whenever it has grown.
+    """
+    def __init__(self, directory: Union[str, Path]):
+        self.directory = Path(directory)
+        self._open: Dict[Path, _Segment] = {}
+
+    def _load(self) -> List[_Segment]:
+        paths = _segments(self.directory)
+        for p in set(self._open) - set(paths):             # retained away
+            self._open.pop(p).close()
+        out = []
+        for p in paths:
+            seg = self._open.get(p)
+            try:
+                if seg is None or seg.size != p.stat().st_size:
+                    if seg is not None:
+                        seg.close()
+                    seg = self._open[p] = _Segment(p)
+            except FileNotFoundError:
+                continue
+            if len(seg):
+                out.append(seg)
+        return out
+
+    def _range(self, key: str, lo: float, hi: float) -> Iterator[Dict[str, Any]]:
+        segs   = self._load()
+        bounds = [(seg.record(0)[key], seg.record(len(seg) - 1)[key]) for seg in segs]
+        for k, seg in enumerate(segs):
+            first, last = bounds[k]
+            ordered = first <= last and not any(
+                j != k and b[0] <= last and first <= b[1] for j, b in enumerate(bounds))
+            if not ordered:                                 # key went back: check every line
+                for i in range(len(seg)):
+                    rec = seg.record(i)
+                    if lo <= rec[key] < hi:
+                        yield rec
+                continue
+            if first >= hi or last < lo:
+                continue
+            for i in range(seg.lower_bound(key, lo), len(seg)):
+                rec = seg.record(i)
+                if rec[key] >= hi:
+                    break
+                yield rec
+
+    def by_cycle(self, first: int, last: Optional[int] = None) -> Iterator[Dict[str, Any]]:
+        """
+        Records with ``first <= cycle < last`` (open-ended when last is None),
+        in log order; after a restart that reset the cycle count a number
+        can match records of several runs.
+        """
+        return self._range("t", first, float("inf") if last is None else last)
+
+    def by_time(self, start: float, end: Optional[float] = None) -> Iterator[Dict[str, Any]]:
+        """Records with ``start <= ts < end`` (UNIX seconds)."""
+        return self._range("ts", start, float("inf") if end is None else end)
+
+    def tail(self, n: int = 1) -> List[Dict[str, Any]]:
+        out: List[Dict[str, Any]] = []
+        for seg in reversed(self._load()):
+            k = min(n - len(out), len(seg))
+            out[:0] = [seg.record(i) for i in range(len(seg) - k, len(seg))]
+            if len(out) >= n:
+                break
+        return out
+
+    def __len__(self):
+        return sum(len(s) for s in self._load())
+
+    def close(self):
+        for seg in self._open.values():
+            seg.close()
+        self._open.clear()
@@ -0,0 +1,167 @@
+# SPDX-License-Identifier: Apache-2.0
+# tests/test_action_batch.py
+#
+# Batched actions (ACTION_BATCH > 1) against the fake API server and
+# Prometheus of benchmarks/fakes.py: one action per node, the in-flight
+# limit, PDB checks, the per-action Δ power credited to each reward, and
+# no learning on rows the drain plan overrode.
+#
+#     python -m pytest -q tests
+
+import asyncio, copy
+
+import numpy as np
+import pytest
+
+import optimiser.energy_optimization_controller as ctl_mod
+from benchmarks.fakes import FakeCoreV1, FakeProm, fake_pdb
+from optimiser.binpack import DrainPlan
+from optimiser.cluster_snapshot import snapshot_of
+from optimiser.decision_engine import HierarchicalAgent, HierMem
+from optimiser.k8s_io import K8sExecutor
+from optimiser.state_builder import StateBuilder
+from optimiser.energy_optimization_controller import (
+    ACTION_CONSOLIDATE, ACTION_DO_NOTHING, ACTION_HARDWARE_TUNE, OptimizationController)
+
+N_NODES, N_PODS = 16, 160
+
+
+def make(batch: int, binpack_mode: str = "off", target_head: str = "gray", **fake_kw):
+    k8s  = FakeCoreV1(N_NODES, N_PODS, **fake_kw)
+    prom = FakeProm(k8s)
+    sb   = StateBuilder(use_informers=False, io=K8sExecutor(), prom=prom, core_v1=k8s)
+    ctrl = OptimizationController(HierarchicalAgent(12, N_NODES, N_PODS, target_head=target_head),
+                                  sb, HierMem(), None,
+                                  update_timestep=10**9, core_v1=k8s, verbose=False,
+                                  checkpoint_dir=None, background_learning=False,
+                                  action_batch=batch, experience_store=False,
+                                  binpack_mode=binpack_mode)
+    return ctrl, k8s, prom
+
+
+def choose(ctrl, fams, tgts):
+    """The agent still records its rows; the families / targets are ours."""
+    select = ctrl.agent.select_batch
+
+    def fixed(states, memory=None, snaps=None):
+        select(states, memory, snaps=snaps)
+        return np.asarray(fams), np.asarray(tgts)
+    ctrl.agent.select_batch = fixed
+
+
+def node_of(k8s, sug) -> str:
+    ns, name = sug["pod"].split("/")
+    return next(p.spec.node_name for p in k8s._pods.items
+                if (p.metadata.namespace, p.metadata.name) == (ns, name))
+
+
+# ───────────────────────────────────────────────
+def test_batch_targets_disjoint_nodes():
+    ctrl, k8s, _ = make(4)
+    choose(ctrl, [ACTION_CONSOLIDATE] * 4, [3, 3, 5, 3 + N_NODES])
+    sug = asyncio.run(ctrl.step(0))
+    acts = sug["actions"]
+    assert [s["target"] for s in acts] == ["node-3", None, "node-5", None]
+    assert acts[1]["conflict"] == acts[3]["conflict"] == "node-3"
+    assert acts[1]["action"] == acts[3]["action"] == ACTION_DO_NOTHING
+    assert len(k8s.evicted) == 2
+    assert sorted(node_of(k8s, s) for s in acts if s.get("ok")) == ["node-3", "node-5"]
+
+
+def test_batch_respects_concurrency_limit(monkeypatch):
+    monkeypatch.setattr(ctl_mod, "ACTION_CONCURRENCY", 2)
+    ctrl, k8s, _ = make(6, latency=0.05)
+    choose(ctrl, [ACTION_CONSOLIDATE] * 6, range(6))
+    sug = asyncio.run(ctrl.step(0))
+    assert all(s["ok"] for s in sug["actions"])
+    assert len(k8s.evicted) == 6
+    assert k8s.max_in_flight == 2
+
+
+def test_pdb_rejects_overdrawing_evictions():
+    ctrl, k8s, _ = make(4)
+    choose(ctrl, [ACTION_CONSOLIDATE] * 4, range(4))
+    st = asyncio.run(ctrl._state())
+    probe = copy.deepcopy(ctrl._suggest_batch([ACTION_CONSOLIDATE] * 4, range(4), st))
+    ctrl._plan(probe, st, None)                         # which pod each action would evict
+    ns, _ = probe[0]["pod"].split("/")
+    k8s.pdbs = [fake_pdb(ns, {}, allowed=0)]            # no disruption left in that namespace
+
+    sug = asyncio.run(ctrl.step(0))
+    for s in sug["actions"]:
+        blocked = s["pod"].split("/")[0] == ns
+        assert s.get("skipped") == ("pdb" if blocked else None)
+        assert s.get("ok", False) is not blocked
+    assert all(n != ns for n, _ in k8s.evicted)
+    assert len(k8s.evicted) == sum(s.get("ok", False) for s in sug["actions"])
+
+
+def test_pdb_forbidden_falls_back_to_api_server():
+    ctrl, k8s, _ = make(2, pdb_forbidden=True)
+    choose(ctrl, [ACTION_CONSOLIDATE] * 2, range(2))
+    st = asyncio.run(ctrl._state())
+    probe = copy.deepcopy(ctrl._suggest_batch([ACTION_CONSOLIDATE] * 2, range(2), st))
+    ctrl._plan(probe, st, None)
+    ns, _ = probe[0]["pod"].split("/")
+    k8s.pdbs = [fake_pdb(ns, {}, allowed=0)]
+
+    sug = asyncio.run(ctrl.step(0))
+    assert sug["actions"][0]["ok"] is False and sug["actions"][0]["error"] == "rejected"
+    assert "skipped" not in sug["actions"][0]
+
+
+def test_reward_is_attributed_per_action():
+    ctrl, k8s, prom = make(4)
+    watts = np.full(N_NODES, 100.0)
+    prom.set_node_watts(watts)
+    after = watts.copy()
+    after[[3, 5]] -= [50.0, 20.0]                      # the drained nodes
+    after[9]      += 10.0                               # where their pods land
+    evict = k8s.create_namespaced_pod_eviction
+
+    def evict_and_move(name, namespace, body=None):
+        evict(name, namespace, body)
+        prom.set_node_watts(after)
+    k8s.create_namespaced_pod_eviction = evict_and_move
+    choose(ctrl, [ACTION_CONSOLIDATE, ACTION_CONSOLIDATE, ACTION_HARDWARE_TUNE, ACTION_DO_NOTHING],
+           [3, 5, 7, 0])
+
+    sug = asyncio.run(ctrl.step(0))
+    assert sug["delta_w"] == pytest.approx(60.0)
+    # the 10 W the targets do not explain is shared by the two evictions
+    per_action = [s["delta_w"] for s in sug["actions"]]
+    assert per_action == pytest.approx([45.0, 15.0, 0.0, 0.0])
+    assert k8s.patched[0][0] == "node-7"
+
+    rewards = ctrl.memory.high.batch()[3].numpy()
+    assert rewards == pytest.approx(-watts.sum() + np.array(per_action))
+    assert snapshot_of(asyncio.run(ctrl._state())).total_power() == pytest.approx(after.sum())
+
+
+@pytest.mark.parametrize("mode,target_head", [("mask", "gray"), ("fallback", "gray"),
+                                              ("mask", "node")])
+def test_rows_overridden_by_drain_plan_are_not_learned(monkeypatch, mode, target_head):
+    ctrl, _, _ = make(4, binpack_mode=mode, target_head=target_head)
+    monkeypatch.setattr(ctl_mod, "plan_drain",         # only node-3 and node-9 can be emptied
+                        lambda snap: DrainPlan([3, 9], [0, 0, 0], [], [], snap.n_nodes, 0.0))
+    sampled = []
+    select  = ctrl.agent.select_batch
+
+    def fixed(states, memory=None, snaps=None):
+        sampled.append(select(states, memory, snaps=snaps)[0])
+        return (np.array([ACTION_CONSOLIDATE, ACTION_CONSOLIDATE, ACTION_HARDWARE_TUNE,
+                          ACTION_DO_NOTHING]), np.array([3, 5, 7, 0]))
+    ctrl.agent.select_batch = fixed
+
+    sug  = asyncio.run(ctrl.step(0))
+    acts = sug["actions"]
+    assert ("replaced" if mode == "fallback" else "masked") in acts[1]
+    kept = np.array([True, False, True, True])
+    high, low = ctrl.memory.high, ctrl.memory.low
+    assert len(high) == len(low) == 3
+    assert high.actions.tolist() == sampled[0][kept].tolist()
+    # one shared −power term plus each kept action's own Δ W
+    per_action = np.array([s["delta_w"] for s in acts])[kept]
+    assert np.ptp(high.batch()[3].numpy() - per_action) == pytest.approx(0.0, abs=1e-3)
+    stats = ctrl.agent.update(ctrl.memory)
+    assert stats["high"]["epochs"] > 0
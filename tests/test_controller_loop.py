@@ -0,0 +1,101 @@
+# SPDX-License-Identifier: Apache-2.0
+# tests/test_controller_loop.py
+#
+# Control-loop resilience: a cycle cut short by an API timeout is skipped,
+# and the rows it had already recorded do not outlive it.  Settle polls do
+# not advance the rolling state features; each observation does, once.
+#
+#     python -m pytest -q tests
+
+import asyncio
+
+import numpy as np
+import pytest
+from kubernetes import client
+
+import optimiser.energy_optimization_controller as ctl_mod
+
+from benchmarks.fakes import FakeCoreV1, FakeProm
+from optimiser.decision_engine import HierarchicalAgent, HierMem
+from optimiser.k8s_io import K8sExecutor
+from optimiser.node_policy import NodeRollout
+from optimiser.state_builder import StateBuilder
+from optimiser.energy_optimization_controller import OptimizationController
+
+N_NODES, N_PODS = 8, 60
+
+
+def make(target_head: str = "gray", batch: int = 1):
+    k8s  = FakeCoreV1(N_NODES, N_PODS)
+    sb   = StateBuilder(use_informers=False, io=K8sExecutor(), prom=FakeProm(k8s), core_v1=k8s)
+    ctrl = OptimizationController(HierarchicalAgent(12, N_NODES, N_PODS, target_head=target_head),
+                                  sb, HierMem(), None, update_timestep=10**9, core_v1=k8s,
+                                  verbose=False, checkpoint_dir=None, background_learning=False,
+                                  action_batch=batch, experience_store=False)
+    return ctrl
+
+
+def fail_settle(ctrl, cycles, exc):
+    """The settle wait of the given cycles raises ``exc``."""
+    settle = ctrl._settle
+
+    async def flaky(cap):
+        if ctrl.t in cycles:
+            raise exc
+        return await settle(cap)
+    ctrl._settle = flaky
+
+
+def force_action(ctrl, fam: int = 1):
+    """Every cycle acts, so every cycle settles."""
+    high = ctrl.agent.high
+    select, select_actions = high.select_action, high.select_actions
+    high.select_action  = lambda s, mem=None: (select(s, mem), fam)[1]
+    high.select_actions = lambda s, mem=None: select_actions(s, mem) * 0 + fam
+
+
+@pytest.mark.parametrize("target_head,batch,exc", [
+    ("gray", 1, asyncio.TimeoutError()),
+    ("gray", 3, client.ApiException(status=500)),
+    ("node", 1, asyncio.TimeoutError()),
+])
+def test_aborted_cycle_keeps_rows_and_rewards_aligned(target_head, batch, exc):
+    ctrl = make(target_head, batch)
+    force_action(ctrl)
+    fail_settle(ctrl, {2, 4}, exc)
+    asyncio.run(ctrl.run_loop_async(0, 0, cycles=5))
+    assert ctrl.t == 5
+    for buf in (ctrl.memory.high, ctrl.memory.low):
+        rewards = buf.batch()[6 if isinstance(buf, NodeRollout) else 3]
+        assert len(buf) == len(rewards) == 3 * batch
+    stats = ctrl.agent.update(ctrl.memory)
+    assert stats["high"]["epochs"] > 0
+
+
+@pytest.mark.parametrize("reuse_settle", [True, False])
+def test_rolling_features_advance_once_per_cycle(monkeypatch, reuse_settle):
+    monkeypatch.setattr(ctl_mod, "SETTLE_POLL", 0.0)
+    monkeypatch.setattr(ctl_mod, "STATE_MAX_AGE", 30.0 if reuse_settle else -1.0)
+    ctrl = make()
+    ctrl._prom_step = 0
+    force_action(ctrl)
+    reads, vectors = [], []
+    get, vector = ctrl.sb.get_cluster_state, ctrl.state_vector
+
+    async def counted(commit=True):
+        reads.append(commit)
+        return await get(commit=commit)
+    ctrl.sb.get_cluster_state = counted
+
+    def seen(st):                                  # the observation carries the pushed features
+        vectors.append(vector(st))
+        return vectors[-1]
+    ctrl.state_vector = seen
+
+    asyncio.run(ctrl.run_loop_async(0, 5, cycles=4))
+    engine = ctrl.sb.engine
+    assert len(reads) >= 4 * ctl_mod.SETTLE_STABLE      # several settle polls per cycle
+    assert sum(reads) == (1 if reuse_settle else 4)
+    assert engine.rolling.t == 4
+    np.testing.assert_allclose(vectors[-1][7:11],
+                               engine.rolling.features(len(engine.nodes), len(engine.pods)))
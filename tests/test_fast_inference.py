@@ -0,0 +1,78 @@
+# SPDX-License-Identifier: Apache-2.0
+# tests/test_fast_inference.py
+#
+# FastActor against the torch actor it was copied from: action
+# probabilities (float32 tight, int8 within a stated tolerance), sampled
+# frequencies, and reproducible draws from the preallocated generator.
+#
+#     python -m pytest -q tests
+
+import numpy as np
+import pytest
+import torch
+
+from optimiser.advanced_optimization import ActorCritic
+from optimiser.fast_inference import FastActor
+
+STATE_DIM, ACTIONS = 12, 16
+TOL_F32  = 1e-5         # max |Δp|, float32 path: rounding only
+TOL_INT8 = 5e-2         # max |Δp|, int8 weights + per-row activation scale
+
+
+@pytest.fixture(scope="module")
+def actor():
+    torch.manual_seed(0)
+    return ActorCritic(STATE_DIM, ACTIONS).actor.eval()
+
+
+@pytest.fixture(scope="module")
+def states():
+    return (np.random.default_rng(0).standard_normal((2048, STATE_DIM)) * 3).astype(np.float32)
+
+
+def reference(actor, x) -> np.ndarray:
+    with torch.no_grad():
+        return actor(torch.from_numpy(x)).numpy().astype(np.float64)
+
+
+@pytest.mark.parametrize("quantize,tol", [(False, TOL_F32), (True, TOL_INT8)])
+def test_probabilities_match_actor(actor, states, quantize, tol):
+    fast = FastActor.from_actor(actor, quantize=quantize)
+    p, ref = fast.probs(states).astype(np.float64), reference(actor, states)
+    assert p.shape == ref.shape
+    np.testing.assert_allclose(p.sum(axis=1), 1.0, atol=1e-5)
+    assert np.abs(p - ref).max() <= tol
+
+
+def test_single_state_matches_batch(actor, states):
+    fast = FastActor.from_actor(actor)
+    np.testing.assert_allclose(fast.probs(states[3]), fast.probs(states)[3:4], atol=1e-6)
+
+
+def test_sampling_follows_probabilities(actor, states):
+    fast = FastActor.from_actor(actor, seed=1)
+    x = np.repeat(states[:1], 100_000, axis=0)
+    a, logp = fast.sample(x)
+    ref = reference(actor, states[:1])[0]
+    freq = np.bincount(a, minlength=ACTIONS) / len(a)
+    assert 0.5 * np.abs(freq - ref).sum() <= 0.01           # total variation
+    np.testing.assert_allclose(logp, np.log(fast.probs(states[:1])[0][a]), rtol=1e-6)
+
+
+def test_sampling_is_reproducible(actor, states):
+    one, two = (FastActor.from_actor(actor, seed=7) for _ in range(2))
+    for rows in (states[:1], states[:64], states[:5], states[:1]):     # both buffer paths
+        a1, lp1 = one.sample(rows)
+        a2, lp2 = two.sample(rows)
+        np.testing.assert_array_equal(a1, a2)
+        np.testing.assert_array_equal(lp1, lp2)
+    other = FastActor.from_actor(actor, seed=8)
+    assert not np.array_equal(FastActor.from_actor(actor, seed=7).sample(states[:256])[0],
+                              other.sample(states[:256])[0])
+
+
+def test_reload_keeps_rng_stream(actor, states):
+    fast, ref = FastActor.from_actor(actor, seed=3), FastActor.from_actor(actor, seed=3)
+    fast.sample(states[:8]); ref.sample(states[:8])
+    fast.load_actor(actor)
+    np.testing.assert_array_equal(fast.sample(states[:32])[0], ref.sample(states[:32])[0])
@@ -0,0 +1,142 @@
+# SPDX-License-Identifier: Apache-2.0
+# tests/test_informer.py
+#
+# Informer driven by a scripted fake watch stream: events applied to the
+# store and journal, WATCH resumed from the last resourceVersion, relist
+# on 410 Gone, and a bounded wait for the first LIST.
+#
+#     python -m pytest -q tests
+
+import threading, time
+from types import SimpleNamespace as NS
+
+import pytest
+from kubernetes import client
+
+from optimiser.informer import Informer, name_key
+
+
+def obj(name: str, rv: int, **spec):
+    return NS(metadata=NS(name=name, uid=f"uid-{name}", resource_version=str(rv)), spec=NS(**spec))
+
+
+def event(kind: str, o) -> dict:
+    return {"type": kind, "object": o}
+
+
+GONE = {"type": "ERROR", "raw_object": {"kind": "Status", "code": 410, "reason": "Expired"}}
+
+
+class Lister:
+    """``list_fn``: successive LIST answers (the last one repeats)."""
+    def __init__(self, *answers):
+        self.answers, self.calls = list(answers), 0
+
+    def __call__(self, **kw):
+        self.calls += 1
+        objs, rv = self.answers[min(self.calls, len(self.answers)) - 1]
+        return NS(metadata=NS(resource_version=str(rv)), items=objs)
+
+
+class ScriptedWatch:
+    """
+    ``watch_factory``: one scripted session per stream(); idles once they
+    run out.  Sessions start only once ``go`` is set.
+    """
+    def __init__(self, sessions, go: bool = True):
+        self.sessions = sessions
+        self.calls: list = []                       # kwargs of every stream()
+        self.stopped  = threading.Event()
+        self.go       = threading.Event()
+        if go:
+            self.go.set()
+
+    def __call__(self):
+        return self
+
+    def stream(self, func, **kw):
+        self.calls.append(kw)
+        self.go.wait(5)
+        if self.sessions:
+            yield from self.sessions.pop(0)
+        else:
+            self.stopped.wait(5)
+
+    def stop(self):
+        if not self.sessions:
+            self.stopped.set()
+
+
+def until(cond, timeout: float = 5.0):
+    end = time.monotonic() + timeout
+    while not cond():
+        assert time.monotonic() < end, "condition not reached"
+        time.sleep(0.005)
+
+
+def test_events_update_store_and_journal():
+    lister = Lister(([obj("a", 1, v=0), obj("b", 2, v=0)], 10))
+    fake   = ScriptedWatch([[event("ADDED", obj("c", 11, v=0)),
+                             event("MODIFIED", obj("a", 12, v=1)),
+                             event("DELETED", obj("b", 13, v=0)),
+                             event("BOOKMARK", NS(metadata=NS(resource_version="14")))]],
+                           go=False)
+    inf = Informer(lister, key_fn=name_key, transform=lambda o: o.spec.v,
+                   watch_factory=fake, journal=True)
+    inf.start(timeout=5)
+    assert inf.changes() is None                   # first call: resync from store()
+    fake.go.set()
+    until(lambda: inf.resource_version == "14")
+    inf.stop()
+    assert inf.store() == {"a": 1, "c": 0}
+    assert inf.changes() == {"c": 0, "a": 1, "b": None}
+    assert inf.changes() == {}
+
+
+def test_watch_resumes_from_last_resource_version():
+    lister = Lister(([obj("a", 1, v=0)], 10))
+    fake   = ScriptedWatch([[event("MODIFIED", obj("a", 11, v=1))],      # session times out
+                            [event("MODIFIED", obj("a", 12, v=2))]])
+    inf = Informer(lister, key_fn=name_key, transform=lambda o: o.spec.v, watch_factory=fake)
+    inf.start(timeout=5)
+    until(lambda: len(fake.calls) >= 3)
+    inf.stop()
+    assert [c["resource_version"] for c in fake.calls[:3]] == ["10", "11", "12"]
+    assert lister.calls == 1 and inf.get("a") == 2
+
+
+@pytest.mark.parametrize("gone", ["event", "exception"])
+def test_410_gone_relists(gone):
+    lister = Lister(([obj("a", 1, v=0), obj("b", 2, v=0)], 10),
+                    ([obj("b", 30, v=5), obj("d", 31, v=0)], 31))
+
+    def expired():
+        if gone == "event":
+            yield GONE
+        else:
+            raise client.ApiException(status=410, reason="Gone")
+            yield                                   # noqa – a generator
+    fake = ScriptedWatch([[event("ADDED", obj("c", 11, v=0))], expired()], go=False)
+    inf = Informer(lister, key_fn=name_key, transform=lambda o: o.spec.v,
+                   watch_factory=fake, journal=True)
+    inf.start(timeout=5)
+    assert inf.changes() is None
+    fake.go.set()
+    until(lambda: inf.relists == 2 and len(fake.calls) >= 3)
+    inf.stop()
+    assert inf.store() == {"b": 5, "d": 0}
+    assert fake.calls[2]["resource_version"] == "31"
+    assert inf.changes() is None                   # consumer must resync after a relist
+
+
+def test_start_gives_up_when_list_keeps_failing(monkeypatch):
+    monkeypatch.setattr("optimiser.informer.RETRY_BACKOFF_S", 0.01)
+
+    def broken(**kw):
+        raise client.ApiException(status=500, reason="Internal Server Error")
+    inf = Informer(broken, watch_factory=ScriptedWatch([]), name="broken")
+    t0 = time.monotonic()
+    with pytest.raises(TimeoutError, match="broken"):
+        inf.start(timeout=0.2)
+    assert time.monotonic() - t0 < 2
+    until(lambda: not inf._thread.is_alive())
@@ -0,0 +1,132 @@
+# SPDX-License-Identifier: Apache-2.0
+# tests/test_node_tuner.py
+#
+# SysfsTuner over a fake sysfs tree (SYSFS_ROOT layout under tmp_path):
+# governor on every CPU / policy, RAPL limit on every package, cached
+# values skipping redundant writes, and the HTTP endpoint.
+#
+#     python -m pytest -q tests
+
+import json, urllib.error, urllib.request
+
+import pytest
+
+from optimiser.node_tuner import SysfsTuner, request_tune, serve
+
+GOVERNORS = "performance powersave schedutil"
+TOKEN     = "s3cret"
+
+
+def fake_sysfs(root, cpus: int = 4, packages: int = 2, policies: bool = False,
+               max_uw: int = 150_000_000):
+    cpu = root / "devices/system/cpu"
+    for i in range(cpus):
+        d = cpu / (f"cpufreq/policy{i}" if policies else f"cpu{i}/cpufreq")
+        d.mkdir(parents=True)
+        (d / "scaling_governor").write_text("performance\n")
+        (d / "scaling_available_governors").write_text(GOVERNORS + "\n")
+    for p in range(packages):
+        for name in (f"intel-rapl:{p}", f"intel-rapl:{p}:0"):      # package + core subzone
+            z = root / "class/powercap" / name
+            z.mkdir(parents=True)
+            (z / "constraint_0_power_limit_uw").write_text("200000000\n")
+            (z / "constraint_0_max_power_uw").write_text(f"{max_uw}\n")
+    return root
+
+
+def governors(root):
+    return sorted(p.read_text().strip()
+                  for p in (root / "devices/system/cpu").rglob("scaling_governor"))
+
+
+def package_limits(root):
+    return {z.name: int((z / "constraint_0_power_limit_uw").read_text())
+            for z in (root / "class/powercap").iterdir()}
+
+
+# ───────────────────────────────────────────────
+@pytest.mark.parametrize("policies", [False, True])
+def test_governor_written_to_every_cpu(tmp_path, policies):
+    root  = fake_sysfs(tmp_path, cpus=4, policies=policies)
+    tuner = SysfsTuner(root)
+    assert len(tuner.gov_files) == 4
+    assert tuner.set_governor("powersave") == 4
+    assert governors(root) == ["powersave"] * 4
+    assert set(tuner.state()["governors"].values()) == {"powersave"}
+    with pytest.raises(ValueError):
+        tuner.set_governor("turbo")
+
+
+def test_rapl_limit_on_every_package(tmp_path):
+    root  = fake_sysfs(tmp_path, packages=2)
+    tuner = SysfsTuner(root)
+    assert sorted(tuner.rapl_zones) == ["intel-rapl:0", "intel-rapl:1"]
+    assert tuner.set_rapl(120) == 2
+    assert package_limits(root) == {"intel-rapl:0": 120_000_000, "intel-rapl:1": 120_000_000,
+                                    "intel-rapl:0:0": 200_000_000, "intel-rapl:1:0": 200_000_000}
+    assert tuner.set_rapl(500) == 2                                  # capped at max_power_uw
+    assert package_limits(root)["intel-rapl:1"] == 150_000_000
+    assert tuner.state()["rapl_w"] == {"intel-rapl:0": 150.0, "intel-rapl:1": 150.0}
+
+
+def test_cached_values_skip_redundant_writes(tmp_path):
+    root  = fake_sysfs(tmp_path, cpus=2, packages=1)
+    tuner = SysfsTuner(root)
+    assert tuner.set_governor("performance") == 0                   # already the value read
+    assert tuner.set_governor("powersave") == 2
+    gov0 = root / "devices/system/cpu/cpu0/cpufreq/scaling_governor"
+    gov0.write_text("schedutil")                                    # changed behind our back
+    assert tuner.set_governor("powersave") == 0 and gov0.read_text() == "schedutil"
+    tuner.refresh()
+    assert tuner.set_governor("powersave") == 1 and gov0.read_text() == "powersave"
+    assert tuner.set_rapl(100) == 1 and tuner.set_rapl(100) == 0
+
+
+# ───────────── HTTP endpoint ───────────────────────────────
+@pytest.fixture
+def endpoint(tmp_path):
+    root   = fake_sysfs(tmp_path)
+    server = serve(SysfsTuner(root), addr="127.0.0.1", port=0, token=TOKEN)
+    yield root, f"http://127.0.0.1:{server.server_address[1]}"
+    server.shutdown()
+    server.server_close()
+
+
+def post(url: str, body: dict, token: str = TOKEN):
+    req = urllib.request.Request(url + "/tune", method="POST", data=json.dumps(body).encode(),
+                                 headers={"Authorization": f"Bearer {token}"})
+    with urllib.request.urlopen(req, timeout=5) as resp:
+        return json.loads(resp.read())
+
+
+def test_endpoint_rejects_bad_token(endpoint):
+    root, url = endpoint
+    for token in ("wrong", ""):
+        with pytest.raises(urllib.error.HTTPError) as e:
+            request_tune(url, token=token)
+        assert e.value.code == 401
+    assert governors(root) == ["performance"] * 4
+
+
+def test_endpoint_applies_profile_and_explicit_values(endpoint):
+    root, url = endpoint
+    out = request_tune(url, "cpusave", token=TOKEN)
+    assert out["applied"] == {"governor": 4}
+    assert governors(root) == ["powersave"] * 4
+
+    out = post(url, {"governor": "schedutil", "rapl_w": 90})
+    assert out["applied"] == {"governor": 4, "rapl": 2}
+    assert out["rapl_w"] == {"intel-rapl:0": 90.0, "intel-rapl:1": 90.0}
+    assert package_limits(root)["intel-rapl:0"] == 90_000_000
+
+    with urllib.request.urlopen(url + "/state", timeout=5) as resp:
+        state = json.loads(resp.read())
+    assert set(state["governors"].values()) == {"schedutil"}
+
+
+def test_endpoint_reports_bad_requests(endpoint):
+    _, url = endpoint
+    for body in ({"profile": "nope"}, {"governor": "turbo"}):
+        with pytest.raises(urllib.error.HTTPError) as e:
+            post(url, body)
+        assert e.value.code == 400
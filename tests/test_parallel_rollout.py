@@ -0,0 +1,67 @@
+# SPDX-License-Identifier: Apache-2.0
+# tests/test_parallel_rollout.py
+#
+# ParallelRollout over two spawned workers, one of which crashes (while
+# building its env or in its second round) or goes silent: the learner
+# raises naming the worker instead of blocking on the queue.
+#
+#     python -m pytest -q tests
+
+import os, time
+
+import pytest
+
+from optimiser.decision_engine import HierarchicalAgent
+from optimiser.parallel_rollout import ParallelRollout, SimFactory
+
+N_NODES, N_PODS, T = 8, 60, 16
+
+
+class FaultySim(SimFactory):
+    """
+    Worker ``wid`` fails: ``"build"`` raises while building its env,
+    ``"exit"`` dies and ``"hang"`` stalls in its second round.
+    """
+    def __init__(self, wid: int, fault: str):
+        super().__init__(n_nodes=N_NODES, n_pods=N_PODS)
+        self.wid, self.fault = wid, fault
+
+    def __call__(self, worker_id: int):
+        if worker_id == self.wid and self.fault == "build":
+            raise RuntimeError("env build failed")
+        env = super().__call__(worker_id)
+        if worker_id == self.wid:
+            apply, steps = env.apply, iter(range(2 * T))
+
+            def faulty(fam, tgt):
+                if next(steps) < T:
+                    return apply(fam, tgt)
+                if self.fault == "exit":
+                    os._exit(3)
+                time.sleep(3600)
+            env.apply = faulty
+        return env
+
+
+def test_worker_failing_to_start_is_reported():
+    with pytest.raises(RuntimeError, match=r"worker 1 exited \(code 1\)"):
+        ParallelRollout(HierarchicalAgent(12, N_NODES, N_PODS), FaultySim(1, "build"),
+                        n_workers=2, steps_per_worker=T)
+
+
+@pytest.mark.parametrize("fault,match", [("exit", r"worker 0 exited \(code 3\)"),
+                                         ("hang", r"worker 0 sent nothing in 3 s")])
+def test_dead_or_silent_worker_is_reported(fault, match):
+    pool = ParallelRollout(HierarchicalAgent(12, N_NODES, N_PODS), FaultySim(0, fault),
+                           n_workers=2, steps_per_worker=T)
+    pool.timeout = 3                                # start-up (imports) took longer
+    pool.publish()
+    mem = pool.collect()                            # first round is fine
+    assert len(mem.high) == len(mem.low) == 2 * T
+    pool.agent.update(mem)
+    pool.publish()
+    t0 = time.monotonic()
+    with pytest.raises(RuntimeError, match=match):
+        pool.collect()
+    assert time.monotonic() - t0 < 30
+    assert not any(p.is_alive() for p in pool._procs)
@@ -0,0 +1,61 @@
+# SPDX-License-Identifier: Apache-2.0
+# tests/test_ppo_update.py
+#
+# PPO updates of both target heads through the shared ppo_epochs loop,
+# including an update window in which the node head recorded nothing.
+#
+#     python -m pytest -q tests
+
+import numpy as np
+import pytest
+import torch
+
+from optimiser.advanced_optimization import PPOAgent, RolloutBuffer
+from optimiser.cluster_snapshot import NODE_FEATURES
+from optimiser.decision_engine import HierarchicalAgent, HierMem
+from optimiser.node_policy import NodeRollout, NodeTargetPolicy
+
+
+@pytest.mark.parametrize("advantage", ["mc", "gae"])
+def test_node_update_on_empty_rollout(advantage):
+    pol, mem = NodeTargetPolicy(advantage=advantage), NodeRollout()
+    before = [p.clone() for p in pol.policy.parameters()]
+    assert pol.update(mem) == {}
+    assert all(torch.equal(a, b) for a, b in zip(before, pol.policy.parameters()))
+
+
+@pytest.mark.parametrize("advantage", ["mc", "gae"])
+def test_do_nothing_window_updates_family_level_only(advantage):
+    agent, mem = HierarchicalAgent(12, 6, 30, target_head="node"), HierMem()
+    agent.high = PPOAgent(12, 4, advantage=advantage)
+    agent.low  = NodeTargetPolicy(advantage=advantage)
+    mem.low = NodeRollout()
+    rng = np.random.default_rng(0)
+    for _ in range(8):                          # DO_NOTHING: no node row
+        agent.high.select_action(rng.standard_normal(12).astype(np.float32), mem.high)
+        mem.add_reward(float(rng.standard_normal()), False)
+    stats = agent.update(mem)
+    assert set(stats) == {"high"} and stats["high"]["epochs"] >= 1
+    assert len(mem.high) == len(mem.low) == 0
+
+
+@pytest.mark.parametrize("advantage", ["mc", "gae"])
+def test_node_update_runs_shared_loop(advantage):
+    pol, mem = NodeTargetPolicy(advantage=advantage, K_epochs=3, target_kl=0), NodeRollout()
+    rng = np.random.default_rng(1)
+    for step in range(12):
+        x = rng.random((5 + step % 3, NODE_FEATURES), dtype=np.float32)
+        pol.select_action(x, np.ones(len(x), bool), step % 4, mem)
+        mem.add_reward(float(rng.standard_normal()), step == 11)
+    stats = pol.update(mem)
+    assert stats["epochs"] == 3 and np.isfinite(stats["loss"]) and len(mem) == 0
+
+
+def test_ppo_agent_update_runs_shared_loop():
+    ppo, mem = PPOAgent(8, 4, K_epochs=2, target_kl=0), RolloutBuffer()
+    rng = np.random.default_rng(2)
+    for _ in range(16):
+        ppo.select_action(rng.standard_normal(8).astype(np.float32), mem)
+        mem.add_reward(float(rng.standard_normal()), False)
+    stats = ppo.update(mem)
+    assert stats["epochs"] == 2 and np.isfinite(stats["loss"]) and len(mem) == 0